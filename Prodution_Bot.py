@@ -1,21 +1,783 @@
+import argparse
+import asyncio
+import cProfile
+import gzip
 import json
+import mmap
+import os
+import queue
 import re
+import shlex
+import shutil
+import signal
+import socket
 import sqlite3
+import struct
+import subprocess
+import sys
+import threading
 import time
-from datetime import datetime
+import weakref
+import bisect
+import hashlib
+import heapq
+import http.client
+import io
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 from typing import List, Dict
 import random
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class IncidentRecord:
+    __slots__ = ("id", "issue_title", "category", "severity", "resolution_time", "frequency",
+                 "automation_script", "match_count", "_resolution_steps", "_loader")
+    
+    COLUMNS = ("id", "issue_title", "category", "severity", "resolution_time", "frequency", "automation_script")
+    
+    def __init__(self, id: str, issue_title: str, category: str, severity: str, resolution_time: int,
+                 frequency: int, automation_script: str, match_count: int = 0, loader=None):
+        self.id = id
+        self.issue_title = issue_title
+        self.category = sys.intern(category)
+        self.severity = sys.intern(severity)
+        self.resolution_time = resolution_time
+        self.frequency = frequency
+        self.automation_script = automation_script
+        self.match_count = match_count
+        self._resolution_steps = None
+        self._loader = loader
+    
+    @property
+    def resolution_steps(self) -> str:
+        if self._resolution_steps is None and self._loader is not None:
+            self._resolution_steps = self._loader(self.id)
+        return self._resolution_steps
+    
+    def attach_loader(self, loader):
+        self._loader = loader
+    
+    def with_match_count(self, match_count: int) -> "IncidentRecord":
+        record = IncidentRecord(self.id, self.issue_title, self.category, self.severity, self.resolution_time,
+                                self.frequency, self.automation_script, match_count, self._loader)
+        record._resolution_steps = self._resolution_steps
+        return record
+    
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+    
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+    
+    def __getstate__(self):
+        return (self.id, self.issue_title, self.category, self.severity, self.resolution_time,
+                self.frequency, self.automation_script, self.match_count, self._resolution_steps)
+    
+    def __setstate__(self, state):
+        (self.id, self.issue_title, category, severity, self.resolution_time,
+         self.frequency, self.automation_script, self.match_count, self._resolution_steps) = state
+        self.category = sys.intern(category)
+        self.severity = sys.intern(severity)
+        self._loader = None
+    
+    def to_dict(self) -> Dict:
+        return {column: getattr(self, column) for column in self.COLUMNS + ("match_count",)}
+
+ROLLUP_GRANULARITIES = {
+    "minute": ("%Y-%m-%d %H:%M:00", timedelta(minutes=1)),
+    "hour": ("%Y-%m-%d %H:00:00", timedelta(hours=1)),
+    "day": ("%Y-%m-%d 00:00:00", timedelta(days=1))
+}
+RESPONSE_TIME_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+CONFIDENCE_BUCKETS = 10
+
+METRICS_LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+METRICS_CONFIDENCE_BUCKETS = tuple((i + 1) / CONFIDENCE_BUCKETS for i in range(CONFIDENCE_BUCKETS))
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _format_metric_value(value: float) -> str:
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _format_metric_labels(labels: List[tuple]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class _ShardOwner:
+    __slots__ = ("__weakref__",)
+
+class _ShardedMetric:
+    kind = None
+    
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = {}
+        self._base = {}
+        self._lock = threading.RLock()
+    
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            owner = _ShardOwner()
+            with self._lock:
+                self._shards[id(shard)] = shard
+            weakref.finalize(owner, self._retire, shard).atexit = False
+            self._local.owner = owner
+            self._local.shard = shard
+        return shard
+    
+    def _retire(self, shard: Dict):
+        with self._lock:
+            self._shards.pop(id(shard), None)
+            for key, value in shard.items():
+                self._fold(key, value)
+    
+    def _fold(self, key: tuple, value):
+        raise NotImplementedError
+    
+    def _key(self, labels: Dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def _snapshot(self) -> List[Dict]:
+        with self._lock:
+            base = {key: list(value) if isinstance(value, list) else value for key, value in self._base.items()}
+            shards = list(self._shards.values())
+        return [base] + [shard.copy() for shard in shards]
+
+class MetricCounter(_ShardedMetric):
+    kind = "counter"
+    
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+    
+    def _fold(self, key: tuple, value: float):
+        self._base[key] = self._base.get(key, 0) + value
+    
+    def values(self) -> Dict[tuple, float]:
+        totals = defaultdict(float)
+        for shard in self._snapshot():
+            for key, value in shard.items():
+                totals[key] += value
+        if not totals and not self.labelnames:
+            totals[()] = 0
+        return totals
+    
+    def samples(self) -> List[tuple]:
+        return [("_total", list(zip(self.labelnames, key)), value) for key, value in sorted(self.values().items())]
+
+class MetricHistogram(_ShardedMetric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = METRICS_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        cell = shard.get(key)
+        if cell is None:
+            cell = shard[key] = [0] * (len(self.buckets) + 2)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+    
+    def _fold(self, key: tuple, cell: List):
+        totals = self._base.setdefault(key, [0] * (len(self.buckets) + 2))
+        for i, value in enumerate(cell):
+            totals[i] += value
+    
+    def samples(self) -> List[tuple]:
+        merged = {}
+        for shard in self._snapshot():
+            for key, cell in shard.items():
+                totals = merged.setdefault(key, [0] * (len(self.buckets) + 2))
+                for i, value in enumerate(list(cell)):
+                    totals[i] += value
+        
+        samples = []
+        for key, cell in sorted(merged.items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), cell):
+                cumulative += count
+                samples.append(("_bucket", labels + [("le", _format_metric_value(bound))], cumulative))
+            samples.append(("_count", labels, cumulative))
+            samples.append(("_sum", labels, cell[-1]))
+        return samples
+
+class MetricGauge:
+    kind = "gauge"
+    
+    def __init__(self, name: str, help_text: str, callback, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+    
+    def samples(self) -> List[tuple]:
+        value = self.callback()
+        if not isinstance(value, dict):
+            return [("", [], value)]
+        return [("", list(zip(self.labelnames, key)), item) for key, item in sorted(value.items())]
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def _register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, MetricGauge):
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered with a different type or labels")
+                return existing
+            self.metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> MetricCounter:
+        return self._register(MetricCounter(name, help_text, labelnames))
+    
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = METRICS_LATENCY_BUCKETS) -> MetricHistogram:
+        return self._register(MetricHistogram(name, help_text, labelnames, buckets))
+    
+    def gauge(self, name: str, help_text: str, callback, labelnames: tuple = ()) -> MetricGauge:
+        return self._register(MetricGauge(name, help_text, callback, labelnames))
+    
+    def render(self, openmetrics: bool = True) -> str:
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                continue
+            family = f"{metric.name}_total" if metric.kind == "counter" and not openmetrics else metric.name
+            lines.append(f"# TYPE {family} {metric.kind}")
+            lines.append(f"# HELP {family} {metric.help}")
+            for suffix, labels, value in samples:
+                lines.append(f"{metric.name}{suffix}{_format_metric_labels(labels)} {_format_metric_value(value)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+    
+    def write_textfile(self, path: str):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            handle.write(self.render(openmetrics=False))
+        os.replace(temp_path, path)
+    
+    def start_textfile_writer(self, path: str, interval: float = 15.0) -> threading.Event:
+        stop = threading.Event()
+        
+        def write_loop():
+            while not stop.wait(interval):
+                try:
+                    self.write_textfile(path)
+                except OSError as e:
+                    print(f"Metrics textfile write failed: {e}")
+        
+        self.write_textfile(path)
+        threading.Thread(target=write_loop, name="metrics-textfile", daemon=True).start()
+        return stop
+
+METRICS = MetricsRegistry()
+QUERIES_TOTAL = METRICS.counter("psb_queries", "Queries processed by outcome", ("tenant", "outcome"))
+QUERY_SECONDS = METRICS.histogram("psb_query_duration_seconds", "End-to-end query processing latency", ("tenant",))
+STAGE_SECONDS = METRICS.histogram("psb_stage_duration_seconds", "Latency of query phases and ranking stages", ("stage",))
+MATCH_CONFIDENCE = METRICS.histogram("psb_match_confidence", "Confidence of the best match per query", ("category",),
+                                     METRICS_CONFIDENCE_BUCKETS)
+CACHE_REQUESTS = METRICS.counter("psb_cache_requests", "Cache lookups by cache and result", ("cache", "result"))
+DB_COMMIT_SECONDS = METRICS.histogram("psb_db_commit_seconds", "SQLite commit latency", ("db",))
+AUTOMATION_EXECUTIONS = METRICS.counter("psb_automation_executions", "Automation executions by outcome",
+                                        ("status", "backend"))
+PROCESS_START_TIME = time.time()
+METRICS.gauge("psb_process_start_time_seconds", "Unix time the bot process started", lambda: PROCESS_START_TIME)
+
+def _match_ratio():
+    totals = QUERIES_TOTAL.values()
+    queries = sum(totals.values())
+    matched = sum(value for (_, outcome), value in totals.items() if outcome == "matched")
+    return matched / queries if queries else 0.0
+
+METRICS.gauge("psb_match_ratio", "Fraction of processed queries that found a match", _match_ratio)
+
+class _InstrumentedConnection(sqlite3.Connection):
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.metrics_label = os.path.basename(str(database))
+    
+    def commit(self):
+        started = time.perf_counter()
+        super().commit()
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started, db=self.metrics_label)
+
+class QueryAnalytics:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.rt_columns = [f"rt_{i}" for i in range(len(RESPONSE_TIME_BUCKETS_MS) + 1)]
+        self.conf_columns = [f"conf_{i}" for i in range(CONFIDENCE_BUCKETS)]
+        self._initialize_tables()
+    
+    def _initialize_tables(self):
+        histogram_columns = ",\n".join(f"            {column} INTEGER DEFAULT 0" for column in self.rt_columns + self.conf_columns)
+        self.cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS query_rollups (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            dimension_value TEXT NOT NULL,
+            query_count INTEGER DEFAULT 0,
+            confidence_sum REAL DEFAULT 0,
+            response_time_sum REAL DEFAULT 0,
+{histogram_columns},
+            PRIMARY KEY (granularity, dimension, bucket_start, dimension_value)
+        ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+    
+    def record(self, incident_id: str, category: str, confidence: float, response_time: float, timestamp: datetime = None):
+        timestamp = timestamp or datetime.now(timezone.utc)
+        rt_column = self.rt_columns[bisect.bisect_left(RESPONSE_TIME_BUCKETS_MS, response_time)]
+        conf_column = self.conf_columns[min(int(confidence * CONFIDENCE_BUCKETS), CONFIDENCE_BUCKETS - 1)]
+        
+        rows = []
+        for granularity, (bucket_format, _) in ROLLUP_GRANULARITIES.items():
+            bucket_start = timestamp.strftime(bucket_format)
+            rows.append((granularity, "category", bucket_start, category or "unknown", confidence, response_time))
+            rows.append((granularity, "incident", bucket_start, incident_id, confidence, response_time))
+        
+        self.cursor.executemany(f'''
+        INSERT INTO query_rollups (granularity, dimension, bucket_start, dimension_value, query_count,
+                                   confidence_sum, response_time_sum, {rt_column}, {conf_column})
+        VALUES (?, ?, ?, ?, 1, ?, ?, 1, 1)
+        ON CONFLICT (granularity, dimension, bucket_start, dimension_value) DO UPDATE SET
+            query_count = query_count + 1,
+            confidence_sum = confidence_sum + excluded.confidence_sum,
+            response_time_sum = response_time_sum + excluded.response_time_sum,
+            {rt_column} = {rt_column} + 1,
+            {conf_column} = {conf_column} + 1
+        ''', rows)
+    
+    def rebuild(self):
+        self.cursor.execute("SELECT MIN(timestamp) FROM query_logs")
+        earliest = self.cursor.fetchone()[0]
+        if earliest is None:
+            return 0
+        earliest = datetime.strptime(earliest, "%Y-%m-%d %H:%M:%S")
+        for granularity, (bucket_format, _) in ROLLUP_GRANULARITIES.items():
+            self.cursor.execute("DELETE FROM query_rollups WHERE granularity = ? AND bucket_start >= ?",
+                                (granularity, earliest.strftime(bucket_format)))
+        backfill = self.conn.cursor()
+        backfill.execute('''
+        SELECT q.matched_incident_id, i.category, q.confidence_score, q.response_time, q.timestamp
+        FROM query_logs q LEFT JOIN incidents i ON i.id = q.matched_incident_id
+        WHERE q.matched_incident_id IS NOT NULL
+        ORDER BY q.query_id
+        ''')
+        count = 0
+        for incident_id, category, confidence, response_time, logged_at in backfill:
+            timestamp = datetime.strptime(logged_at, "%Y-%m-%d %H:%M:%S")
+            self.record(incident_id, category, confidence or 0.0, response_time or 0.0, timestamp)
+            count += 1
+        self.conn.commit()
+        return count
+    
+    def _window(self, granularity: str, periods: int, until: datetime = None) -> tuple:
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        bucket_format, step = ROLLUP_GRANULARITIES[granularity]
+        until = until or datetime.now(timezone.utc)
+        since = until - step * (periods - 1)
+        return since.strftime(bucket_format), until.strftime(bucket_format)
+    
+    def _fetch(self, granularity: str, dimension: str, since: str, until: str, value: str = None) -> List[Dict]:
+        columns = ["bucket_start", "dimension_value", "query_count", "confidence_sum", "response_time_sum"] + self.rt_columns + self.conf_columns
+        sql = f'''
+        SELECT {", ".join(columns)} FROM query_rollups
+        WHERE granularity = ? AND dimension = ? AND bucket_start BETWEEN ? AND ?
+        '''
+        params = [granularity, dimension, since, until]
+        if value is not None:
+            sql += " AND dimension_value = ?"
+            params.append(value)
+        self.cursor.execute(sql + " ORDER BY bucket_start", params)
+        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+    
+    @staticmethod
+    def _histogram_percentile(counts: List[int], bounds: List[float], quantile: float) -> float:
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        target = quantile * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= target:
+                lower = bounds[i - 1] if i > 0 else 0.0
+                upper = bounds[i] if i < len(bounds) else bounds[-1]
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+        return bounds[-1]
+    
+    def _summarize(self, rows: List[Dict]) -> Dict:
+        query_count = sum(row["query_count"] for row in rows)
+        rt_counts = [sum(row[column] for row in rows) for column in self.rt_columns]
+        conf_counts = [sum(row[column] for row in rows) for column in self.conf_columns]
+        conf_bounds = [(i + 1) / CONFIDENCE_BUCKETS for i in range(CONFIDENCE_BUCKETS)]
+        return {
+            "queries": query_count,
+            "average_confidence": sum(row["confidence_sum"] for row in rows) / query_count if query_count else 0.0,
+            "median_confidence": self._histogram_percentile(conf_counts, conf_bounds, 0.5),
+            "average_response_time": sum(row["response_time_sum"] for row in rows) / query_count if query_count else 0.0,
+            "p50_response_time": self._histogram_percentile(rt_counts, RESPONSE_TIME_BUCKETS_MS, 0.5),
+            "p95_response_time": self._histogram_percentile(rt_counts, RESPONSE_TIME_BUCKETS_MS, 0.95),
+            "p99_response_time": self._histogram_percentile(rt_counts, RESPONSE_TIME_BUCKETS_MS, 0.99)
+        }
+    
+    def top_incidents(self, granularity: str = "hour", periods: int = 24, limit: int = 3, until: datetime = None) -> List[Dict]:
+        since, until = self._window(granularity, periods, until)
+        buckets = defaultdict(list)
+        for row in self._fetch(granularity, "incident", since, until):
+            buckets[row["bucket_start"]].append((row["query_count"], row["dimension_value"]))
+        
+        return [
+            {"bucket_start": bucket_start, "incidents": [{"incident_id": incident_id, "queries": count}
+                                                         for count, incident_id in heapq.nlargest(limit, counts)]}
+            for bucket_start, counts in sorted(buckets.items())
+        ]
+    
+    def category_summary(self, granularity: str = "hour", periods: int = 24, until: datetime = None) -> Dict[str, Dict]:
+        since, until = self._window(granularity, periods, until)
+        by_category = defaultdict(list)
+        for row in self._fetch(granularity, "category", since, until):
+            by_category[row["dimension_value"]].append(row)
+        return {category: self._summarize(rows) for category, rows in sorted(by_category.items())}
+    
+    def trend(self, dimension: str, value: str, granularity: str = "hour", periods: int = 24, until: datetime = None) -> List[Dict]:
+        since, until = self._window(granularity, periods, until)
+        return [
+            {"bucket_start": row["bucket_start"], **self._summarize([row])}
+            for row in self._fetch(granularity, dimension, since, until, value)
+        ]
+
+ROLLUP_RETENTION_DAYS = {"minute": 7, "hour": 90}
+
+class QueryLogRetention:
+    def __init__(self, conn: sqlite3.Connection, archive_dir: str = "archive", retention_days: int = 30,
+                 batch_size: int = 500, vacuum_pages: int = 256, rollup_retention: Dict[str, int] = None):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.rollup_retention = dict(ROLLUP_RETENTION_DAYS, **(rollup_retention or {}))
+        self.stats = {"archived": 0, "rollups_pruned": 0, "pages_vacuumed": 0, "batches": 0}
+        self._initialize_tables()
+    
+    def _initialize_tables(self):
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS query_log_daily (
+            day TEXT NOT NULL,
+            matched_incident_id TEXT NOT NULL,
+            queries INTEGER DEFAULT 0,
+            occurrences INTEGER DEFAULT 0,
+            confidence_sum REAL DEFAULT 0,
+            response_time_sum REAL DEFAULT 0,
+            PRIMARY KEY (day, matched_incident_id)
+        ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+    
+    @staticmethod
+    def _cutoff(days: int, now: datetime = None) -> datetime:
+        now = now or datetime.now(timezone.utc)
+        return (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    def archive_path(self, day: str) -> str:
+        return os.path.join(self.archive_dir, f"query_logs-{day}.jsonl.gz")
+    
+    def _write_archive(self, day: str, rows: List[Dict]):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with open(self.archive_path(day), "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as handle:
+                handle.write("".join(json.dumps(row) + "\n" for row in rows).encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+    
+    def archive_batch(self, now: datetime = None) -> int:
+        cutoff = self._cutoff(self.retention_days, now).strftime("%Y-%m-%d %H:%M:%S")
+        self.cursor.execute('''
+        SELECT query_id, user_query, matched_incident_id, confidence_score, response_time, timestamp, occurrences
+        FROM query_logs WHERE timestamp < ? ORDER BY timestamp LIMIT ?
+        ''', (cutoff, self.batch_size))
+        columns = [desc[0] for desc in self.cursor.description]
+        rows = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+        if not rows:
+            return 0
+        
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[row["timestamp"][:10]].append(row)
+        for day, day_rows in by_day.items():
+            self._write_archive(day, day_rows)
+        
+        self.cursor.executemany('''
+        INSERT INTO query_log_daily (day, matched_incident_id, queries, occurrences, confidence_sum, response_time_sum)
+        VALUES (?, ?, 1, ?, ?, ?)
+        ON CONFLICT (day, matched_incident_id) DO UPDATE SET
+            queries = queries + 1,
+            occurrences = occurrences + excluded.occurrences,
+            confidence_sum = confidence_sum + excluded.confidence_sum,
+            response_time_sum = response_time_sum + excluded.response_time_sum
+        ''', [(row["timestamp"][:10], row["matched_incident_id"] or "", row["occurrences"] or 1,
+               row["confidence_score"] or 0.0, row["response_time"] or 0.0) for row in rows])
+        self.cursor.executemany("DELETE FROM query_logs WHERE query_id = ?", [(row["query_id"],) for row in rows])
+        self.conn.commit()
+        self.stats["archived"] += len(rows)
+        return len(rows)
+    
+    def prune_rollups_batch(self, now: datetime = None) -> int:
+        pruned = 0
+        for granularity, days in self.rollup_retention.items():
+            bucket_format = ROLLUP_GRANULARITIES[granularity][0]
+            cutoff = self._cutoff(days, now).strftime(bucket_format)
+            self.cursor.execute('''
+            DELETE FROM query_rollups WHERE (granularity, dimension, bucket_start, dimension_value) IN (
+                SELECT granularity, dimension, bucket_start, dimension_value FROM query_rollups
+                WHERE granularity = ? AND dimension IN ('category', 'incident') AND bucket_start < ?
+                LIMIT ?
+            )
+            ''', (granularity, cutoff, self.batch_size - pruned))
+            pruned += self.cursor.rowcount
+            if pruned >= self.batch_size:
+                break
+        self.conn.commit()
+        self.stats["rollups_pruned"] += pruned
+        return pruned
+    
+    def incremental_mode(self) -> bool:
+        self.cursor.execute("PRAGMA auto_vacuum")
+        return self.cursor.fetchone()[0] == 2
+    
+    def vacuum_step(self) -> int:
+        if not self.incremental_mode():
+            return 0
+        self.cursor.execute("PRAGMA freelist_count")
+        free_pages = self.cursor.fetchone()[0]
+        pages = min(free_pages, self.vacuum_pages)
+        if pages:
+            self.cursor.executescript(f"PRAGMA incremental_vacuum({pages});")
+            self.stats["pages_vacuumed"] += pages
+        return free_pages - pages
+    
+    def enable_incremental_vacuum(self):
+        self.conn.commit()
+        self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.cursor.execute("VACUUM")
+    
+    def step(self, now: datetime = None) -> bool:
+        self.stats["batches"] += 1
+        if self.archive_batch(now) >= self.batch_size:
+            return True
+        if self.prune_rollups_batch(now) >= self.batch_size:
+            return True
+        return self.vacuum_step() > 0
+    
+    def run(self, pause: float = 0.05, now: datetime = None) -> Dict:
+        before = dict(self.stats)
+        while self.step(now):
+            time.sleep(pause)
+        return {key: self.stats[key] - before[key] for key in self.stats}
+    
+    def summary(self) -> Dict:
+        self.cursor.execute("SELECT COUNT(DISTINCT day), COALESCE(SUM(queries), 0), MIN(day) FROM query_log_daily")
+        archived_days, archived_queries, oldest_day = self.cursor.fetchone()
+        self.cursor.execute("PRAGMA freelist_count")
+        free_pages = self.cursor.fetchone()[0]
+        return {
+            "archived_days": archived_days,
+            "archived_queries": archived_queries,
+            "oldest_archived_day": oldest_day,
+            "free_pages": free_pages,
+            "incremental_vacuum": self.incremental_mode()
+        }
+
+MINHASH_PRIME = (1 << 61) - 1
+SHINGLE_STOP_WORDS = {"the", "is", "on", "in", "at", "and", "or", "a", "an", "to", "for", "of", "with", "by",
+                      "as", "from", "not", "due", "being", "after", "all", "too", "cannot"}
+
+class IncidentDeduplicator:
+    def __init__(self, num_perm: int = 64, bands: int = 32, threshold: float = 0.3, seed: int = 42):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = random.Random(seed)
+        self.hash_params = [(rng.randrange(1, MINHASH_PRIME), rng.randrange(0, MINHASH_PRIME)) for _ in range(num_perm)]
+        self.signatures = {}
+        self.buckets = defaultdict(set)
+    
+    @staticmethod
+    def shingles(title: str, description: str, keywords: List[str]) -> set:
+        words = [w for w in re.findall(r'[a-z0-9]+', f"{title} {description}".lower()) if w not in SHINGLE_STOP_WORDS]
+        shingles = {f"k:{keyword.lower()}" for keyword in keywords}
+        shingles.update(f"w:{word}" for word in words)
+        return shingles
+    
+    def signature(self, shingles: set) -> tuple:
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles] or [0]
+        return tuple(min((a * h + b) % MINHASH_PRIME for h in hashes) for a, b in self.hash_params)
+    
+    def _band_keys(self, signature: tuple):
+        for band in range(self.bands):
+            yield band, hash(signature[band * self.rows:(band + 1) * self.rows])
+    
+    def add(self, incident_id: str, shingles: set):
+        self.remove(incident_id)
+        signature = self.signature(shingles)
+        self.signatures[incident_id] = signature
+        for key in self._band_keys(signature):
+            self.buckets[key].add(incident_id)
+    
+    def remove(self, incident_id: str):
+        signature = self.signatures.pop(incident_id, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            self.buckets[key].discard(incident_id)
+            if not self.buckets[key]:
+                del self.buckets[key]
+    
+    def memory_estimate(self) -> int:
+        signature_bytes = len(self.signatures) * self.num_perm * 8
+        return signature_bytes + sum(sys.getsizeof(members) for members in self.buckets.values())
+    
+    def estimate_similarity(self, first: tuple, second: tuple) -> float:
+        return sum(1 for a, b in zip(first, second) if a == b) / self.num_perm
+    
+    def _query_signature(self, signature: tuple, exclude: str = None) -> List[tuple]:
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        candidates.discard(exclude)
+        
+        duplicates = []
+        for incident_id in candidates:
+            similarity = self.estimate_similarity(signature, self.signatures[incident_id])
+            if similarity >= self.threshold:
+                duplicates.append((incident_id, round(similarity, 3)))
+        return sorted(duplicates, key=lambda x: (-x[1], x[0]))
+    
+    def query(self, shingles: set, exclude: str = None) -> List[tuple]:
+        return self._query_signature(self.signature(shingles), exclude)
+    
+    def clusters(self) -> List[List[str]]:
+        parent = {incident_id: incident_id for incident_id in self.signatures}
+        
+        def find(incident_id):
+            while parent[incident_id] != incident_id:
+                parent[incident_id] = parent[parent[incident_id]]
+                incident_id = parent[incident_id]
+            return incident_id
+        
+        for incident_id, signature in self.signatures.items():
+            for duplicate_id, _ in self._query_signature(signature, exclude=incident_id):
+                root_a, root_b = find(incident_id), find(duplicate_id)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+        
+        groups = defaultdict(list)
+        for incident_id in self.signatures:
+            groups[find(incident_id)].append(incident_id)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1), key=lambda g: (-len(g), g[0]))
 
 class KnowledgeBaseManager:
-    def __init__(self, db_name="production_kb.db"):
+    def __init__(self, db_name="production_kb.db", seed: bool = True):
         self.db_name = db_name
-        self.conn = sqlite3.connect(db_name)
+        self.conn = sqlite3.connect(db_name, check_same_thread=False, factory=_InstrumentedConnection)
         self.cursor = self.conn.cursor()
         self._initialize_database()
-        self._load_comprehensive_training_data()
+        self.analytics = QueryAnalytics(self.conn)
+        self.deduplicator = IncidentDeduplicator()
+        self.revisions = {}
+        self.content_version = 0
+        self.frequency_observers = []
+        self.node_id = None
+        self.change_log = False
+        if seed:
+            self._load_comprehensive_training_data()
+        self._rebuild_duplicate_index()
+    
+    def close(self):
+        self.conn.close()
+    
+    def content_revision(self) -> str:
+        instance = self.get_replication_state("kb_instance")
+        if instance is None:
+            instance = os.urandom(8).hex()
+            self.set_replication_state("kb_instance", instance)
+            self.conn.commit()
+        return f"{instance}:{self.get_replication_state('content_revision', '0')}"
+    
+    def _bump_content_revision(self):
+        self.content_version += 1
+        self.cursor.execute('''
+        INSERT INTO replication_state (key, value) VALUES ('content_revision', '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        ''')
+    
+    def incident_count(self) -> int:
+        self.cursor.execute("SELECT COUNT(*) FROM incidents")
+        return self.cursor.fetchone()[0]
+    
+    def query_log_count(self) -> int:
+        self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'query_logs'")
+        row = self.cursor.fetchone()
+        return row[0] if row else 0
+    
+    def memory_estimate(self) -> int:
+        self.cursor.execute("PRAGMA page_count")
+        page_count = self.cursor.fetchone()[0]
+        self.cursor.execute("PRAGMA page_size")
+        page_size = self.cursor.fetchone()[0]
+        self.cursor.execute("PRAGMA cache_size")
+        cache_size = self.cursor.fetchone()[0]
+        cache_bytes = -cache_size * 1024 if cache_size < 0 else cache_size * page_size
+        return min(page_count * page_size, cache_bytes) + self.deduplicator.memory_estimate()
     
     def _initialize_database(self):
+        self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS incidents (
             id TEXT PRIMARY KEY,
@@ -36,10 +798,37 @@ class KnowledgeBaseManager:
             incident_id TEXT,
             keyword TEXT,
             weight REAL DEFAULT 1.0,
+            category TEXT,
             FOREIGN KEY (incident_id) REFERENCES incidents(id)
         )
         ''')
         
+        self.cursor.execute("PRAGMA table_info(incident_keywords)")
+        if "category" not in {row[1] for row in self.cursor.fetchall()}:
+            self.cursor.execute("ALTER TABLE incident_keywords ADD COLUMN category TEXT")
+            self.cursor.execute('''
+            UPDATE incident_keywords
+            SET category = (SELECT category FROM incidents WHERE id = incident_keywords.incident_id)
+            ''')
+        
+        self.cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS incident_keywords_category AFTER INSERT ON incident_keywords
+        WHEN NEW.category IS NULL
+        BEGIN
+            UPDATE incident_keywords SET category = (SELECT category FROM incidents WHERE id = NEW.incident_id)
+            WHERE rowid = NEW.rowid;
+        END
+        ''')
+        self.cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS incidents_category_update AFTER UPDATE OF category ON incidents
+        BEGIN
+            UPDATE incident_keywords SET category = NEW.category WHERE incident_id = NEW.id;
+        END
+        ''')
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_incident_keywords_category ON incident_keywords(category, keyword, incident_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_incident_keywords_keyword ON incident_keywords(keyword, incident_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_incident_keywords_incident ON incident_keywords(incident_id)")
+        
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS query_logs (
             query_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,7 +836,30 @@ class KnowledgeBaseManager:
             matched_incident_id TEXT,
             confidence_score REAL,
             response_time REAL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            occurrences INTEGER DEFAULT 1
+        )
+        ''')
+        
+        self.cursor.execute("PRAGMA table_info(query_logs)")
+        if "occurrences" not in {row[1] for row in self.cursor.fetchall()}:
+            self.cursor.execute("ALTER TABLE query_logs ADD COLUMN occurrences INTEGER DEFAULT 1")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_query_logs_timestamp ON query_logs(timestamp)")
+        
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kb_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            incident_id TEXT NOT NULL,
+            payload TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS replication_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
         )
         ''')
         
@@ -785,81 +1597,658 @@ class KnowledgeBaseManager:
             }
         ]
         
+        seed_hash = hashlib.sha1(json.dumps(training_data, sort_keys=True).encode("utf-8")).hexdigest()
+        unchanged = (self.get_replication_state("seed_hash") == seed_hash and
+                     self.get_replication_state("seed_revision") == self.get_replication_state("content_revision", "0"))
+        
         self.cursor.execute("DELETE FROM incidents")
         self.cursor.execute("DELETE FROM incident_keywords")
         
         for incident in training_data:
+            self._insert_incident(incident)
+        
+        if not unchanged:
+            self._bump_content_revision()
+        self.set_replication_state("seed_hash", seed_hash)
+        self.set_replication_state("seed_revision", self.get_replication_state("content_revision", "0"))
+        self.conn.commit()
+        print(f"Comprehensive Knowledge Base loaded with {len(training_data)} incidents across 7 categories")
+    
+    def _insert_incident(self, incident: Dict):
+        self.cursor.execute('''
+        INSERT INTO incidents (id, issue_title, issue_description, category, severity, resolution_steps, resolution_time, automation_script)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            incident["id"],
+            incident["title"],
+            incident["description"],
+            incident["category"],
+            incident["severity"],
+            incident["resolution"],
+            incident["time"],
+            incident.get("automation")
+        ))
+        
+        for keyword in incident["keywords"]:
             self.cursor.execute('''
-            INSERT INTO incidents (id, issue_title, issue_description, category, severity, resolution_steps, resolution_time, automation_script)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                incident["id"],
-                incident["title"],
-                incident["description"],
-                incident["category"],
-                incident["severity"],
-                incident["resolution"],
-                incident["time"],
-                incident.get("automation")
-            ))
-            
+            INSERT INTO incident_keywords (incident_id, keyword)
+            VALUES (?, ?)
+            ''', (incident["id"], keyword.lower()))
+    
+    def _rebuild_duplicate_index(self):
+        keywords = defaultdict(list)
+        self.cursor.execute("SELECT incident_id, keyword FROM incident_keywords")
+        for incident_id, keyword in self.cursor.fetchall():
+            keywords[incident_id].append(keyword)
+        
+        self.cursor.execute("SELECT id, issue_title, issue_description FROM incidents")
+        for incident_id, title, description in self.cursor.fetchall():
+            self.deduplicator.add(incident_id, IncidentDeduplicator.shingles(title, description, keywords[incident_id]))
+    
+    def get_incident_keywords(self, incident_id: str) -> List[str]:
+        self.cursor.execute("SELECT keyword FROM incident_keywords WHERE incident_id = ?", (incident_id,))
+        return [row[0] for row in self.cursor.fetchall()]
+    
+    def find_duplicates(self, incident: Dict) -> List[tuple]:
+        shingles = IncidentDeduplicator.shingles(incident["title"], incident["description"], incident["keywords"])
+        return self.deduplicator.query(shingles, exclude=incident.get("id"))
+    
+    def add_incident(self, incident: Dict, on_duplicate: str = "warn") -> Dict:
+        if on_duplicate not in ("warn", "merge", "skip"):
+            raise ValueError(f"Unknown duplicate policy: {on_duplicate}")
+        
+        self.cursor.execute("SELECT 1 FROM incidents WHERE id = ?", (incident["id"],))
+        if self.cursor.fetchone():
+            return {"status": "exists", "incident_id": incident["id"], "duplicates": []}
+        
+        duplicates = self.find_duplicates(incident)
+        if duplicates and on_duplicate == "skip":
+            return {"status": "skipped", "incident_id": incident["id"], "duplicates": duplicates}
+        
+        if duplicates and on_duplicate == "merge":
+            target_id = duplicates[0][0]
+            existing = set(self.get_incident_keywords(target_id))
             for keyword in incident["keywords"]:
+                if keyword.lower() not in existing:
+                    existing.add(keyword.lower())
+                    self.cursor.execute('''
+                    INSERT INTO incident_keywords (incident_id, keyword)
+                    VALUES (?, ?)
+                    ''', (target_id, keyword.lower()))
+            self.conn.commit()
+            self._reindex_incident(target_id)
+            return {"status": "merged", "incident_id": target_id, "duplicates": duplicates}
+        
+        if duplicates:
+            print(f"Warning: {incident['id']} looks like a near-duplicate of "
+                  f"{', '.join(f'{d[0]} ({d[1]*100:.0f}%)' for d in duplicates)}")
+        
+        self._insert_incident(incident)
+        self.conn.commit()
+        self._reindex_incident(incident["id"])
+        return {"status": "added", "incident_id": incident["id"], "duplicates": duplicates}
+    
+    def update_incident(self, incident_id: str, fields: Dict = None, keywords: List[str] = None) -> Dict:
+        columns = {"title": "issue_title", "description": "issue_description", "category": "category",
+                   "severity": "severity", "resolution": "resolution_steps", "time": "resolution_time",
+                   "automation": "automation_script"}
+        fields = fields or {}
+        unknown = set(fields) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown incident fields: {', '.join(sorted(unknown))}")
+        self.cursor.execute("SELECT 1 FROM incidents WHERE id = ?", (incident_id,))
+        if self.cursor.fetchone() is None:
+            raise ValueError(f"Unknown incident: {incident_id}")
+        
+        for field, value in fields.items():
+            self.cursor.execute(f"UPDATE incidents SET {columns[field]} = ? WHERE id = ?", (value, incident_id))
+        
+        if keywords is not None:
+            self.cursor.execute("DELETE FROM incident_keywords WHERE incident_id = ?", (incident_id,))
+            for keyword in keywords:
+                self.cursor.execute('''
+                INSERT INTO incident_keywords (incident_id, keyword)
+                VALUES (?, ?)
+                ''', (incident_id, keyword.lower()))
+        self.conn.commit()
+        
+        duplicates = self._reindex_incident(incident_id)
+        if duplicates:
+            print(f"Warning: {incident_id} now looks like a near-duplicate of "
+                  f"{', '.join(f'{d[0]} ({d[1]*100:.0f}%)' for d in duplicates)}")
+        return {"status": "updated", "incident_id": incident_id, "duplicates": duplicates}
+    
+    def merge_incidents(self, keep_id: str, drop_id: str) -> Dict:
+        if keep_id == drop_id:
+            raise ValueError(f"Cannot merge {keep_id} into itself")
+        self.cursor.execute("SELECT id, COALESCE(frequency, 0) FROM incidents WHERE id IN (?, ?)", (keep_id, drop_id))
+        frequencies = dict(self.cursor.fetchall())
+        missing = [incident_id for incident_id in (keep_id, drop_id) if incident_id not in frequencies]
+        if missing:
+            raise ValueError(f"Unknown incident: {', '.join(missing)}")
+        
+        existing = set(self.get_incident_keywords(keep_id))
+        for keyword in self.get_incident_keywords(drop_id):
+            if keyword not in existing:
+                existing.add(keyword)
                 self.cursor.execute('''
                 INSERT INTO incident_keywords (incident_id, keyword)
                 VALUES (?, ?)
-                ''', (incident["id"], keyword.lower()))
+                ''', (keep_id, keyword))
         
+        delta = frequencies[drop_id]
+        self.cursor.execute('''
+        UPDATE incidents
+        SET frequency = COALESCE(frequency, 0) + ?
+        WHERE id = ?
+        ''', (delta, keep_id))
+        self.cursor.execute("DELETE FROM incident_keywords WHERE incident_id = ?", (drop_id,))
+        self.cursor.execute("DELETE FROM incidents WHERE id = ?", (drop_id,))
+        if delta:
+            self._record_change("frequency", keep_id, {"delta": delta, "origin": self.node_id})
+        self._record_change("delete", drop_id)
         self.conn.commit()
-        print(f"Comprehensive Knowledge Base loaded with {len(training_data)} incidents across 7 categories")
+        
+        self.deduplicator.remove(drop_id)
+        self.revisions[drop_id] = self.revisions.get(drop_id, 0) + 1
+        self._reindex_incident(keep_id)
+        return {"status": "merged", "incident_id": keep_id, "merged": drop_id}
+    
+    def enable_change_log(self, node_id: str):
+        self.node_id = node_id
+        self.change_log = True
+        
+        self.cursor.execute("SELECT COUNT(*) FROM kb_changes")
+        if self.cursor.fetchone()[0] == 0:
+            self.cursor.execute("SELECT id FROM incidents ORDER BY id")
+            for (incident_id,) in self.cursor.fetchall():
+                self._record_change("upsert", incident_id, self.export_incident(incident_id))
+            self.conn.commit()
+    
+    def _record_change(self, kind: str, incident_id: str, payload: Dict = None):
+        if not self.change_log:
+            return
+        self.cursor.execute('''
+        INSERT INTO kb_changes (kind, incident_id, payload)
+        VALUES (?, ?, ?)
+        ''', (kind, incident_id, json.dumps(payload) if payload is not None else None))
+    
+    def export_incident(self, incident_id: str) -> Dict:
+        self.cursor.execute('''
+        SELECT issue_title, issue_description, category, severity, resolution_steps, resolution_time,
+               automation_script, frequency
+        FROM incidents WHERE id = ?
+        ''', (incident_id,))
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        return {
+            "id": incident_id, "title": row[0], "description": row[1], "category": row[2], "severity": row[3],
+            "resolution": row[4], "time": row[5], "automation": row[6], "frequency": row[7],
+            "keywords": self.get_incident_keywords(incident_id)
+        }
+    
+    def get_replication_state(self, key: str, default: str = None) -> str:
+        self.cursor.execute("SELECT value FROM replication_state WHERE key = ?", (key,))
+        row = self.cursor.fetchone()
+        return row[0] if row else default
+    
+    def set_replication_state(self, key: str, value):
+        self.cursor.execute('''
+        INSERT INTO replication_state (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (key, str(value)))
+    
+    def _reindex_incident(self, incident_id: str, content_changed: bool = True) -> List[tuple]:
+        if content_changed:
+            self.revisions[incident_id] = self.revisions.get(incident_id, 0) + 1
+            self._bump_content_revision()
+        self.cursor.execute("SELECT issue_title, issue_description FROM incidents WHERE id = ?", (incident_id,))
+        row = self.cursor.fetchone()
+        if self.change_log:
+            if row:
+                self._record_change("upsert", incident_id, self.export_incident(incident_id))
+            else:
+                self._record_change("delete", incident_id)
+        self.conn.commit()
+        if not row:
+            self.deduplicator.remove(incident_id)
+            return []
+        shingles = IncidentDeduplicator.shingles(row[0], row[1], self.get_incident_keywords(incident_id))
+        self.deduplicator.add(incident_id, shingles)
+        return self.deduplicator.query(shingles, exclude=incident_id)
+    
+    def import_incidents(self, path: str, on_duplicate: str = "warn") -> Dict:
+        with open(path, "r", encoding="utf-8") as handle:
+            incidents = json.load(handle)
+        
+        summary = defaultdict(int)
+        for incident in incidents:
+            result = self.add_incident(incident, on_duplicate)
+            summary[result["status"]] += 1
+        return dict(summary)
     
-    def search_by_keywords(self, keywords: List[str]) -> List[Dict]:
+    def search_by_keywords(self, keywords: List[str], limit: int = 10, category: str = None,
+                           exclude_category: str = None) -> List[IncidentRecord]:
         placeholders = ','.join('?' * len(keywords))
+        columns = ', '.join(f"i.{column}" for column in IncidentRecord.COLUMNS)
+        conditions = [f"ik.keyword IN ({placeholders})"]
+        params = [k.lower() for k in keywords]
+        if category is not None:
+            conditions.insert(0, "ik.category = ?")
+            params.insert(0, category)
+        if exclude_category is not None:
+            conditions.append("ik.category IS NOT ?")
+            params.append(exclude_category)
         query = f'''
-        SELECT i.*, COUNT(ik.keyword) as match_count
-        FROM incidents i
-        JOIN incident_keywords ik ON i.id = ik.incident_id
-        WHERE ik.keyword IN ({placeholders})
+        SELECT {columns}, COUNT(ik.keyword) as match_count
+        FROM incident_keywords ik
+        JOIN incidents i ON i.id = ik.incident_id
+        WHERE {" AND ".join(conditions)}
         GROUP BY i.id
         ORDER BY match_count DESC, i.frequency DESC
-        LIMIT 10
+        LIMIT ?
         '''
         
-        self.cursor.execute(query, [k.lower() for k in keywords])
+        self.cursor.execute(query, params + [limit])
+        return [IncidentRecord(*row, loader=self.get_resolution_steps) for row in self.cursor.fetchall()]
+    
+    def get_resolution_steps(self, incident_id: str) -> str:
+        self.cursor.execute("SELECT resolution_steps FROM incidents WHERE id = ?", (incident_id,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+    
+    def increment_frequency(self, incident_id: str, delta: int = 1, origin: str = None):
+        self._add_frequency(incident_id, delta, origin)
+        self.conn.commit()
+    
+    def _add_frequency(self, incident_id: str, delta: int, origin: str = None):
+        self.cursor.execute('''
+        UPDATE incidents 
+        SET frequency = frequency + ? 
+        WHERE id = ?
+        ''', (delta, incident_id))
+        self._record_change("frequency", incident_id, {"delta": delta, "origin": origin or self.node_id})
+        self._notify_frequency(incident_id, delta)
+    
+    def _notify_frequency(self, incident_id: str, delta: int):
+        for observer in self.frequency_observers:
+            observer(incident_id, delta)
+    
+    def get_query_history(self, before_id: int = None, limit: int = 10) -> Dict:
+        if before_id is None:
+            self.cursor.execute('''
+            SELECT query_id, user_query, matched_incident_id, confidence_score, response_time, timestamp
+            FROM query_logs ORDER BY query_id DESC LIMIT ?
+            ''', (limit,))
+        else:
+            self.cursor.execute('''
+            SELECT query_id, user_query, matched_incident_id, confidence_score, response_time, timestamp
+            FROM query_logs WHERE query_id < ? ORDER BY query_id DESC LIMIT ?
+            ''', (before_id, limit))
+        
         columns = [desc[0] for desc in self.cursor.description]
-        results = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
-        return results
+        rows = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+        next_cursor = rows[-1]["query_id"] if len(rows) == limit else None
+        return {"entries": rows, "next_cursor": next_cursor}
     
     def get_all_categories(self) -> List[str]:
         self.cursor.execute("SELECT DISTINCT category FROM incidents")
         return [row[0] for row in self.cursor.fetchall()]
     
-    def log_query(self, user_query: str, incident_id: str, confidence: float, response_time: float):
+    def log_query(self, user_query: str, incident_id: str, confidence: float, response_time: float,
+                  category: str = None, occurrences: int = 1, commit: bool = True):
         self.cursor.execute('''
-        INSERT INTO query_logs (user_query, matched_incident_id, confidence_score, response_time)
-        VALUES (?, ?, ?, ?)
-        ''', (user_query, incident_id, confidence, response_time))
-        self.conn.commit()
+        INSERT INTO query_logs (user_query, matched_incident_id, confidence_score, response_time, occurrences)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (user_query, incident_id, confidence, response_time, occurrences))
+        
+        if incident_id:
+            if category is None:
+                self.cursor.execute("SELECT category FROM incidents WHERE id = ?", (incident_id,))
+                row = self.cursor.fetchone()
+                category = row[0] if row else None
+            self.analytics.record(incident_id, category, confidence or 0.0, response_time or 0.0)
+        if commit:
+            self.conn.commit()
 
-class NLPEngine:
-    def __init__(self, knowledge_base: KnowledgeBaseManager):
+class FileReplicationTransport:
+    def __init__(self, directory: str):
+        self.changes_dir = os.path.join(directory, "changes")
+        self.query_logs_dir = os.path.join(directory, "querylogs")
+        os.makedirs(self.changes_dir, exist_ok=True)
+        os.makedirs(self.query_logs_dir, exist_ok=True)
+    
+    def _write(self, directory: str, name: str, records: List[Dict]):
+        temp_path = os.path.join(directory, f".{name}.tmp{os.getpid()}")
+        with gzip.open(temp_path, "wt", encoding="utf-8") as handle:
+            for record in records:
+                handle.write(json.dumps(record) + "\n")
+        os.replace(temp_path, os.path.join(directory, name))
+    
+    def _read(self, path: str) -> List[Dict]:
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            return [json.loads(line) for line in handle if line.strip()]
+    
+    def publish_changes(self, changes: List[Dict]):
+        self._write(self.changes_dir, f"{changes[0]['change_id']:012d}-{changes[-1]['change_id']:012d}.jsonl.gz", changes)
+    
+    def read_changes(self, after_id: int) -> List[Dict]:
+        names = sorted(name for name in os.listdir(self.changes_dir) if not name.startswith("."))
+        first = bisect.bisect_right(names, f"{after_id:012d}~")
+        if first and int(names[first - 1].split("-")[1].split(".")[0]) > after_id:
+            first -= 1
+        changes = []
+        for name in names[first:]:
+            changes.extend(change for change in self._read(os.path.join(self.changes_dir, name))
+                           if change["change_id"] > after_id)
+        return changes
+    
+    def ship_query_logs(self, node_id: str, last_query_id: int, rows: List[Dict]):
+        self._write(self.query_logs_dir, f"{node_id}-{last_query_id:012d}.jsonl.gz", rows)
+    
+    def list_query_logs(self) -> List[tuple]:
+        batches = []
+        for name in os.listdir(self.query_logs_dir):
+            if name.startswith("."):
+                continue
+            node_id, last_query_id = name[:-len(".jsonl.gz")].rsplit("-", 1)
+            batches.append((node_id, int(last_query_id), name))
+        return sorted(batches)
+    
+    def read_query_logs(self, name: str) -> List[Dict]:
+        return self._read(os.path.join(self.query_logs_dir, name))
+    
+    def acknowledge_query_logs(self, name: str):
+        os.remove(os.path.join(self.query_logs_dir, name))
+
+class ReplicationPublisher:
+    def __init__(self, knowledge_base: KnowledgeBaseManager, transport: FileReplicationTransport, batch_size: int = 1000):
         self.kb = knowledge_base
+        self.transport = transport
+        self.batch_size = batch_size
+        self._migrate_query_log_state()
+    
+    def _migrate_query_log_state(self):
+        self.kb.cursor.execute("SELECT key FROM replication_state WHERE key LIKE 'query_logs:%.jsonl.gz'")
+        for (key,) in self.kb.cursor.fetchall():
+            node_id, last_query_id = key[len("query_logs:"):-len(".jsonl.gz")].rsplit("-", 1)
+            state_key = f"query_logs:{node_id}"
+            self.kb.set_replication_state(state_key, max(int(last_query_id), int(self.kb.get_replication_state(state_key, "0"))))
+            self.kb.cursor.execute("DELETE FROM replication_state WHERE key = ?", (key,))
+        self.kb.conn.commit()
+    
+    def publish(self) -> int:
+        published = 0
+        last_id = int(self.kb.get_replication_state("published_change_id", "0"))
+        while True:
+            self.kb.cursor.execute('''
+            SELECT change_id, kind, incident_id, payload FROM kb_changes
+            WHERE change_id > ? ORDER BY change_id LIMIT ?
+            ''', (last_id, self.batch_size))
+            rows = self.kb.cursor.fetchall()
+            if not rows:
+                return published
+            
+            self.transport.publish_changes(self._coalesce(rows))
+            last_id = rows[-1][0]
+            published += len(rows)
+            self.kb.set_replication_state("published_change_id", last_id)
+            self.kb.conn.commit()
+    
+    def _coalesce(self, rows: List[tuple]) -> List[Dict]:
+        changes = []
+        open_deltas = {}
+        for change_id, kind, incident_id, payload in rows:
+            payload = json.loads(payload) if payload else None
+            if kind == "frequency":
+                key = (incident_id, payload["origin"])
+                if key in open_deltas:
+                    pending = open_deltas[key]
+                    pending["payload"]["delta"] += payload["delta"]
+                    pending["change_id"] = change_id
+                    continue
+                change = {"change_id": change_id, "kind": kind, "incident_id": incident_id, "payload": payload}
+                open_deltas[key] = change
+            else:
+                open_deltas = {key: change for key, change in open_deltas.items() if key[0] != incident_id}
+                change = {"change_id": change_id, "kind": kind, "incident_id": incident_id, "payload": payload}
+            changes.append(change)
         
-        self.tech_vocabulary = {
-            "server": ["server", "tomcat", "nginx", "apache", "iis", "httpd", "port", "service", "restart", 
-                      "shutdown", "startup", "load", "balancer", "reverse", "proxy", "websocket", "ssh",
-                      "dns", "ntp", "smtp", "ftp", "virtual", "host", "container", "docker", "kubernetes",
-                      "vmware", "esxi", "vcenter", "hypervisor"],
-            "database": ["database", "mysql", "postgresql", "mongodb", "redis", "oracle", "sql", "server",
-                        "connection", "timeout", "query", "slow", "db", "replication", "oplog", "tablespace",
-                        "deadlock", "lock", "transaction", "backup", "restore", "index", "schema", "migration",
-                        "cassandra", "nosql", "rdbms"],
-            "performance": ["cpu", "memory", "slow", "performance", "usage", "high", "leak", "bottleneck",
-                          "throughput", "latency", "response", "time", "garbage", "collection", "gc", "heap",
-                          "thread", "dump", "profiling", "optimization", "cache", "miss", "hit", "ratio",
-                          "bandwidth", "saturation", "iostat", "iotop"],
-            "storage": ["disk", "space", "full", "storage", "log", "backup", "cleanup", "raid", "array",
-                       "degraded", "nfs", "mount", "inode", "filesystem", "lvm", "volume", "san", "nas",
-                       "object", "bucket", "s3", "glacier", "archive", "retention", "compression", "snapshot"],
+        changes.sort(key=lambda change: change["change_id"])
+        return changes
+    
+    def collect_query_logs(self) -> int:
+        collected = 0
+        for node_id, last_query_id, name in self.transport.list_query_logs():
+            state_key = f"query_logs:{node_id}"
+            if last_query_id > int(self.kb.get_replication_state(state_key, "0")):
+                rows = self.transport.read_query_logs(name)
+                try:
+                    self._collect_batch(rows, node_id)
+                    self.kb.set_replication_state(state_key, last_query_id)
+                    self.kb.conn.commit()
+                except Exception:
+                    self.kb.conn.rollback()
+                    raise
+                collected += len(rows)
+            self.transport.acknowledge_query_logs(name)
+        return collected
+    
+    def _collect_batch(self, rows: List[Dict], origin: str):
+        for row in rows:
+            self.kb.cursor.execute('''
+            INSERT INTO query_logs (user_query, matched_incident_id, confidence_score, response_time, timestamp, occurrences)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (row["user_query"], row["incident_id"], row["confidence"], row["response_time"],
+                  row["timestamp"], row["occurrences"]))
+            if row["incident_id"]:
+                self.kb.cursor.execute("SELECT category FROM incidents WHERE id = ?", (row["incident_id"],))
+                category = self.kb.cursor.fetchone()
+                timestamp = datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+                self.kb.analytics.record(row["incident_id"], category[0] if category else None,
+                                         row["confidence"] or 0.0, row["response_time"] or 0.0, timestamp)
+                self.kb._add_frequency(row["incident_id"], row["occurrences"] or 1, origin=origin)
+    
+    def sync(self) -> Dict:
+        collected = self.collect_query_logs()
+        return {"query_logs_collected": collected, "changes_published": self.publish()}
+
+class ReplicationApplier:
+    def __init__(self, knowledge_base: KnowledgeBaseManager, transport: FileReplicationTransport, node_id: str):
+        self.kb = knowledge_base
+        self.transport = transport
+        self.node_id = node_id
+        self.kb.node_id = node_id
+    
+    def apply(self) -> int:
+        applied_id = int(self.kb.get_replication_state("applied_change_id", "0"))
+        changes = self.transport.read_changes(applied_id)
+        if not changes:
+            return 0
+        
+        touched = {}
+        for change in changes:
+            self._apply_change(change)
+            touched[change["incident_id"]] = touched.get(change["incident_id"], False) or change["kind"] != "frequency"
+        self.kb.set_replication_state("applied_change_id", changes[-1]["change_id"])
+        self.kb.conn.commit()
+        
+        for incident_id, content_changed in touched.items():
+            self.kb._reindex_incident(incident_id, content_changed)
+        return len(changes)
+    
+    def _apply_change(self, change: Dict):
+        cursor = self.kb.cursor
+        incident_id = change["incident_id"]
+        payload = change["payload"]
+        
+        if change["kind"] == "frequency":
+            if payload["origin"] != self.node_id:
+                cursor.execute("UPDATE incidents SET frequency = frequency + ? WHERE id = ?", (payload["delta"], incident_id))
+                self.kb._notify_frequency(incident_id, payload["delta"])
+        elif change["kind"] == "delete":
+            cursor.execute("DELETE FROM incident_keywords WHERE incident_id = ?", (incident_id,))
+            cursor.execute("DELETE FROM incidents WHERE id = ?", (incident_id,))
+        elif change["kind"] == "upsert":
+            cursor.execute("SELECT 1 FROM incidents WHERE id = ?", (incident_id,))
+            if cursor.fetchone():
+                cursor.execute('''
+                UPDATE incidents
+                SET issue_title = ?, issue_description = ?, category = ?, severity = ?, resolution_steps = ?,
+                    resolution_time = ?, automation_script = ?
+                WHERE id = ?
+                ''', (payload["title"], payload["description"], payload["category"], payload["severity"],
+                      payload["resolution"], payload["time"], payload["automation"], incident_id))
+                cursor.execute("DELETE FROM incident_keywords WHERE incident_id = ?", (incident_id,))
+                for keyword in payload["keywords"]:
+                    cursor.execute('''
+                    INSERT INTO incident_keywords (incident_id, keyword)
+                    VALUES (?, ?)
+                    ''', (incident_id, keyword))
+            else:
+                self.kb._insert_incident(payload)
+                cursor.execute("UPDATE incidents SET frequency = ? WHERE id = ?", (payload["frequency"], incident_id))
+    
+    def ship_query_logs(self) -> int:
+        shipped_id = int(self.kb.get_replication_state("shipped_query_id", "0"))
+        self.kb.cursor.execute('''
+        SELECT query_id, user_query, matched_incident_id, confidence_score, response_time, timestamp, occurrences
+        FROM query_logs WHERE query_id > ? ORDER BY query_id
+        ''', (shipped_id,))
+        rows = self.kb.cursor.fetchall()
+        if not rows:
+            return 0
+        
+        self.transport.ship_query_logs(self.node_id, rows[-1][0], [
+            {"user_query": row[1], "incident_id": row[2], "confidence": row[3], "response_time": row[4],
+             "timestamp": row[5], "occurrences": row[6]}
+            for row in rows
+        ])
+        self.kb.set_replication_state("shipped_query_id", rows[-1][0])
+        self.kb.conn.commit()
+        return len(rows)
+    
+    def sync(self) -> Dict:
+        shipped = self.ship_query_logs()
+        return {"query_logs_shipped": shipped, "changes_applied": self.apply()}
+
+SYNONYM_MAX_EXPANSIONS = 12
+DEFAULT_SYNONYMS = {
+    "pg": ["postgresql"],
+    "postgres": ["postgresql"],
+    "psql": ["postgresql"],
+    "mongo": ["mongodb"],
+    "db": ["database"],
+    "dbs": ["database"],
+    "k8s": ["kubernetes"],
+    "kube": ["kubernetes"],
+    "kubectl": ["kubernetes"],
+    "pod": {"terms": ["kubernetes", "container"], "weight": 0.6},
+    "oom": ["outofmemoryerror", "memory"],
+    "oomkilled": ["outofmemoryerror", "memory", "container"],
+    "out of memory": ["oom", "outofmemoryerror"],
+    "mem": ["memory"],
+    "ram": ["memory"],
+    "proc": ["process"],
+    "perf": ["performance"],
+    "gc": ["garbage collection"],
+    "cert": ["certificate"],
+    "certs": ["certificate"],
+    "tls": {"terms": ["ssl"], "weight": 0.8},
+    "lb": ["load balancer"],
+    "elb": ["load balancer"],
+    "alb": ["load balancer"],
+    "conn": ["connection"],
+    "conns": ["connection"],
+    "timed out": ["timeout"],
+    "connection refused": {"terms": ["connection", "network"], "weight": 0.7},
+    "no space left": ["disk", "space", "full"],
+    "hdd": ["disk"],
+    "ssd": ["disk"],
+    "fs": ["filesystem"],
+    "5xx": ["500", "error"],
+    "bad gateway": ["502"],
+    "svc": ["service"],
+    "fw": ["firewall"],
+    "repl": ["replication"],
+    "auth": {"terms": ["authentication", "authorization"], "weight": 0.7},
+    "authn": ["authentication"],
+    "authz": ["authorization"],
+    "dos": {"terms": ["denial", "service", "ddos"], "weight": 0.8},
+    "httpd": {"terms": ["apache"], "weight": 0.8},
+    "vm": {"terms": ["virtual", "host"], "weight": 0.7}
+}
+
+def load_synonyms(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as handle:
+        entries = json.load(handle)
+    if not isinstance(entries, dict):
+        raise ValueError(f"Synonym file {path} must map terms to expansions")
+    return dict(DEFAULT_SYNONYMS, **entries)
+
+class SynonymTable:
+    TOKEN_PATTERN = re.compile(r'\b[a-z0-9]+\b')
+    
+    def __init__(self, entries: Dict, stop_words: set = frozenset(), max_expansions: int = SYNONYM_MAX_EXPANSIONS):
+        self.max_expansions = max_expansions
+        self.max_phrase = 1
+        compiled = {}
+        for source, target in entries.items():
+            terms, weight = (target, 1.0) if isinstance(target, list) else (target["terms"], float(target.get("weight", 1.0)))
+            key = tuple(token for token in self.TOKEN_PATTERN.findall(source.lower()) if token not in stop_words)
+            if not key:
+                continue
+            expansion = compiled.setdefault(key, {})
+            for term in terms:
+                for token in self.TOKEN_PATTERN.findall(term.lower()):
+                    if token not in stop_words and token not in key and weight > expansion.get(token, 0.0):
+                        expansion[token] = weight
+            self.max_phrase = max(self.max_phrase, len(key))
+        self.table = {key: tuple(sorted(expansion.items(), key=lambda x: -x[1])) for key, expansion in compiled.items() if expansion}
+    
+    def __len__(self) -> int:
+        return len(self.table)
+    
+    def expand(self, tokens: List[str]) -> Dict[str, float]:
+        expansions = {}
+        table = self.table
+        count = len(tokens)
+        for start in range(count):
+            for length in range(1, min(self.max_phrase, count - start) + 1):
+                terms = table.get(tuple(tokens[start:start + length]))
+                if terms is None:
+                    continue
+                for term, weight in terms:
+                    if weight > expansions.get(term, 0.0):
+                        expansions[term] = weight
+        
+        for token in tokens:
+            expansions.pop(token, None)
+        if len(expansions) > self.max_expansions:
+            expansions = dict(heapq.nlargest(self.max_expansions, expansions.items(), key=lambda x: x[1]))
+        return expansions
+
+class NLPEngine:
+    def __init__(self, knowledge_base: KnowledgeBaseManager, synonyms: Dict = None):
+        self.kb = knowledge_base
+        
+        self.tech_vocabulary = {
+            "server": ["server", "tomcat", "nginx", "apache", "iis", "httpd", "port", "service", "restart", 
+                      "shutdown", "startup", "load", "balancer", "reverse", "proxy", "websocket", "ssh",
+                      "dns", "ntp", "smtp", "ftp", "virtual", "host", "container", "docker", "kubernetes",
+                      "vmware", "esxi", "vcenter", "hypervisor"],
+            "database": ["database", "mysql", "postgresql", "mongodb", "redis", "oracle", "sql", "server",
+                        "connection", "timeout", "query", "slow", "db", "replication", "oplog", "tablespace",
+                        "deadlock", "lock", "transaction", "backup", "restore", "index", "schema", "migration",
+                        "cassandra", "nosql", "rdbms"],
+            "performance": ["cpu", "memory", "slow", "performance", "usage", "high", "leak", "bottleneck",
+                          "throughput", "latency", "response", "time", "garbage", "collection", "gc", "heap",
+                          "thread", "dump", "profiling", "optimization", "cache", "miss", "hit", "ratio",
+                          "bandwidth", "saturation", "iostat", "iotop"],
+            "storage": ["disk", "space", "full", "storage", "log", "backup", "cleanup", "raid", "array",
+                       "degraded", "nfs", "mount", "inode", "filesystem", "lvm", "volume", "san", "nas",
+                       "object", "bucket", "s3", "glacier", "archive", "retention", "compression", "snapshot"],
             "network": ["network", "latency", "ssl", "certificate", "https", "ping", "timeout", "firewall",
                        "port", "blocking", "dns", "propagation", "vpn", "cdn", "cache", "packet", "loss",
                        "interface", "bandwidth", "throughput", "load", "balancer", "termination", "ddos",
@@ -877,6 +2266,7 @@ class NLPEngine:
         self.stop_words = {"the", "is", "on", "in", "at", "and", "or", "a", "an", "to", "for", "of", "with", "by", "as",
                           "from", "that", "this", "it", "be", "are", "was", "were", "have", "has", "had", "do", "does",
                           "did", "but", "not", "what", "which", "how", "why", "when", "where", "who", "whom", "whose"}
+        self.synonyms = SynonymTable(DEFAULT_SYNONYMS if synonyms is None else synonyms, self.stop_words)
         
         self.patterns = {
             "port": r"port\s+(\d{1,5})",
@@ -901,6 +2291,10 @@ class NLPEngine:
         
         tokens = re.findall(r'\b[a-z0-9]+\b', query_lower)
         tokens = [t for t in tokens if t not in self.stop_words]
+        words = [w for w in re.findall(r'[a-z0-9]+(?:[-.][a-z0-9]+)*', query_lower) if w not in self.stop_words]
+        present = set(tokens)
+        expansions = {term: weight for term, weight in self.synonyms.expand(words).items() if term not in present}
+        tokens.extend(expansions)
         
         category_scores = defaultdict(float)
         matched_keywords = defaultdict(list)
@@ -908,7 +2302,7 @@ class NLPEngine:
         for category, keywords in self.tech_vocabulary.items():
             for token in tokens:
                 if token in keywords:
-                    category_scores[category] += 1.0
+                    category_scores[category] += expansions.get(token, 1.0)
                     matched_keywords[category].append(token)
         
         primary_category = max(category_scores.items(), key=lambda x: x[1])[0] if category_scores else "unknown"
@@ -919,9 +2313,14 @@ class NLPEngine:
             "patterns": extracted_patterns,
             "category_scores": dict(category_scores),
             "primary_category": primary_category,
-            "matched_keywords": dict(matched_keywords)
+            "matched_keywords": dict(matched_keywords),
+            "expansions": expansions
         }
     
+    def memory_estimate(self) -> int:
+        terms = sum(sys.getsizeof(term) for terms in self.tech_vocabulary.values() for term in terms)
+        return terms + sum(sys.getsizeof(key) + sys.getsizeof(expansion) for key, expansion in self.synonyms.table.items())
+    
     def extract_key_terms(self, tokens: List[str]) -> List[str]:
         key_terms = []
         for token in tokens:
@@ -950,11 +2349,315 @@ class NLPEngine:
         boost = exact_matches * 0.1
         
         return min(similarity + boost, 1.0)
+    
+    def calculate_similarities(self, query_tokens: List[str], keyword_lists: List[List[str]]) -> tuple:
+        query_set = set(query_tokens)
+        similarities = []
+        intersections = []
+        for incident_keywords in keyword_lists:
+            if not query_tokens or not incident_keywords:
+                similarities.append(0.0)
+                intersections.append(0)
+                continue
+            
+            incident_set = set(incident_keywords)
+            intersection = len(query_set & incident_set)
+            exact_matches = sum(1 for t in query_tokens if t in incident_set)
+            similarities.append(min(intersection / (len(query_set) + len(incident_set) - intersection) + exact_matches * 0.1, 1.0))
+            intersections.append(intersection)
+        return similarities, intersections
+
+class ScoredMatch:
+    __slots__ = ("record", "similarity_score", "confidence_score", "confidence_level", "exact_matches",
+                 "partial_matches", "category_alignment", "pattern_matches", "primary_category", "total_key_terms")
+    
+    def __init__(self, record: IncidentRecord, similarity_score: float, confidence_score: float,
+                 confidence_level: str, exact_matches: int, partial_matches: int, category_alignment: bool,
+                 pattern_matches: int, primary_category: str, total_key_terms: int):
+        self.record = record
+        self.similarity_score = similarity_score
+        self.confidence_score = confidence_score
+        self.confidence_level = confidence_level
+        self.exact_matches = exact_matches
+        self.partial_matches = partial_matches
+        self.category_alignment = category_alignment
+        self.pattern_matches = pattern_matches
+        self.primary_category = primary_category
+        self.total_key_terms = total_key_terms
+    
+    def __getattr__(self, name: str):
+        if name == "record":
+            raise AttributeError(name)
+        return getattr(self.record, name)
+    
+    @property
+    def match_quality(self) -> Dict:
+        return {
+            "exact_matches": self.exact_matches,
+            "partial_matches": self.partial_matches,
+            "category_alignment": self.category_alignment,
+            "pattern_matches": self.pattern_matches
+        }
+    
+    @property
+    def analysis_summary(self) -> Dict:
+        return {
+            "primary_category": self.primary_category,
+            "key_terms_matched": self.exact_matches,
+            "total_key_terms": self.total_key_terms
+        }
+    
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+    
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+    
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+    
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            object.__setattr__(self, slot, value)
+    
+    def to_dict(self) -> Dict:
+        return {
+            **self.record.to_dict(),
+            "similarity_score": self.similarity_score,
+            "confidence_score": self.confidence_score,
+            "confidence_level": self.confidence_level,
+            "match_quality": self.match_quality,
+            "analysis_summary": self.analysis_summary
+        }
+
+class CandidateBatch:
+    __slots__ = ("records", "scores", "components", "features")
+    
+    def __init__(self, records: List[IncidentRecord]):
+        self.records = records
+        self.scores = [0.0] * len(records)
+        self.components = {}
+        self.features = {}
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def column(self, attribute: str) -> List:
+        return [getattr(record, attribute) for record in self.records]
+    
+    def select(self, indices: List[int]) -> "CandidateBatch":
+        batch = CandidateBatch([self.records[i] for i in indices])
+        batch.scores = [self.scores[i] for i in indices]
+        batch.components = {name: [values[i] for i in indices] for name, values in self.components.items()}
+        batch.features = {name: [values[i] for i in indices] for name, values in self.features.items()}
+        return batch
+
+class RankingContext:
+    def __init__(self, analysis: Dict, key_terms: List[str], keyword_lookup):
+        self.analysis = analysis
+        self.key_terms = key_terms
+        self.keyword_lookup = keyword_lookup
+        self.token_set = set(analysis["tokens"])
+        self.candidate_limit = 10
+        self.category = None
+        self.exclude_category = None
+        self.stats = {"generated": 0, "pruned": 0, "early_exit": False, "partition": None, "fallback": False, "timings": {}}
+
+class CandidateGenerator:
+    name = "generator"
+    cost = 1.0
+    
+    def generate(self, context: RankingContext) -> List[IncidentRecord]:
+        raise NotImplementedError
+
+class KeywordCandidateGenerator(CandidateGenerator):
+    name = "keyword_search"
+    cost = 5.0
+    
+    def __init__(self, search):
+        self.search = search
+    
+    def generate(self, context: RankingContext) -> List[IncidentRecord]:
+        if context.category is None and context.exclude_category is None:
+            return self.search(context.key_terms, context.candidate_limit)
+        return self.search(context.key_terms, context.candidate_limit, category=context.category,
+                           exclude_category=context.exclude_category)
+
+class RankingStage:
+    name = "stage"
+    cost = 1.0
+    dominant = False
+    
+    def max_contribution(self, context: RankingContext) -> float:
+        return 1.0
+    
+    def score(self, context: RankingContext, batch: CandidateBatch) -> List[float]:
+        raise NotImplementedError
+
+class CategoryBoostStage(RankingStage):
+    name = "category"
+    cost = 1.0
+    
+    def max_contribution(self, context: RankingContext) -> float:
+        return 0.25
+    
+    def score(self, context: RankingContext, batch: CandidateBatch) -> List[float]:
+        primary_category = context.analysis["primary_category"]
+        return [0.25 if category == primary_category else 0.0 for category in batch.column("category")]
+
+class SeverityBoostStage(RankingStage):
+    name = "severity"
+    cost = 1.0
+    
+    def __init__(self):
+        self.severity_weights = {"critical": 0.3, "high": 0.2, "medium": 0.1, "low": 0.05}
+        self.max_weight = max(self.severity_weights.values())
+    
+    def max_contribution(self, context: RankingContext) -> float:
+        return self.max_weight
+    
+    def score(self, context: RankingContext, batch: CandidateBatch) -> List[float]:
+        weights = self.severity_weights
+        return [weights.get(severity, 0.0) for severity in batch.column("severity")]
+
+class FrequencyBoostStage(RankingStage):
+    name = "frequency"
+    cost = 1.0
+    
+    def max_contribution(self, context: RankingContext) -> float:
+        return 0.15
+    
+    def score(self, context: RankingContext, batch: CandidateBatch) -> List[float]:
+        return [min((frequency or 1) / 50, 0.15) for frequency in batch.column("frequency")]
+
+class PatternBoostStage(RankingStage):
+    name = "pattern"
+    cost = 1.0
+    
+    def max_contribution(self, context: RankingContext) -> float:
+        return sum(len(matches) * 0.05 for matches in context.analysis["patterns"].values())
+    
+    def score(self, context: RankingContext, batch: CandidateBatch) -> List[float]:
+        return [self.max_contribution(context)] * len(batch)
+
+class KeywordSimilarityStage(RankingStage):
+    name = "similarity"
+    cost = 10.0
+    dominant = True
+    
+    def __init__(self, nlp_engine: NLPEngine):
+        self.nlp = nlp_engine
+    
+    def score(self, context: RankingContext, batch: CandidateBatch) -> List[float]:
+        keywords = context.keyword_lookup([record.id for record in batch.records])
+        keyword_lists = [keywords.get(record.id, []) for record in batch.records]
+        similarities, intersections = self.nlp.calculate_similarities(context.analysis["tokens"], keyword_lists)
+        batch.features["exact_matches"] = intersections
+        return similarities
+
+class RankingPipeline:
+    def __init__(self, confidence_thresholds: Dict[str, float], early_exit_level: str = "very_high"):
+        self.confidence_thresholds = confidence_thresholds
+        self.early_exit_level = early_exit_level
+        self.generators = []
+        self.stages = []
+        self.stage_timings = defaultdict(lambda: {"calls": 0, "total_ms": 0.0, "candidates": 0})
+    
+    def register_generator(self, generator: CandidateGenerator):
+        self.generators.append(generator)
+        self.generators.sort(key=lambda g: g.cost)
+    
+    def register(self, stage: RankingStage):
+        self.stages.append(stage)
+        self.stages.sort(key=lambda s: (not s.dominant, s.cost))
+    
+    def unregister(self, name: str):
+        self.stages = [stage for stage in self.stages if stage.name != name]
+        self.generators = [generator for generator in self.generators if generator.name != name]
+    
+    def _time(self, context: RankingContext, name: str, started: float, candidates: int):
+        elapsed = (time.perf_counter() - started) * 1000
+        timing = self.stage_timings[name]
+        timing["calls"] += 1
+        timing["total_ms"] += elapsed
+        timing["candidates"] += candidates
+        context.stats["timings"][name] = context.stats["timings"].get(name, 0.0) + elapsed
+        STAGE_SECONDS.observe(elapsed / 1000, stage=name)
+    
+    def generate(self, context: RankingContext) -> List[IncidentRecord]:
+        seen = set()
+        records = []
+        for generator in self.generators:
+            started = time.perf_counter()
+            generated = generator.generate(context)
+            self._time(context, generator.name, started, len(generated))
+            for record in generated:
+                if record.id not in seen:
+                    seen.add(record.id)
+                    records.append(record)
+        context.stats["generated"] = len(records)
+        return records
+    
+    def score(self, context: RankingContext, records: List[IncidentRecord], top_k: int = None) -> CandidateBatch:
+        batch = CandidateBatch(records)
+        early_exit_threshold = self.confidence_thresholds.get(self.early_exit_level)
+        remaining = [stage.max_contribution(context) for stage in self.stages]
+        
+        for position, stage in enumerate(self.stages):
+            if not batch.records:
+                break
+            
+            started = time.perf_counter()
+            column = stage.score(context, batch)
+            self._time(context, stage.name, started, len(batch))
+            batch.components[stage.name] = column
+            batch.scores = [score + value for score, value in zip(batch.scores, column)]
+            
+            headroom = sum(remaining[position + 1:])
+            if headroom <= 0:
+                continue
+            
+            keep = top_k
+            if early_exit_threshold is not None and min(max(batch.scores), 1.0) >= early_exit_threshold:
+                context.stats["early_exit"] = True
+                keep = 1
+            
+            if keep and len(batch) > keep:
+                floor = round(min(heapq.nlargest(keep, batch.scores)[-1], 1.0), 3)
+                survivors = [i for i, score in enumerate(batch.scores) if round(min(score + headroom, 1.0), 3) >= floor]
+                context.stats["pruned"] += len(batch) - len(survivors)
+                batch = batch.select(survivors)
+        
+        return batch
+    
+    def run(self, context: RankingContext, top_k: int = None, fallback_threshold: float = None) -> CandidateBatch:
+        batch = self.score(context, self.generate(context), top_k)
+        if context.category is None or fallback_threshold is None:
+            return batch
+        if batch.records and min(max(batch.scores), 1.0) >= fallback_threshold:
+            return batch
+        
+        context.stats["fallback"] = True
+        context.category, context.exclude_category = None, context.category
+        generated = context.stats["generated"]
+        records = batch.records + self.generate(context)
+        context.stats["generated"] += generated
+        return self.score(context, records, top_k)
+
+def _match_sort_key(result: ScoredMatch) -> tuple:
+    return (result.confidence_score, result.match_count, result.frequency or 1)
 
 class PatternMatcher:
-    def __init__(self, knowledge_base: KnowledgeBaseManager, nlp_engine: NLPEngine):
+    def __init__(self, knowledge_base: KnowledgeBaseManager, nlp_engine: NLPEngine, early_exit_level: str = "very_high",
+                 candidate_limit: int = 10, top_k: int = 10, category_threshold: float = 0.75):
         self.kb = knowledge_base
         self.nlp = nlp_engine
+        self.candidate_limit = candidate_limit
+        self.top_k = top_k
+        self.category_threshold = category_threshold
         self.confidence_thresholds = {
             "very_high": 0.9,
             "high": 0.75,
@@ -963,83 +2666,108 @@ class PatternMatcher:
             "very_low": 0.2,
             "no_match": 0.0
         }
+        self.last_ranking_stats = {}
+        self._compile_confidence_levels()
+        
+        self.pipeline = RankingPipeline(self.confidence_thresholds, early_exit_level)
+        self.pipeline.register_generator(KeywordCandidateGenerator(
+            lambda key_terms, limit, **partition: self.kb.search_by_keywords(key_terms, limit, **partition)))
+        for stage in (CategoryBoostStage(), SeverityBoostStage(), FrequencyBoostStage(), PatternBoostStage(),
+                      KeywordSimilarityStage(nlp_engine)):
+            self.pipeline.register(stage)
+    
+    def register_stage(self, stage: RankingStage):
+        self.pipeline.register(stage)
     
-    def find_matches(self, user_query: str) -> List[Dict]:
+    def _compile_confidence_levels(self):
+        ordered = sorted(self.confidence_thresholds.items(), key=lambda x: x[1])
+        self._level_thresholds = [threshold for _, threshold in ordered]
+        self._level_names = [level for level, _ in ordered]
+    
+    def confidence_levels(self, confidences: List[float]) -> List[str]:
+        thresholds, names = self._level_thresholds, self._level_names
+        return [names[bisect.bisect_right(thresholds, confidence) - 1] if confidence >= thresholds[0] else "no_match"
+                for confidence in confidences]
+    
+    def find_matches(self, user_query: str, analysis: Dict = None, record: bool = True,
+                     candidate_limit: int = None, top_k: int = None) -> List[ScoredMatch]:
         start_time = time.time()
         
-        analysis = self.nlp.preprocess_query(user_query)
+        analysis = analysis or self.nlp.preprocess_query(user_query)
         key_terms = self.nlp.extract_key_terms(analysis["tokens"])
         
         if not key_terms:
             return []
         
-        kb_results = self.kb.search_by_keywords(key_terms)
-        
-        detailed_results = []
-        for result in kb_results:
-            self.kb.cursor.execute('''
-            SELECT keyword FROM incident_keywords WHERE incident_id = ?
-            ''', (result["id"],))
-            incident_keywords = [row[0] for row in self.kb.cursor.fetchall()]
-            
-            similarity = self.nlp.calculate_similarity(analysis["tokens"], incident_keywords)
-            
-            category_match_boost = 0.25 if result["category"] == analysis["primary_category"] else 0.0
-            
-            severity_weights = {"critical": 0.3, "high": 0.2, "medium": 0.1, "low": 0.05}
-            severity_boost = severity_weights.get(result["severity"], 0.0)
-            
-            frequency_boost = min(result.get("frequency", 1) / 50, 0.15)
-            
-            pattern_boost = 0.0
-            for pattern_matches in analysis["patterns"].values():
-                pattern_boost += len(pattern_matches) * 0.05
-            
-            confidence = min(similarity + category_match_boost + severity_boost + frequency_boost + pattern_boost, 1.0)
-            
-            confidence_level = "no_match"
-            for level, threshold in sorted(self.confidence_thresholds.items(), key=lambda x: x[1], reverse=True):
-                if confidence >= threshold:
-                    confidence_level = level
-                    break
-            
-            match_quality = {
-                "exact_matches": len(set(analysis["tokens"]).intersection(set(incident_keywords))),
-                "partial_matches": len(set(analysis["tokens"])) - len(set(analysis["tokens"]).intersection(set(incident_keywords))),
-                "category_alignment": result["category"] == analysis["primary_category"],
-                "pattern_matches": len(analysis["patterns"])
-            }
-            
-            detailed_results.append({
-                **result,
-                "similarity_score": round(similarity, 3),
-                "confidence_score": round(confidence, 3),
-                "confidence_level": confidence_level,
-                "match_quality": match_quality,
-                "analysis_summary": {
-                    "primary_category": analysis["primary_category"],
-                    "key_terms_matched": match_quality["exact_matches"],
-                    "total_key_terms": len(key_terms)
-                }
-            })
-        
-        detailed_results.sort(key=lambda x: x["confidence_score"], reverse=True)
+        top_k = top_k or self.top_k
+        context = RankingContext(analysis, key_terms, self._fetch_incident_keywords)
+        context.candidate_limit = candidate_limit or self.candidate_limit
+        if self.category_threshold is not None and analysis["primary_category"] != "unknown":
+            context.category = context.stats["partition"] = analysis["primary_category"]
+        batch = self.pipeline.run(context, top_k, self.category_threshold)
+        detailed_results = heapq.nlargest(top_k, self._build_matches(context, batch), key=_match_sort_key)
+        self.last_ranking_stats = context.stats
         
         response_time = (time.time() - start_time) * 1000
         
-        if detailed_results:
-            best_match = detailed_results[0]
-            self.kb.log_query(user_query, best_match["id"], best_match["confidence_score"], response_time)
-            
-            self.kb.cursor.execute('''
-            UPDATE incidents 
-            SET frequency = frequency + 1 
-            WHERE id = ?
-            ''', (best_match["id"],))
-            self.kb.conn.commit()
+        if detailed_results and record:
+            self._record_best_match(user_query, detailed_results[0], response_time)
         
         return detailed_results
     
+    def _fetch_incident_keywords(self, incident_ids: List[str]) -> Dict[str, List[str]]:
+        if not incident_ids:
+            return {}
+        placeholders = ','.join('?' * len(incident_ids))
+        self.kb.cursor.execute(f'''
+        SELECT incident_id, keyword FROM incident_keywords WHERE incident_id IN ({placeholders})
+        ''', incident_ids)
+        keywords = defaultdict(list)
+        for incident_id, keyword in self.kb.cursor.fetchall():
+            keywords[incident_id].append(keyword)
+        return keywords
+    
+    def score_candidates(self, analysis: Dict, key_terms: List[str], candidates: List[IncidentRecord], keyword_lookup,
+                         top_k: int = None) -> List[ScoredMatch]:
+        context = RankingContext(analysis, key_terms, keyword_lookup)
+        return self._build_matches(context, self.pipeline.score(context, candidates, top_k))
+    
+    def _build_matches(self, context: RankingContext, batch: CandidateBatch) -> List[ScoredMatch]:
+        analysis = context.analysis
+        primary_category = analysis["primary_category"]
+        token_count = len(context.token_set)
+        pattern_count = len(analysis["patterns"])
+        key_term_count = len(context.key_terms)
+        
+        confidences = [min(score, 1.0) for score in batch.scores]
+        levels = self.confidence_levels(confidences)
+        similarities = batch.components.get("similarity", [0.0] * len(batch))
+        exact = batch.features.get("exact_matches", [0] * len(batch))
+        
+        return [
+            ScoredMatch(
+                record,
+                similarity_score=round(similarity, 3),
+                confidence_score=round(confidence, 3),
+                confidence_level=level,
+                exact_matches=exact_matches,
+                partial_matches=token_count - exact_matches,
+                category_alignment=record.category == primary_category,
+                pattern_matches=pattern_count,
+                primary_category=primary_category,
+                total_key_terms=key_term_count
+            )
+            for record, similarity, confidence, level, exact_matches in zip(batch.records, similarities, confidences, levels, exact)
+        ]
+    
+    def _record_best_match(self, user_query: str, best_match: ScoredMatch, response_time: float, occurrences: int = 1):
+        self.kb.log_query(user_query, best_match.id, best_match.confidence_score, response_time,
+                          best_match.category, occurrences, commit=False)
+        self.kb.increment_frequency(best_match.id)
+    
+    def close(self):
+        pass
+    
     def get_recommended_action(self, confidence_level: str, incident_severity: str = None) -> str:
         actions = {
             "very_high": {
@@ -1071,11 +2799,1303 @@ class PatternMatcher:
         
         return "UNKNOWN ACTION"
 
+class IncidentIndex:
+    def __init__(self, incidents: List[IncidentRecord], keywords: Dict[str, List[str]]):
+        self.incidents = {incident.id: incident for incident in incidents}
+        self.keywords = keywords
+        self.postings = defaultdict(list)
+        
+        for incident_id, incident_keywords in keywords.items():
+            for keyword in incident_keywords:
+                self.postings[keyword].append(incident_id)
+    
+    @classmethod
+    def from_knowledge_base(cls, knowledge_base: KnowledgeBaseManager) -> "IncidentIndex":
+        knowledge_base.cursor.execute(f"SELECT {', '.join(IncidentRecord.COLUMNS)} FROM incidents")
+        incidents = [IncidentRecord(*row) for row in knowledge_base.cursor.fetchall()]
+        
+        keywords = defaultdict(list)
+        knowledge_base.cursor.execute("SELECT incident_id, keyword FROM incident_keywords")
+        for incident_id, keyword in knowledge_base.cursor.fetchall():
+            keywords[incident_id].append(keyword)
+        
+        return cls(incidents, dict(keywords))
+    
+    def search_by_keywords(self, keywords: List[str], limit: int = 10, category: str = None,
+                           exclude_category: str = None) -> List[IncidentRecord]:
+        match_counts = defaultdict(int)
+        for keyword in {k.lower() for k in keywords}:
+            for incident_id in self.postings.get(keyword, ()):
+                incident_category = self.incidents[incident_id].category
+                if (category is None or incident_category == category) and incident_category != exclude_category:
+                    match_counts[incident_id] += 1
+        
+        ranked = sorted(
+            match_counts.items(),
+            key=lambda x: (-x[1], -(self.incidents[x[0]].frequency or 1), x[0])
+        )
+        return [self.incidents[incident_id].with_match_count(count) for incident_id, count in ranked[:limit]]
+    
+    def get_keywords(self, incident_ids: List[str]) -> Dict[str, List[str]]:
+        return {incident_id: self.keywords.get(incident_id, []) for incident_id in incident_ids}
+    
+    def apply_frequency_deltas(self, deltas: Dict[str, int]):
+        for incident_id, delta in deltas.items():
+            if incident_id in self.incidents:
+                self.incidents[incident_id].frequency = (self.incidents[incident_id].frequency or 1) + delta
+    
+    def __len__(self) -> int:
+        return len(self.incidents)
+    
+    def split(self, num_shards: int, shard_by: str = "category") -> List["IncidentIndex"]:
+        assignments = _assign_shards({incident_id: incident.category for incident_id, incident in self.incidents.items()},
+                                     num_shards, shard_by)
+        
+        shards = []
+        for shard in range(num_shards):
+            shard_ids = [incident_id for incident_id, assigned in assignments.items() if assigned == shard]
+            if shard_ids:
+                shards.append(IncidentIndex(
+                    [self.incidents[incident_id] for incident_id in shard_ids],
+                    {incident_id: self.keywords.get(incident_id, []) for incident_id in shard_ids}
+                ))
+        return shards
+
+def _assign_shards(categories: Dict[str, str], num_shards: int, shard_by: str = "category") -> Dict[str, int]:
+    assignments = {}
+    if shard_by == "category":
+        category_sizes = defaultdict(int)
+        for category in categories.values():
+            category_sizes[category] += 1
+        
+        shard_loads = [0] * num_shards
+        category_shard = {}
+        for category, size in sorted(category_sizes.items(), key=lambda x: (-x[1], x[0])):
+            shard = shard_loads.index(min(shard_loads))
+            category_shard[category] = shard
+            shard_loads[shard] += size
+        
+        for incident_id, category in categories.items():
+            assignments[incident_id] = category_shard[category]
+    elif shard_by == "hash":
+        for incident_id in categories:
+            assignments[incident_id] = zlib.crc32(incident_id.encode("utf-8")) % num_shards
+    else:
+        raise ValueError(f"Unknown shard strategy: {shard_by}")
+    return assignments
+
+SNAPSHOT_MAGIC = b"PSBSNAP\0"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sII")
+SNAPSHOT_SECTION = struct.Struct("<16sQQI")
+SNAPSHOT_INCIDENT = struct.Struct("<9I")
+SNAPSHOT_ALIGNMENT = 8
+SNAPSHOT_NO_STRING = 0xFFFFFFFF
+
+class _SnapshotStrings:
+    __slots__ = ("offsets", "blob", "count")
+    
+    def __init__(self, offsets: memoryview, blob: memoryview, count: int):
+        self.offsets = offsets
+        self.blob = blob
+        self.count = count
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __getitem__(self, ordinal: int) -> str:
+        return str(self.blob[self.offsets[ordinal]:self.offsets[ordinal + 1]], "utf-8")
+
+class _SnapshotRefs:
+    __slots__ = ("refs", "strings")
+    
+    def __init__(self, refs: memoryview, strings: _SnapshotStrings):
+        self.refs = refs
+        self.strings = strings
+    
+    def __len__(self) -> int:
+        return len(self.refs)
+    
+    def __getitem__(self, position: int) -> str:
+        return self.strings[self.refs[position]]
+
+class SnapshotIndex:
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        with open(path, "rb") as handle:
+            self.mm = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mm)
+        
+        magic, version, section_count = SNAPSHOT_HEADER.unpack_from(self.mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not an index snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version} (expected {SNAPSHOT_VERSION})")
+        
+        sections = {}
+        for position in range(section_count):
+            name, offset, length, checksum = SNAPSHOT_SECTION.unpack_from(
+                self.mm, SNAPSHOT_HEADER.size + position * SNAPSHOT_SECTION.size)
+            name = name.rstrip(b"\0").decode("utf-8")
+            if offset + length > len(self.mm):
+                raise ValueError(f"Snapshot section {name} is truncated")
+            section = self.view[offset:offset + length]
+            if verify and zlib.crc32(section) != checksum:
+                raise ValueError(f"Snapshot section {name} failed its checksum")
+            sections[name] = section
+        
+        self.meta = json.loads(str(sections["meta"], "utf-8"))
+        if self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Snapshot was written on a {self.meta['byteorder']}-endian host")
+        
+        self.strings = _SnapshotStrings(sections["string_offsets"].cast("I"), sections["strings"],
+                                        self.meta["string_count"])
+        self.term_count = self.meta["term_count"]
+        self.incident_count = self.meta["incident_count"]
+        self.posting_offsets = sections["posting_offsets"].cast("I")
+        self.postings = sections["postings"].cast("I")
+        self.incident_rows = sections["incidents"]
+        self.incident_terms = sections["incident_terms"].cast("I")
+        self.incident_ids = _SnapshotRefs(sections["incident_ids"].cast("I"), self.strings)
+        self.allowed = None
+        self.frequency_overrides = {}
+        self.fresh = False
+    
+    @staticmethod
+    def write(path: str, index: "IncidentIndex", nlp_engine: NLPEngine, pattern_matcher: "PatternMatcher",
+              revision: str = None):
+        terms = sorted(index.postings)
+        term_ordinals = {term: ordinal for ordinal, term in enumerate(terms)}
+        incident_ids = sorted(index.incidents)
+        incident_ordinals = {incident_id: ordinal for ordinal, incident_id in enumerate(incident_ids)}
+        
+        strings = list(terms)
+        string_ordinals = dict(term_ordinals)
+        
+        def intern_string(value):
+            if value is None:
+                return SNAPSHOT_NO_STRING
+            if value not in string_ordinals:
+                string_ordinals[value] = len(strings)
+                strings.append(value)
+            return string_ordinals[value]
+        
+        incident_rows = bytearray()
+        incident_terms = array("I")
+        id_ordinals = array("I")
+        for incident_id in incident_ids:
+            incident = index.incidents[incident_id]
+            keyword_start = len(incident_terms)
+            incident_terms.extend(term_ordinals[keyword] for keyword in index.keywords.get(incident_id, []))
+            id_ordinals.append(intern_string(incident_id))
+            incident_rows += SNAPSHOT_INCIDENT.pack(
+                id_ordinals[-1], intern_string(incident.issue_title), intern_string(incident.category),
+                intern_string(incident.severity), intern_string(incident.automation_script),
+                int(incident.resolution_time or 0), int(incident.frequency or 1), keyword_start, len(incident_terms))
+        
+        encoded = [value.encode("utf-8") for value in strings]
+        string_offsets = array("I", [0])
+        for value in encoded:
+            string_offsets.append(string_offsets[-1] + len(value))
+        
+        posting_offsets = array("I", [0])
+        postings = array("I")
+        for term in terms:
+            postings.extend(sorted(incident_ordinals[incident_id] for incident_id in index.postings[term]))
+            posting_offsets.append(len(postings))
+        
+        severity_stage = next((stage for stage in pattern_matcher.pipeline.stages if isinstance(stage, SeverityBoostStage)), None)
+        meta = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "kb_revision": revision,
+            "byteorder": sys.byteorder,
+            "string_count": len(strings),
+            "term_count": len(terms),
+            "incident_count": len(incident_ids),
+            "tech_vocabulary": {category: sorted(keywords) for category, keywords in nlp_engine.tech_vocabulary.items()},
+            "confidence_thresholds": pattern_matcher.confidence_thresholds,
+            "severity_weights": severity_stage.severity_weights if severity_stage else None
+        }
+        
+        sections = [
+            ("meta", json.dumps(meta).encode("utf-8")),
+            ("string_offsets", string_offsets.tobytes()),
+            ("strings", b"".join(encoded)),
+            ("incident_ids", id_ordinals.tobytes()),
+            ("posting_offsets", posting_offsets.tobytes()),
+            ("postings", postings.tobytes()),
+            ("incidents", bytes(incident_rows)),
+            ("incident_terms", incident_terms.tobytes())
+        ]
+        
+        offset = SNAPSHOT_HEADER.size + len(sections) * SNAPSHOT_SECTION.size
+        table = []
+        for name, payload in sections:
+            offset += -offset % SNAPSHOT_ALIGNMENT
+            table.append((name, offset, payload))
+            offset += len(payload)
+        
+        temp_path = f"{path}.tmp{os.getpid()}"
+        with open(temp_path, "wb") as handle:
+            handle.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sections)))
+            for name, section_offset, payload in table:
+                handle.write(SNAPSHOT_SECTION.pack(name.encode("utf-8"), section_offset, len(payload), zlib.crc32(payload)))
+            for name, section_offset, payload in table:
+                handle.write(b"\0" * (section_offset - handle.tell()))
+                handle.write(payload)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, path)
+    
+    @classmethod
+    def ensure(cls, path: str, knowledge_base: KnowledgeBaseManager, nlp_engine: NLPEngine,
+               pattern_matcher: "PatternMatcher") -> "SnapshotIndex":
+        revision = knowledge_base.content_revision()
+        if os.path.exists(path):
+            try:
+                snapshot = cls(path)
+                if snapshot.meta.get("kb_revision") == revision:
+                    return snapshot
+                snapshot.close()
+            except (ValueError, KeyError, struct.error) as e:
+                print(f"Discarding unusable snapshot {path}: {e}")
+        
+        cls.write(path, IncidentIndex.from_knowledge_base(knowledge_base), nlp_engine, pattern_matcher, revision)
+        snapshot = cls(path)
+        snapshot.fresh = True
+        return snapshot
+    
+    def apply_to(self, nlp_engine: NLPEngine, pattern_matcher: "PatternMatcher"):
+        nlp_engine.tech_vocabulary = {category: set(keywords) for category, keywords in self.meta["tech_vocabulary"].items()}
+        pattern_matcher.confidence_thresholds.clear()
+        pattern_matcher.confidence_thresholds.update(self.meta["confidence_thresholds"])
+        pattern_matcher._compile_confidence_levels()
+        if self.meta["severity_weights"]:
+            for stage in pattern_matcher.pipeline.stages:
+                if isinstance(stage, SeverityBoostStage):
+                    stage.severity_weights = dict(self.meta["severity_weights"])
+                    stage.max_weight = max(stage.severity_weights.values())
+    
+    def restrict(self, incident_ids: List[str]):
+        self.allowed = bytearray(self.incident_count)
+        for incident_id in incident_ids:
+            ordinal = self._incident_ordinal(incident_id)
+            if ordinal is not None:
+                self.allowed[ordinal] = 1
+    
+    def close(self):
+        self.strings = self.incident_ids = None
+        self.posting_offsets = self.postings = self.incident_rows = self.incident_terms = None
+        self.view.release()
+        self.mm.close()
+    
+    def __len__(self) -> int:
+        return sum(self.allowed) if self.allowed is not None else self.incident_count
+    
+    def _term_ordinal(self, term: str):
+        terms = self.strings
+        position = bisect.bisect_left(terms, term, 0, self.term_count)
+        return position if position < self.term_count and terms[position] == term else None
+    
+    def _incident_ordinal(self, incident_id: str):
+        position = bisect.bisect_left(self.incident_ids, incident_id)
+        return position if position < self.incident_count and self.incident_ids[position] == incident_id else None
+    
+    def _frequency(self, ordinal: int) -> int:
+        if ordinal in self.frequency_overrides:
+            return self.frequency_overrides[ordinal]
+        return SNAPSHOT_INCIDENT.unpack_from(self.incident_rows, ordinal * SNAPSHOT_INCIDENT.size)[6] or 1
+    
+    def record(self, ordinal: int) -> IncidentRecord:
+        id_ref, title_ref, category_ref, severity_ref, automation_ref, resolution_time, frequency, _, _ = \
+            SNAPSHOT_INCIDENT.unpack_from(self.incident_rows, ordinal * SNAPSHOT_INCIDENT.size)
+        strings = self.strings
+        return IncidentRecord(
+            strings[id_ref], strings[title_ref], strings[category_ref], strings[severity_ref], resolution_time,
+            self.frequency_overrides.get(ordinal, frequency),
+            strings[automation_ref] if automation_ref != SNAPSHOT_NO_STRING else None
+        )
+    
+    def incidents(self):
+        for ordinal in range(self.incident_count):
+            if self.allowed is None or self.allowed[ordinal]:
+                yield self.record(ordinal)
+    
+    def _category(self, ordinal: int) -> str:
+        return self.strings[SNAPSHOT_INCIDENT.unpack_from(self.incident_rows, ordinal * SNAPSHOT_INCIDENT.size)[2]]
+    
+    def search_by_keywords(self, keywords: List[str], limit: int = 10, category: str = None,
+                           exclude_category: str = None) -> List[IncidentRecord]:
+        match_counts = defaultdict(int)
+        allowed = self.allowed
+        for keyword in {k.lower() for k in keywords}:
+            term = self._term_ordinal(keyword)
+            if term is None:
+                continue
+            for ordinal in self.postings[self.posting_offsets[term]:self.posting_offsets[term + 1]]:
+                if allowed is None or allowed[ordinal]:
+                    match_counts[ordinal] += 1
+        if category is not None or exclude_category is not None:
+            match_counts = {ordinal: count for ordinal, count in match_counts.items()
+                            if (category is None or self._category(ordinal) == category)
+                            and self._category(ordinal) != exclude_category}
+        
+        ranked = heapq.nsmallest(limit, match_counts.items(),
+                                 key=lambda x: (-x[1], -self._frequency(x[0]), x[0]))
+        return [self.record(ordinal).with_match_count(count) for ordinal, count in ranked]
+    
+    def get_keywords(self, incident_ids: List[str]) -> Dict[str, List[str]]:
+        keywords = {}
+        for incident_id in incident_ids:
+            ordinal = self._incident_ordinal(incident_id)
+            if ordinal is None:
+                keywords[incident_id] = []
+                continue
+            start, end = SNAPSHOT_INCIDENT.unpack_from(self.incident_rows, ordinal * SNAPSHOT_INCIDENT.size)[7:]
+            keywords[incident_id] = [self.strings[term] for term in self.incident_terms[start:end]]
+        return keywords
+    
+    def apply_frequency_deltas(self, deltas: Dict[str, int]):
+        for incident_id, delta in deltas.items():
+            ordinal = self._incident_ordinal(incident_id)
+            if ordinal is not None:
+                self.frequency_overrides[ordinal] = self._frequency(ordinal) + delta
+
+_SHARD_STATE = {}
+
+def _shard_matcher(index) -> "PatternMatcher":
+    matcher = PatternMatcher(None, NLPEngine(None))
+    matcher.pipeline.unregister(KeywordCandidateGenerator.name)
+    matcher.pipeline.register_generator(KeywordCandidateGenerator(index.search_by_keywords))
+    return matcher
+
+def _init_shard_worker(incidents: List[IncidentRecord], keywords: Dict[str, List[str]]):
+    _SHARD_STATE["index"] = IncidentIndex(incidents, keywords)
+    _SHARD_STATE["matcher"] = _shard_matcher(_SHARD_STATE["index"])
+
+def _init_snapshot_worker(path: str, incident_ids: List[str]):
+    index = SnapshotIndex(path)
+    index.restrict(incident_ids)
+    _SHARD_STATE["index"] = index
+    _SHARD_STATE["matcher"] = _shard_matcher(index)
+    index.apply_to(_SHARD_STATE["matcher"].nlp, _SHARD_STATE["matcher"])
+
+def _shard_size() -> int:
+    return len(_SHARD_STATE["index"])
+
+def _shard_score_batch(requests: List[tuple], frequency_deltas: Dict[str, int], candidate_limit: int,
+                       top_k: int) -> List[tuple]:
+    index = _SHARD_STATE["index"]
+    matcher = _SHARD_STATE["matcher"]
+    index.apply_frequency_deltas(frequency_deltas)
+    
+    batch_results = []
+    for analysis, key_terms, category, exclude_category in requests:
+        context = RankingContext(analysis, key_terms, index.get_keywords)
+        context.candidate_limit = candidate_limit
+        context.category, context.exclude_category = category, exclude_category
+        batch = matcher.pipeline.run(context, top_k)
+        batch_results.append((heapq.nlargest(top_k, matcher._build_matches(context, batch), key=_match_sort_key),
+                              context.stats))
+    return batch_results
+
+class ShardedPatternMatcher(PatternMatcher):
+    def __init__(self, knowledge_base: KnowledgeBaseManager, nlp_engine: NLPEngine,
+                 num_shards: int = None, shard_by: str = "category", candidate_limit: int = 10, top_k: int = 10,
+                 snapshot_path: str = None, category_threshold: float = 0.75):
+        super().__init__(knowledge_base, nlp_engine, candidate_limit=candidate_limit, top_k=top_k,
+                         category_threshold=category_threshold)
+        self.num_shards = num_shards or os.cpu_count() or 1
+        self.shard_by = shard_by
+        self.snapshot_path = snapshot_path
+        self.shards = []
+        self._pending_frequency = defaultdict(int)
+        self.kb.frequency_observers.append(self._observe_frequency)
+        self._start_shards()
+    
+    def _observe_frequency(self, incident_id: str, delta: int):
+        self._pending_frequency[incident_id] += delta
+    
+    def _start_shards(self):
+        self._content_version = self.kb.content_version
+        if self.snapshot_path:
+            self._start_snapshot_shards()
+            return
+        
+        index = IncidentIndex.from_knowledge_base(self.kb)
+        for shard in index.split(self.num_shards, self.shard_by):
+            executor = ProcessPoolExecutor(
+                max_workers=1,
+                initializer=_init_shard_worker,
+                initargs=(list(shard.incidents.values()), shard.keywords)
+            )
+            self.shards.append(executor)
+        
+        sizes = [future.result() for future in [executor.submit(_shard_size) for executor in self.shards]]
+        print(f"Sharded matcher ready: {len(self.shards)} worker shards by {self.shard_by} ({sum(sizes)} incidents)")
+    
+    def _start_snapshot_shards(self):
+        snapshot = SnapshotIndex.ensure(self.snapshot_path, self.kb, self.nlp, self)
+        try:
+            records = list(snapshot.incidents())
+            fresh = snapshot.fresh
+        finally:
+            snapshot.close()
+        
+        if not fresh:
+            self.kb.cursor.execute("SELECT id, frequency FROM incidents")
+            frequencies = dict(self.kb.cursor.fetchall())
+            for record in records:
+                drift = (frequencies.get(record.id) or 1) - (record.frequency or 1)
+                if drift:
+                    self._pending_frequency[record.id] += drift
+        
+        assignments = _assign_shards({record.id: record.category for record in records}, self.num_shards, self.shard_by)
+        for shard in range(self.num_shards):
+            shard_ids = [incident_id for incident_id, assigned in assignments.items() if assigned == shard]
+            if shard_ids:
+                self.shards.append(ProcessPoolExecutor(
+                    max_workers=1,
+                    initializer=_init_snapshot_worker,
+                    initargs=(self.snapshot_path, shard_ids)
+                ))
+        
+        sizes = [future.result() for future in [executor.submit(_shard_size) for executor in self.shards]]
+        print(f"Sharded matcher ready: {len(self.shards)} worker shards by {self.shard_by} "
+              f"({sum(sizes)} incidents mapped from {self.snapshot_path})")
+    
+    def refresh(self):
+        self._stop_shards()
+        self._pending_frequency.clear()
+        self._start_shards()
+    
+    def find_matches(self, user_query: str, analysis: Dict = None, record: bool = True,
+                     candidate_limit: int = None, top_k: int = None) -> List[ScoredMatch]:
+        return self.find_matches_batch([user_query], [analysis] if analysis else None, record, candidate_limit, top_k)[0]
+    
+    def _score_on_shards(self, requests: List[tuple], candidate_limit: int, top_k: int) -> List[tuple]:
+        deltas = dict(self._pending_frequency)
+        self._pending_frequency.clear()
+        futures = [executor.submit(_shard_score_batch, requests, deltas, candidate_limit, top_k) for executor in self.shards]
+        shard_results = [future.result() for future in futures]
+        
+        merged = []
+        for position in range(len(requests)):
+            candidates = []
+            stats = {"generated": 0, "pruned": 0, "early_exit": False, "partition": requests[position][2],
+                     "fallback": False, "timings": defaultdict(float)}
+            for shard in shard_results:
+                matches, shard_stats = shard[position]
+                candidates.extend(matches)
+                stats["generated"] += shard_stats["generated"]
+                stats["pruned"] += shard_stats["pruned"]
+                stats["early_exit"] = stats["early_exit"] or shard_stats["early_exit"]
+                for name, elapsed in shard_stats["timings"].items():
+                    stats["timings"][name] += elapsed
+            merged.append((candidates, stats))
+        return merged
+    
+    def find_matches_batch(self, user_queries: List[str], analyses: List[Dict] = None, record: bool = True,
+                           candidate_limit: int = None, top_k: int = None) -> List[List[ScoredMatch]]:
+        if self.kb.content_version != self._content_version:
+            self.refresh()
+        
+        start_time = time.time()
+        candidate_limit = candidate_limit or self.candidate_limit
+        top_k = top_k or self.top_k
+        
+        requests = []
+        for position, user_query in enumerate(user_queries):
+            analysis = analyses[position] if analyses else self.nlp.preprocess_query(user_query)
+            category = None
+            if self.category_threshold is not None and analysis["primary_category"] != "unknown":
+                category = analysis["primary_category"]
+            requests.append((analysis, self.nlp.extract_key_terms(analysis["tokens"]), category, None))
+        
+        active = [position for position, request in enumerate(requests) if request[1]]
+        scored = {}
+        if active:
+            scored = dict(zip(active, self._score_on_shards([requests[position] for position in active], candidate_limit, top_k)))
+        
+        fallback = [position for position in active if requests[position][2] is not None and
+                    (not scored[position][0] or max(match.confidence_score for match in scored[position][0]) < self.category_threshold)]
+        if fallback:
+            retries = [(analysis, key_terms, None, category) for analysis, key_terms, category, _ in
+                       (requests[position] for position in fallback)]
+            for position, (candidates, stats) in zip(fallback, self._score_on_shards(retries, candidate_limit, top_k)):
+                first, first_stats = scored[position]
+                stats["generated"] += first_stats["generated"]
+                stats["pruned"] += first_stats["pruned"]
+                stats["early_exit"] = stats["early_exit"] or first_stats["early_exit"]
+                for name, elapsed in first_stats["timings"].items():
+                    stats["timings"][name] += elapsed
+                stats["partition"], stats["fallback"] = requests[position][2], True
+                scored[position] = (first + candidates, stats)
+        
+        response_time = (time.time() - start_time) * 1000 / max(len(user_queries), 1)
+        
+        all_results = []
+        for position, user_query in enumerate(user_queries):
+            if position not in scored:
+                all_results.append([])
+                continue
+            candidates, stats = scored[position]
+            stats["timings"] = dict(stats["timings"])
+            for name, elapsed in stats["timings"].items():
+                STAGE_SECONDS.observe(elapsed / 1000, stage=name)
+            self.last_ranking_stats = stats
+            detailed_results = heapq.nlargest(top_k, candidates, key=_match_sort_key)
+            for match in detailed_results:
+                match.record.attach_loader(self.kb.get_resolution_steps)
+            
+            if detailed_results and record:
+                self._record_best_match(user_query, detailed_results[0], response_time)
+            
+            all_results.append(detailed_results)
+        
+        return all_results
+    
+    def _stop_shards(self):
+        for executor in self.shards:
+            executor.shutdown(wait=True)
+        self.shards = []
+    
+    def close(self):
+        self._stop_shards()
+        if self._observe_frequency in self.kb.frequency_observers:
+            self.kb.frequency_observers.remove(self._observe_frequency)
+
+SERVICE_COMMAND_PATTERN = re.compile(r'\b(?:systemctl\s+(?:restart|start|stop|reload|status)\s+|service\s+)([\w@.-]+)')
+SCRIPT_PATH_PATTERN = re.compile(r'(?<![\w:])(/(?:[\w.-]+/?)+)')
+STEP_ESTIMATES = (("restart", 3.0), ("start", 3.0), ("stop", 2.0), ("reload", 2.0), ("flush", 2.0), ("vacuum", 5.0))
+MIN_FREE_DISK_BYTES = 512 * 1024 * 1024
+
+def _split_script_commands(script: str) -> List[str]:
+    commands = []
+    current = []
+    quote = None
+    position = 0
+    while position < len(script):
+        char = script[position]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char in ";\n" or script.startswith("&&", position):
+            commands.append("".join(current))
+            current = []
+            position += 2 if char == "&" else 1
+            continue
+        current.append(char)
+        position += 1
+    commands.append("".join(current))
+    return [command.strip() for command in commands if command.strip()]
+
+def _probe_disk(target: str) -> Dict:
+    usage = shutil.disk_usage(target)
+    return {"ok": usage.free >= MIN_FREE_DISK_BYTES,
+            "detail": f"{usage.free / (1024 ** 3):.1f} GiB free of {usage.total / (1024 ** 3):.1f} GiB on {target}"}
+
+def _probe_service(target: str) -> Dict:
+    if not shutil.which("systemctl"):
+        return {"ok": None, "detail": "systemctl not available on this host"}
+    try:
+        result = subprocess.run(["systemctl", "is-active", target], capture_output=True, text=True, timeout=5)
+    except subprocess.TimeoutExpired:
+        return {"ok": None, "detail": "systemctl timed out"}
+    state = result.stdout.strip()
+    if not state:
+        return {"ok": None, "detail": (result.stderr.strip().splitlines() or ["systemctl gave no answer"])[0]}
+    return {"ok": state == "active", "detail": f"{target} is {state}"}
+
+def _probe_backup(target: str) -> Dict:
+    if not os.path.isdir(target):
+        return {"ok": False, "detail": f"backup location {target} does not exist"}
+    if not os.access(target, os.W_OK):
+        return {"ok": False, "detail": f"backup location {target} is not writable"}
+    return {"ok": True, "detail": f"backup location {target} is writable"}
+
+class RemediationPlanner:
+    def __init__(self, probe_ttl: float = 30.0, max_workers: int = 8, backup_dir: str = None):
+        self.probe_ttl = probe_ttl
+        self.max_workers = max_workers
+        self.backup_dir = backup_dir or os.environ.get("BOT_BACKUP_DIR", "/backup")
+        self.probes = {"disk": _probe_disk, "service": _probe_service, "backup": _probe_backup}
+        self.blocking_probes = {"disk"}
+        self.probe_cache = {}
+        self.cache_hits = 0
+    
+    def register_probe(self, kind: str, probe, blocking: bool = False):
+        self.probes[kind] = probe
+        if blocking:
+            self.blocking_probes.add(kind)
+        else:
+            self.blocking_probes.discard(kind)
+    
+    def _disk_targets(self, script: str) -> List[str]:
+        targets = {}
+        for path in ["/"] + SCRIPT_PATH_PATTERN.findall(script):
+            path = path.rstrip("/") or "/"
+            while path != "/" and not os.path.exists(path):
+                path = os.path.dirname(path)
+            try:
+                targets.setdefault(os.stat(path).st_dev, path)
+            except OSError:
+                continue
+        return sorted(targets.values())
+    
+    def _estimate(self, command: str) -> float:
+        lowered = command.lower()
+        return next((seconds for keyword, seconds in STEP_ESTIMATES if re.search(rf'\b{keyword}\b', lowered)), 1.0)
+    
+    def plan(self, incident_id: str, script: str, environment: str = "production", backup_required: bool = True) -> Dict:
+        steps = {}
+        
+        def add_step(step_id, kind, description, depends_on=(), estimate=1.0, target=None):
+            steps[step_id] = {"id": step_id, "kind": kind, "description": description, "depends_on": list(depends_on),
+                              "estimate": estimate, "target": target, "status": "pending"}
+            return step_id
+        
+        probes = [add_step(f"disk:{target}", "disk", f"Check free space on {target}", estimate=0.1, target=target)
+                  for target in self._disk_targets(script)]
+        probes += [add_step(f"service:{service}", "service", f"Check {service} status", estimate=0.5, target=service)
+                   for service in dict.fromkeys(SERVICE_COMMAND_PATTERN.findall(script))]
+        
+        gate = probes
+        if environment == "production" and backup_required:
+            probes.append(add_step("backup:location", "backup", f"Check backup location {self.backup_dir}",
+                                   estimate=0.1, target=self.backup_dir))
+            gate = [add_step("prepare:backup", "prepare", "Create backup/restore point", probes, estimate=2.0)]
+        
+        previous = gate
+        for position, command in enumerate(_split_script_commands(script), 1):
+            previous = [add_step(f"command:{position}", "command", command, previous, estimate=self._estimate(command))]
+        
+        verify = add_step("verify", "verify", "Verify results and system health", previous, estimate=2.0)
+        add_step("log", "log", "Log execution details", [verify], estimate=0.5)
+        
+        return {"incident_id": incident_id, "environment": environment, "steps": steps,
+                "levels": self._levels(steps), "blocked": False, "warnings": [], "blockers": []}
+    
+    def _levels(self, steps: Dict) -> List[List[str]]:
+        depth = {}
+        for step_id in self._topological_order(steps):
+            depth[step_id] = max((depth[dependency] + 1 for dependency in steps[step_id]["depends_on"]), default=0)
+        levels = defaultdict(list)
+        for step_id, level in depth.items():
+            levels[level].append(step_id)
+        return [levels[level] for level in sorted(levels)]
+    
+    def _topological_order(self, steps: Dict) -> List[str]:
+        remaining = {step_id: len(step["depends_on"]) for step_id, step in steps.items()}
+        dependents = defaultdict(list)
+        for step_id, step in steps.items():
+            for dependency in step["depends_on"]:
+                dependents[dependency].append(step_id)
+        
+        ready = deque(step_id for step_id, count in remaining.items() if count == 0)
+        order = []
+        while ready:
+            step_id = ready.popleft()
+            order.append(step_id)
+            for dependent in dependents[step_id]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        
+        if len(order) != len(steps):
+            raise ValueError("Remediation plan has a dependency cycle")
+        return order
+    
+    def _run_probe(self, kind: str, target: str) -> Dict:
+        key = (kind, target)
+        cached = self.probe_cache.get(key)
+        if cached and cached[0] > time.time():
+            self.cache_hits += 1
+            CACHE_REQUESTS.inc(cache="probe", result="hit")
+            return dict(cached[1], cached=True)
+        
+        CACHE_REQUESTS.inc(cache="probe", result="miss")
+        started = time.perf_counter()
+        try:
+            result = self.probes[kind](target)
+        except Exception as e:
+            result = {"ok": False, "detail": f"probe failed: {e}"}
+        result["duration"] = time.perf_counter() - started
+        self.probe_cache[key] = (time.time() + self.probe_ttl, result)
+        return dict(result, cached=False)
+    
+    def run_preflight(self, plan: Dict) -> Dict:
+        probe_steps = [step for step in plan["steps"].values() if step["kind"] in self.probes]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(probe_steps) or 1)) as executor:
+            results = list(executor.map(lambda step: self._run_probe(step["kind"], step["target"]), probe_steps))
+        plan["preflight_time"] = time.perf_counter() - started
+        
+        for step, result in zip(probe_steps, results):
+            step["result"] = result
+            step["estimate"] = result["duration"]
+            if result["ok"]:
+                step["status"] = "passed"
+            elif result["ok"] is None or step["kind"] not in self.blocking_probes:
+                step["status"] = "warning"
+                plan["warnings"].append(result["detail"])
+            else:
+                step["status"] = "failed"
+                plan["blockers"].append(result["detail"])
+        
+        plan["blocked"] = bool(plan["blockers"])
+        plan.update(self.critical_path(plan))
+        return plan
+    
+    def critical_path(self, plan: Dict) -> Dict:
+        steps = plan["steps"]
+        finish = {}
+        previous = {}
+        for step_id in self._topological_order(steps):
+            dependencies = steps[step_id]["depends_on"]
+            start = 0.0
+            if dependencies:
+                previous[step_id] = max(dependencies, key=lambda dependency: finish[dependency])
+                start = finish[previous[step_id]]
+            finish[step_id] = start + steps[step_id]["estimate"]
+        
+        path = [max(finish, key=finish.get)] if finish else []
+        while path and path[-1] in previous:
+            path.append(previous[path[-1]])
+        
+        return {"critical_path": path[::-1], "critical_path_time": max(finish.values(), default=0.0),
+                "serial_time": sum(step["estimate"] for step in steps.values())}
+
+OUTPUT_CHUNK_BYTES = 64 * 1024
+OUTPUT_LINE_LIMIT = 4096
+
+class SubprocessRunner:
+    def __init__(self, output_lines: int = 200, memory_limit_mb: int = None, cpu_seconds: int = None,
+                 max_concurrency: int = 16, kill_grace: float = 2.0):
+        self.output_lines = output_lines
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_seconds = cpu_seconds
+        self.max_concurrency = max_concurrency
+        self.kill_grace = kill_grace
+    
+    def _apply_limits(self):
+        if self.memory_limit_mb:
+            limit = self.memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        if self.cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1))
+    
+    async def _pump(self, stream, name: str, ring: deque, counters: Dict, on_output):
+        def emit(line: bytes, dropped: int):
+            text = line.decode("utf-8", errors="replace")
+            if dropped:
+                text += f" ... [{dropped} bytes truncated]"
+            counters["lines"] += 1
+            ring.append((name, text))
+            if on_output:
+                on_output(name, text)
+        
+        line, dropped = b"", 0
+        while True:
+            chunk = await stream.read(OUTPUT_CHUNK_BYTES)
+            if not chunk:
+                if line or dropped:
+                    emit(line, dropped)
+                return
+            parts = chunk.split(b"\n")
+            for position, part in enumerate(parts):
+                room = OUTPUT_LINE_LIMIT - len(line)
+                line += part[:room]
+                dropped += max(len(part) - room, 0)
+                if position < len(parts) - 1:
+                    emit(line, dropped)
+                    line, dropped = b"", 0
+    
+    async def _terminate(self, process):
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(process.wait(), self.kill_grace)
+                return
+            except asyncio.TimeoutError:
+                continue
+    
+    async def run_command(self, command: str, timeout: float, on_output=None, env: Dict = None, cwd: str = None) -> Dict:
+        ring = deque(maxlen=self.output_lines)
+        counters = {"lines": 0}
+        started = time.monotonic()
+        use_limits = resource is not None and (self.memory_limit_mb or self.cpu_seconds)
+        
+        process = await asyncio.create_subprocess_shell(
+            command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, stdin=asyncio.subprocess.DEVNULL,
+            start_new_session=True, env=env, cwd=cwd, preexec_fn=self._apply_limits if use_limits else None
+        )
+        pumps = asyncio.gather(self._pump(process.stdout, "stdout", ring, counters, on_output),
+                               self._pump(process.stderr, "stderr", ring, counters, on_output))
+        
+        timed_out = False
+        try:
+            await asyncio.wait_for(process.wait(), max(timeout, 0.0))
+        except asyncio.TimeoutError:
+            timed_out = True
+            await self._terminate(process)
+        
+        try:
+            await asyncio.wait_for(pumps, self.kill_grace)
+        except asyncio.TimeoutError:
+            pumps.cancel()
+        
+        return {
+            "command": command,
+            "exit_code": process.returncode,
+            "timed_out": timed_out,
+            "duration": time.monotonic() - started,
+            "output": list(ring),
+            "dropped_lines": max(counters["lines"] - len(ring), 0)
+        }
+    
+    async def run_script(self, commands: List[str], timeout: float, on_output=None, env: Dict = None) -> Dict:
+        deadline = time.monotonic() + timeout
+        results = []
+        for command in commands:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                results.append({"command": command, "exit_code": None, "timed_out": True, "duration": 0.0,
+                                "output": [], "dropped_lines": 0})
+                break
+            result = await self.run_command(command, remaining, on_output, env=env)
+            results.append(result)
+            if result["timed_out"] or result["exit_code"] != 0:
+                break
+        
+        last = results[-1] if results else {"exit_code": 0, "timed_out": False}
+        return {
+            "status": "TIMEOUT" if last["timed_out"] else ("SUCCESS" if last["exit_code"] == 0 and len(results) == len(commands) else "FAILED"),
+            "exit_code": last["exit_code"],
+            "commands": results,
+            "duration": sum(result["duration"] for result in results)
+        }
+    
+    async def run_many(self, scripts: List[List[str]], timeout: float) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def bounded(commands):
+            async with semaphore:
+                return await self.run_script(commands, timeout)
+        
+        return await asyncio.gather(*(bounded(commands) for commands in scripts))
+    
+    def run(self, commands: List[str], timeout: float, on_output=None) -> Dict:
+        return asyncio.run(self.run_script(commands, timeout, on_output))
+
+class SimulatedTransport:
+    name = "simulated"
+    
+    def command_for(self, host: str, command: str) -> str:
+        return "true"
+    
+    def env_for(self, host: str) -> Dict:
+        return None
+
+class LocalShellTransport:
+    name = "local"
+    
+    def command_for(self, host: str, command: str) -> str:
+        return command
+    
+    def env_for(self, host: str) -> Dict:
+        return dict(os.environ, TARGET_HOST=host)
+
+class SSHTransport:
+    name = "ssh"
+    
+    def __init__(self, user: str = None, options: List[str] = None):
+        self.user = user
+        self.options = options or ["-o", "BatchMode=yes", "-o", "ConnectTimeout=10"]
+    
+    def command_for(self, host: str, command: str) -> str:
+        destination = f"{self.user}@{host}" if self.user else host
+        return " ".join(["ssh"] + [shlex.quote(option) for option in self.options] +
+                        [shlex.quote(destination), "--", shlex.quote(command)])
+    
+    def env_for(self, host: str) -> Dict:
+        return None
+
+FLEET_TRANSPORTS = {"simulated": SimulatedTransport, "local": LocalShellTransport, "ssh": SSHTransport}
+
+def expand_targets(spec: str) -> List[str]:
+    if spec.startswith("@"):
+        with open(spec[1:], "r", encoding="utf-8") as handle:
+            return [line.strip() for line in handle if line.strip() and not line.startswith("#")]
+    
+    hosts = []
+    for part in spec.split(","):
+        part = part.strip()
+        match = re.match(r'^(.*)\[(\d+)-(\d+)\](.*)$', part)
+        if match:
+            prefix, start, end, suffix = match.groups()
+            width = len(start) if start.startswith("0") else 0
+            hosts.extend(f"{prefix}{number:0{width}d}{suffix}" for number in range(int(start), int(end) + 1))
+        elif part:
+            hosts.append(part)
+    return list(dict.fromkeys(hosts))
+
+class FleetExecutor:
+    def __init__(self, runner: SubprocessRunner, transport, concurrency: int = 20, canary: int = 1,
+                 batch_size: int = None, max_failures: int = 0):
+        self.runner = runner
+        self.transport = transport
+        self.concurrency = concurrency
+        self.canary = canary
+        self.batch_size = batch_size
+        self.max_failures = max_failures
+    
+    async def _run_host(self, host: str, commands: List[str], timeout: float) -> Dict:
+        script = await self.runner.run_script([self.transport.command_for(host, command) for command in commands], timeout,
+                                              env=self.transport.env_for(host))
+        return {
+            "host": host,
+            "status": script["status"],
+            "exit_code": script["exit_code"],
+            "duration": script["duration"],
+            "output": [line for result in script["commands"] for line in result["output"]][-10:]
+        }
+    
+    async def _run_phase(self, hosts: List[str], commands: List[str], timeout: float, state: Dict, on_result) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def bounded(host):
+            async with semaphore:
+                if state["stopped"]:
+                    return {"host": host, "status": "SKIPPED", "exit_code": None, "duration": 0.0, "output": []}
+                result = await self._run_host(host, commands, timeout)
+                if result["status"] != "SUCCESS":
+                    state["failures"] += 1
+                    if state["failures"] > self.max_failures:
+                        state["stopped"] = True
+                if on_result:
+                    on_result(result)
+                return result
+        
+        return await asyncio.gather(*(bounded(host) for host in hosts))
+    
+    async def execute(self, hosts: List[str], commands: List[str], timeout: float, on_result=None, gate=None) -> Dict:
+        started = time.monotonic()
+        state = {"failures": 0, "stopped": False, "halted": None}
+        canary_hosts = hosts[:self.canary]
+        remaining = hosts[self.canary:]
+        batch_size = self.batch_size or len(remaining) or 1
+        phases = [("canary", canary_hosts)] if canary_hosts else []
+        phases += [(f"batch {position // batch_size + 1}", remaining[position:position + batch_size])
+                   for position in range(0, len(remaining), batch_size)]
+        
+        results = []
+        for name, phase_hosts in phases:
+            if not state["stopped"] and gate is not None:
+                state["halted"] = gate()
+                state["stopped"] = state["halted"] is not None
+            if state["stopped"]:
+                results.extend({"host": host, "status": "SKIPPED", "exit_code": None, "duration": 0.0, "output": []}
+                               for host in phase_hosts)
+                continue
+            if name == "canary":
+                canary_state = {"failures": 0, "stopped": False}
+                phase_results = await self._run_phase(phase_hosts, commands, timeout, canary_state, on_result)
+                if canary_state["failures"]:
+                    state["failures"] += canary_state["failures"]
+                    state["stopped"] = True
+            else:
+                phase_results = await self._run_phase(phase_hosts, commands, timeout, state, on_result)
+            results.extend(phase_results)
+        
+        counts = defaultdict(int)
+        for result in results:
+            counts[result["status"]] += 1
+        durations = sorted(result["duration"] for result in results if result["status"] != "SKIPPED")
+        return {
+            "status": "SUCCESS" if counts.get("SUCCESS", 0) == len(hosts) else ("ABORTED" if state["stopped"] else "PARTIAL"),
+            "hosts": results,
+            "counts": dict(counts),
+            "phases": len(phases),
+            "halted": state["halted"],
+            "duration": time.monotonic() - started,
+            "host_time_p50": durations[len(durations) // 2] if durations else 0.0,
+            "host_time_max": durations[-1] if durations else 0.0,
+            "serial_time": sum(durations)
+        }
+    
+    def run(self, hosts: List[str], commands: List[str], timeout: float, on_result=None, gate=None) -> Dict:
+        return asyncio.run(self.execute(hosts, commands, timeout, on_result, gate))
+
+WEEK_MINUTES = 7 * 24 * 60
+POLICY_DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+POLICY_DAY_GROUPS = {"daily": POLICY_DAYS, "weekdays": POLICY_DAYS[:5], "weekends": POLICY_DAYS[5:]}
+POLICY_SEVERITIES = ("critical", "high", "medium", "low")
+
+def load_automation_policy(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as handle:
+        policy = json.load(handle)
+    if not isinstance(policy, dict):
+        raise ValueError(f"Automation policy {path} must be a JSON object")
+    return policy
+
+class AutomationPolicy:
+    def __init__(self, safety_rules: Dict, policy: Dict = None):
+        policy = policy or {}
+        restrictions = safety_rules["production_safeguards"]["time_restrictions"]
+        self.allowed_environments = set(policy.get("allowed_environments", safety_rules["allowed_environments"]))
+        self.restricted_environments = set(policy.get("restricted_environments", ["production"]))
+        self.rules = []
+        if not restrictions["business_hours"]:
+            self.rules.append({"environment": "production", "days": "daily", "start": "09:00", "end": "17:00",
+                               "action": "deny", "reason": "Automation not allowed during business hours"})
+        self.rules.extend(policy.get("rules", []))
+        if restrictions["maintenance_window"]:
+            self.rules.extend(dict(window, action="allow") for window in policy.get("maintenance_windows", []))
+        self.intervals = [self._intervals(rule) for rule in self.rules]
+        self.schedules = {}
+        self.decisions = {}
+        self.stats = {"hits": 0, "decisions": 0}
+    
+    @staticmethod
+    def _minutes(value: str) -> int:
+        match = re.match(r'^(\d{1,2}):(\d{2})$', str(value))
+        if not match or int(match.group(2)) >= 60 or int(match.group(1)) * 60 + int(match.group(2)) > 1440:
+            raise ValueError(f"Invalid policy time: {value}")
+        return int(match.group(1)) * 60 + int(match.group(2))
+    
+    @staticmethod
+    def _days(value) -> tuple:
+        if isinstance(value, str):
+            value = POLICY_DAY_GROUPS.get(value.lower()) or [day.strip() for day in value.split(",")]
+        unknown = [day for day in value if day.lower()[:3] not in POLICY_DAYS]
+        if unknown:
+            raise ValueError(f"Unknown policy days: {', '.join(unknown)}")
+        return tuple(POLICY_DAYS.index(day.lower()[:3]) for day in value)
+    
+    def _intervals(self, rule: Dict) -> List[tuple]:
+        if rule.get("action") not in ("allow", "deny"):
+            raise ValueError(f"Policy rule action must be 'allow' or 'deny': {rule}")
+        start, end = self._minutes(rule.get("start", "00:00")), self._minutes(rule.get("end", "24:00"))
+        if end <= start:
+            end += 1440
+        intervals = []
+        for day in self._days(rule.get("days", "daily")):
+            first, last = day * 1440 + start, day * 1440 + end
+            if last > WEEK_MINUTES:
+                intervals.append((0, last - WEEK_MINUTES))
+                last = WEEK_MINUTES
+            intervals.append((first, last))
+        return intervals
+    
+    @staticmethod
+    def _applies(rule: Dict, field: str, value: str) -> bool:
+        scope = rule.get(field)
+        return scope is None or value == scope or (isinstance(scope, list) and value in scope)
+    
+    def _schedule(self, environment: str, severity: str) -> tuple:
+        key = (environment, severity)
+        schedule = self.schedules.get(key)
+        if schedule is not None:
+            return schedule
+        
+        if environment in self.allowed_environments or environment in self.restricted_environments:
+            base = (True, None)
+        else:
+            base = (False, f"Automation not allowed in the '{environment}' environment")
+        rules = [(rule, intervals) for rule, intervals in zip(self.rules, self.intervals)
+                 if self._applies(rule, "environment", environment) and self._applies(rule, "severity", severity)]
+        boundaries = sorted({0} | {point for _, intervals in rules for interval in intervals for point in interval} - {WEEK_MINUTES})
+        
+        starts, states = [], []
+        for minute in boundaries:
+            state = base
+            for rule, intervals in rules:
+                if any(first <= minute < last for first, last in intervals):
+                    state = (True, None) if rule["action"] == "allow" else (
+                        False, rule.get("reason", f"Automation blocked by policy ({rule.get('start', '00:00')}-{rule.get('end', '24:00')})"))
+            if not states or states[-1] != state:
+                starts.append(minute)
+                states.append(state)
+        
+        schedule = self.schedules[key] = (starts, states)
+        return schedule
+    
+    def decide(self, environment: str, severity: str, now: datetime = None) -> Dict:
+        now = now or datetime.now()
+        if now.tzinfo is not None:
+            now = now.astimezone().replace(tzinfo=None)
+        key = (environment, severity)
+        cached = self.decisions.get(key)
+        if cached is not None and cached[0] <= now < cached[1]:
+            self.stats["hits"] += 1
+            return cached[2]
+        
+        self.stats["decisions"] += 1
+        starts, states = self._schedule(environment, severity)
+        minute = now.weekday() * 1440 + now.hour * 60 + now.minute
+        index = bisect.bisect_right(starts, minute) - 1
+        allowed, reason = states[index]
+        base = now.replace(second=0, microsecond=0) - timedelta(minutes=minute)
+        
+        until = next_allowed = None
+        for step in range(1, len(starts) + 1):
+            position, week = (index + step) % len(starts), (index + step) // len(starts)
+            if states[position] == states[index]:
+                continue
+            at = base + timedelta(minutes=starts[position] + week * WEEK_MINUTES)
+            until = until or at
+            if not allowed and states[position][0]:
+                next_allowed = at
+                break
+            if allowed:
+                break
+        
+        decision = {"allowed": allowed, "reason": reason, "until": until, "next_allowed": None if allowed else next_allowed}
+        self.decisions[key] = (now, until or datetime.max, decision)
+        return decision
+    
+    def gate(self, environment: str, severity: str):
+        def check():
+            decision = self.decide(environment, severity)
+            return None if decision["allowed"] else decision["reason"]
+        return check
+
+ANSWER_CARD_STEPS = 10
+STEP_ORDINAL_PATTERN = re.compile(r'^\d+[.)]\s*')
+
+class AnswerCardCache:
+    COLUMNS = ("id", "issue_title", "category", "severity", "resolution_steps", "resolution_time", "automation_script")
+    FORMATS = ("text", "markdown", "json")
+    
+    def __init__(self, knowledge_base: KnowledgeBaseManager, assess):
+        self.kb = knowledge_base
+        self.assess = assess
+        self.cards = {}
+        self.stats = {"hits": 0, "builds": 0}
+    
+    def warm(self) -> int:
+        self.kb.cursor.execute(f"SELECT {', '.join(self.COLUMNS)} FROM incidents")
+        for row in self.kb.cursor.fetchall():
+            self.cards[row[0]] = self._build(row)
+        return len(self.cards)
+    
+    def get(self, incident_id: str) -> Dict:
+        card = self.cards.get(incident_id)
+        if card is not None and card["revision"] == self.kb.revisions.get(incident_id, 0):
+            self.stats["hits"] += 1
+            CACHE_REQUESTS.inc(cache="card", result="hit")
+            return card
+        
+        CACHE_REQUESTS.inc(cache="card", result="miss")
+        self.kb.cursor.execute(f"SELECT {', '.join(self.COLUMNS)} FROM incidents WHERE id = ?", (incident_id,))
+        row = self.kb.cursor.fetchone()
+        if not row:
+            self.cards.pop(incident_id, None)
+            return None
+        card = self.cards[incident_id] = self._build(row)
+        return card
+    
+    def memory_estimate(self) -> int:
+        total = 0
+        for card in self.cards.values():
+            strings = card["summary"] + card["steps"] + list(card["markdown"]) + card["json"]["steps"]
+            total += sys.getsizeof(card) + sum(sys.getsizeof(text) for text in strings)
+        return total
+    
+    def _build(self, row: tuple) -> Dict:
+        incident_id, title, category, severity, resolution, minutes, script = row
+        self.stats["builds"] += 1
+        steps = (resolution or "").split('\n')
+        step_lines = [f"   {i}. {step}" for i, step in enumerate(steps[:ANSWER_CARD_STEPS], 1) if step.strip()]
+        if len(steps) > ANSWER_CARD_STEPS:
+            step_lines.append(f"   ... and {len(steps) - ANSWER_CARD_STEPS} more steps")
+        listed = [STEP_ORDINAL_PATTERN.sub("", step.strip()) for step in steps if step.strip()]
+        
+        return {
+            "id": incident_id,
+            "revision": self.kb.revisions.get(incident_id, 0),
+            "summary": [f"Incident: {title}", f"Category: {category.upper()}", f"Severity: {severity.upper()}",
+                        f"Estimated resolution time: {minutes} minutes"],
+            "steps": step_lines,
+            "markdown": (f"### {title} ({incident_id})\n\n"
+                         f"**Category:** {category} | **Severity:** {severity} | "
+                         f"**Estimated resolution time:** {minutes} minutes",
+                         "\n".join(f"{i}. {step}" for i, step in enumerate(listed, 1))),
+            "json": {"id": incident_id, "title": title, "category": category, "severity": severity,
+                     "resolution_time": minutes, "steps": listed},
+            "automation": self.assess(script, severity, title)
+        }
+    
+    @staticmethod
+    def status_lines(card: Dict, validation: Dict) -> List[str]:
+        if validation is None:
+            return ["   Manual resolution required", "   Consider automating this frequent issue"]
+        if not validation["valid"]:
+            lines = [f"   Automation blocked: {validation['reason']}", f"   Risk level: {validation['risk_level'].upper()}"]
+            if validation.get("next_allowed"):
+                lines.append(f"   Next allowed: {validation['next_allowed']:%a %Y-%m-%d %H:%M}")
+            return lines
+        
+        lines = ["   Automation available", f"   Script type: {validation['risk_level'].upper()} risk",
+                 f"   Estimated time saved: {validation['estimated_time']} minutes"]
+        if validation["requires_confirmation"]:
+            lines.append(f"   Manual confirmation required ({card['json']['severity']} severity)")
+        if validation.get("requires_extra_approval"):
+            lines.append(f"   Extra approval needed for critical operations")
+        return lines
+    
+    def render(self, incident_id: str, fmt: str = "text", frequency: int = None, validation: Dict = None):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown card format: {fmt}")
+        card = self.get(incident_id)
+        if card is None:
+            return None
+        
+        if fmt == "json":
+            automation = {"available": card["automation"]["available"]}
+            if validation is not None:
+                automation.update({key: value for key, value in validation.items() if key not in ("script", "title", "severity")})
+            return dict(card["json"], frequency=frequency, automation=automation)
+        
+        status = self.status_lines(card, validation)
+        if fmt == "markdown":
+            header, steps = card["markdown"]
+            if frequency is not None:
+                header += f" | **Frequency in KB:** {frequency}"
+            return f"{header}\n\n{steps}\n\n**Automation:** {'; '.join(line.strip() for line in status)}\n"
+        
+        lines = list(card["summary"])
+        if frequency is not None:
+            lines.append(f"Frequency in KB: {frequency} occurrences")
+        return "\n".join(lines + ["", "RESOLUTION STEPS:"] + card["steps"] + ["", "AUTOMATION STATUS:"] + status) + "\n"
+
 class AutomationEngine:
-    def __init__(self, knowledge_base: KnowledgeBaseManager):
+    def __init__(self, knowledge_base: KnowledgeBaseManager, backend: str = "simulated", script_dir: str = None,
+                 runner: SubprocessRunner = None, fleet_transport: str = "ssh", fleet_concurrency: int = 20,
+                 fleet_canary: int = 1, fleet_batch_size: int = None, fleet_max_failures: int = 0, policy: Dict = None,
+                 backup_command: str = None, allow_unbacked: bool = False):
+        if backend not in ("simulated", "subprocess"):
+            raise ValueError(f"Unknown automation backend: {backend}")
+        if backend == "subprocess" and fleet_transport == "local" and not script_dir:
+            raise ValueError("The local fleet transport needs --automation-scripts stand-ins; "
+                             "it would otherwise run the KB automation on this machine once per target")
         self.kb = knowledge_base
         self.execution_log = []
         self.execution_history = defaultdict(list)
+        self.planner = RemediationPlanner()
+        self.backend = backend
+        self.script_dir = script_dir
+        self.backup_command = backup_command
+        self.allow_unbacked = allow_unbacked
+        self.runner = runner or SubprocessRunner()
+        self.fleet_options = {"transport": fleet_transport, "concurrency": fleet_concurrency, "canary": fleet_canary,
+                              "batch_size": fleet_batch_size, "max_failures": fleet_max_failures}
         
         self.safety_rules = {
             "dangerous_commands": ["rm -rf", "format", "mkfs", "dd if=", "chmod 777", "passwd", "mkfs", "fdisk", "> /dev/sd", "shutdown", "reboot", "halt", "init 0", "kill -9", "pkill"],
@@ -1089,45 +4109,62 @@ class AutomationEngine:
                 "approval_required_for": ["critical", "high"]
             }
         }
+        self.policy = AutomationPolicy(self.safety_rules, policy)
+        self.cards = AnswerCardCache(knowledge_base, self.assess_script)
+        self.cards.warm()
     
-    def validate_automation(self, incident_id: str, environment: str = "production") -> Dict:
-        self.kb.cursor.execute('''
-        SELECT automation_script, severity, issue_title, category 
-        FROM incidents WHERE id = ?
-        ''', (incident_id,))
-        
-        result = self.kb.cursor.fetchone()
-        if not result or not result[0]:
-            return {"valid": False, "reason": "No automation script available", "risk_level": "none"}
-        
-        script, severity, title, category = result
+    def assess_script(self, script: str, severity: str, title: str) -> Dict:
+        if not script:
+            return {"valid": False, "available": False, "reason": "No automation script available", "risk_level": "none"}
         
+        lowered = script.lower()
         for dangerous in self.safety_rules["dangerous_commands"]:
-            if dangerous in script.lower():
-                return {"valid": False, "reason": f"Dangerous command detected: {dangerous}", "risk_level": "critical"}
+            if dangerous in lowered:
+                return {"valid": False, "available": True, "reason": f"Dangerous command detected: {dangerous}",
+                        "risk_level": "critical"}
         
-        requires_extra_approval = False
-        for critical in self.safety_rules["critical_commands"]:
-            if critical in script.lower():
-                requires_extra_approval = True
-                break
+        requires_extra_approval = any(critical in lowered for critical in self.safety_rules["critical_commands"])
         
         risk_level = "low"
-        if any(cmd in script.lower() for cmd in ["delete", "drop", "truncate", "purge"]):
+        if any(cmd in lowered for cmd in ["delete", "drop", "truncate", "purge"]):
             risk_level = "high"
-        elif any(cmd in script.lower() for cmd in ["stop", "start", "reconfigure"]):
+        elif any(cmd in lowered for cmd in ["stop", "start", "reconfigure"]):
             risk_level = "medium"
         
-        if environment == "production":
+        return {
+            "valid": True,
+            "available": True,
+            "requires_extra_approval": requires_extra_approval,
+            "risk_level": risk_level,
+            "script": script,
+            "severity": severity,
+            "title": title,
+            "estimated_time": 30
+        }
+    
+    def validate_automation(self, incident_id: str, environment: str = "production") -> Dict:
+        card = self.cards.get(incident_id)
+        if card is None:
+            return {"valid": False, "reason": "No automation script available", "risk_level": "none"}
+        
+        eligibility = card["automation"]
+        if not eligibility["valid"]:
+            return {key: eligibility[key] for key in ("valid", "reason", "risk_level")}
+        
+        severity = eligibility["severity"]
+        risk_level = eligibility["risk_level"]
+        requires_confirmation = False
+        if environment in self.policy.restricted_environments:
             safeguards = self.safety_rules["production_safeguards"]
             requires_confirmation = safeguards["require_confirmation"]
             
             if severity in safeguards["approval_required_for"]:
                 requires_confirmation = True
-            
-            current_hour = datetime.now().hour
-            if not safeguards["time_restrictions"]["business_hours"] and 9 <= current_hour < 17:
-                return {"valid": False, "reason": "Automation not allowed during business hours", "risk_level": risk_level}
+        
+        decision = self.policy.decide(environment, severity)
+        if not decision["allowed"]:
+            return {"valid": False, "reason": decision["reason"], "risk_level": risk_level,
+                    "next_allowed": decision["next_allowed"]}
         
         recent_executions = [
             exec for exec in self.execution_history.get(incident_id, [])
@@ -1137,132 +4174,938 @@ class AutomationEngine:
         if len(recent_executions) >= 3:
             return {"valid": False, "reason": "Too many recent executions (rate limit exceeded)", "risk_level": "high"}
         
-        return {
-            "valid": True,
-            "requires_confirmation": requires_confirmation or severity == "critical",
-            "requires_extra_approval": requires_extra_approval,
-            "risk_level": risk_level,
-            "script": script,
-            "severity": severity,
-            "title": title,
-            "estimated_time": 30
+        validation = {key: value for key, value in eligibility.items() if key != "available"}
+        validation["requires_confirmation"] = requires_confirmation or severity == "critical"
+        return validation
+    
+    def _resolve_script(self, incident_id: str, script: str) -> str:
+        if self.script_dir:
+            stand_in = os.path.join(self.script_dir, f"{incident_id}.sh")
+            if os.path.exists(stand_in):
+                return f"sh {shlex.quote(stand_in)}"
+        return script
+    
+    def plan_automation(self, incident_id: str, environment: str = "production", script: str = None) -> Dict:
+        if script is None:
+            self.kb.cursor.execute("SELECT automation_script FROM incidents WHERE id = ?", (incident_id,))
+            row = self.kb.cursor.fetchone()
+            if not row or not row[0]:
+                return None
+            script = row[0]
+        
+        backup_required = self.safety_rules["production_safeguards"]["backup_required"]
+        plan = self.planner.run_preflight(self.planner.plan(incident_id, script, environment, backup_required))
+        if self.backend == "subprocess" and "prepare:backup" in plan["steps"] and not (self.backup_command or self.allow_unbacked):
+            plan["blockers"].append("a backup is required but no --backup-command is configured for the subprocess backend "
+                                    "(pass --allow-unbacked to run without one)")
+            plan["blocked"] = True
+        return plan
+    
+    def fleet_executor(self) -> FleetExecutor:
+        options = dict(self.fleet_options)
+        transport = FLEET_TRANSPORTS["simulated" if self.backend == "simulated" else options.pop("transport")]()
+        options.pop("transport", None)
+        return FleetExecutor(SubprocessRunner(output_lines=10), transport, **options)
+    
+    def execute_automation(self, incident_id: str, confirm: bool = False, environment: str = "production",
+                           targets: List[str] = None, out: "OutputBuffer" = None) -> Dict:
+        out = out or OutputBuffer()
+        validation = self.validate_automation(incident_id, environment)
+        
+        if not validation["valid"]:
+            return {
+                "success": False,
+                "message": f"Cannot execute automation: {validation['reason']}",
+                "execution_id": None,
+                "risk_level": validation["risk_level"]
+            }
+        
+        title, script, severity = validation["title"], validation["script"], validation["severity"]
+        category = self.cards.get(incident_id)["json"]["category"]
+        
+        if validation["requires_confirmation"] and not confirm:
+            return {
+                "success": False,
+                "message": f"Automation requires confirmation for {severity} severity issue",
+                "requires_confirmation": True,
+                "requires_extra_approval": validation.get("requires_extra_approval", False),
+                "risk_level": validation["risk_level"]
+            }
+        
+        resolved = self._resolve_script(incident_id, script)
+        plan = self.plan_automation(incident_id, environment, resolved)
+        if targets and self.backend == "subprocess" and self.fleet_options["transport"] == "local" and resolved == script:
+            plan["blockers"].append(f"no stand-in script for {incident_id} in --automation-scripts; "
+                                    f"the local fleet transport only runs stand-ins")
+            plan["blocked"] = True
+        script = resolved
+        if plan["blocked"]:
+            AUTOMATION_EXECUTIONS.inc(status="blocked", backend=self.backend)
+            return {
+                "success": False,
+                "message": f"Pre-flight checks failed: {'; '.join(plan['blockers'])}",
+                "execution_id": None,
+                "risk_level": validation["risk_level"],
+                "plan": plan
+            }
+        
+        execution_id = f"AUTO_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{incident_id}"
+        
+        out.write(f"\nEXECUTING AUTOMATION")
+        out.write(f"Incident: {title}")
+        out.write(f"ID: {incident_id}")
+        out.write(f"Execution: {execution_id}")
+        out.write(f"Risk Level: {validation['risk_level'].upper()}")
+        out.write(f"Category: {category.upper()}")
+        out.write(f"Severity: {severity.upper()}")
+        out.write("-" * 60)
+        out.flush()
+        
+        execution_details = []
+        command_results = []
+        fleet_result = None
+        status = "SUCCESS"
+        total_steps = len(plan["levels"])
+        timeout = self.safety_rules["production_safeguards"]["max_execution_time"]
+        deadline = time.monotonic() + timeout
+        started = time.monotonic()
+        
+        for i, level in enumerate(plan["levels"], 1):
+            level_steps = [plan["steps"][step_id] for step_id in level]
+            out.write(f"\nStep {i}/{total_steps}: {' | '.join(step['description'] for step in level_steps)}")
+            
+            if targets and level_steps[0]["kind"] == "command":
+                if fleet_result is None:
+                    commands = [step["description"] for step in plan["steps"].values() if step["kind"] == "command"]
+                    executor = self.fleet_executor()
+                    out.write(f"   Fanning out to {len(targets)} hosts via {executor.transport.name} "
+                              f"(canary {executor.canary}, window {executor.concurrency}, "
+                              f"batch {executor.batch_size or 'all'}, max failures {executor.max_failures})")
+                    fleet_result = executor.run(targets, commands, timeout, on_result=lambda result: self._stream(
+                        out, f"   {result['host']}: {result['status']} ({result['duration']:.2f}s)")
+                        if result["status"] != "SUCCESS" else None, gate=self.policy.gate(environment, severity))
+                    counts = fleet_result["counts"]
+                    if fleet_result["halted"]:
+                        out.write(f"   Rollout halted: {fleet_result['halted']}")
+                    out.write(f"   Fleet: {counts.get('SUCCESS', 0)} succeeded, "
+                              f"{counts.get('FAILED', 0) + counts.get('TIMEOUT', 0)} failed, {counts.get('SKIPPED', 0)} skipped "
+                              f"in {fleet_result['duration']:.2f}s (serial {fleet_result['serial_time']:.2f}s)")
+                    if fleet_result["status"] != "SUCCESS":
+                        status = "FAILED"
+                level_steps[0]["status"] = "completed" if status == "SUCCESS" else "failed"
+            elif self.backend == "subprocess" and (level_steps[0]["kind"] == "command" or
+                                                   level_steps[0]["kind"] == "prepare" and self.backup_command):
+                command = self.backup_command if level_steps[0]["kind"] == "prepare" else level_steps[0]["description"]
+                result = self.runner.run([command], deadline - time.monotonic(),
+                                         on_output=lambda stream, line: self._stream(out, f"   [{stream}] {line}"))
+                command_results.extend(result["commands"])
+                level_steps[0]["status"] = "completed" if result["status"] == "SUCCESS" else result["status"].lower()
+                if result["status"] != "SUCCESS":
+                    status = result["status"]
+                    out.write(f"   Command {'timed out' if status == 'TIMEOUT' else 'failed'} "
+                              f"(exit code {result['exit_code']}, limit {timeout}s)")
+            elif self.backend == "subprocess" and level_steps[0]["kind"] in ("prepare", "verify"):
+                for step in level_steps:
+                    step["status"] = "skipped"
+                out.write(f"   Skipped: no {level_steps[0]['kind']} action is configured for the subprocess backend")
+            elif level_steps[0]["kind"] not in self.planner.probes:
+                time.sleep(max(step["estimate"] for step in level_steps) * 0.1)
+            
+            for step in level_steps:
+                if step["status"] == "warning":
+                    out.write(f"   Warning: {step['result']['detail']}")
+                execution_details.append({
+                    "step": i,
+                    "description": step["description"],
+                    "status": "completed" if step["status"] == "pending" else step["status"],
+                    "timestamp": datetime.now().isoformat()
+                })
+            
+            out.flush()
+            if status != "SUCCESS":
+                break
+        
+        execution_record = {
+            "execution_id": execution_id,
+            "incident_id": incident_id,
+            "script": script,
+            "status": status,
+            "backend": self.backend,
+            "risk_level": validation["risk_level"],
+            "environment": environment,
+            "timestamp": datetime.now().isoformat(),
+            "execution_time": time.monotonic() - started if self.backend == "subprocess" else plan["critical_path_time"],
+            "details": execution_details,
+            "exit_codes": [result["exit_code"] for result in command_results],
+            "fleet": fleet_result,
+            "output": [line for result in command_results for line in result["output"]][-self.runner.output_lines:]
+        }
+        
+        self.execution_log.append(execution_record)
+        self.execution_history[incident_id].append(execution_record)
+        AUTOMATION_EXECUTIONS.inc(status=status.lower(), backend=self.backend)
+        
+        if status != "SUCCESS":
+            out.write(f"\nAUTOMATION {status}")
+            out.write(f"Execution ID: {execution_id}")
+            out.flush()
+            return {
+                "success": False,
+                "execution_id": execution_id,
+                "message": f"Automation {status.lower()} at step {len(execution_details)} " + (
+                    f"({fleet_result['status'].lower()}: {', '.join(f'{state.lower()} {count}' for state, count in fleet_result['counts'].items())})"
+                    if fleet_result else f"(exit codes: {execution_record['exit_codes']})"),
+                "risk_level": validation["risk_level"]
+            }
+        
+        self.kb.increment_frequency(incident_id)
+        
+        out.write(f"\nAUTOMATION COMPLETED SUCCESSFULLY!")
+        out.write(f"Execution ID: {execution_id}")
+        out.write(f"Status: COMPLETED")
+        out.write(f"Time saved: ~{validation['estimated_time']} minutes")
+        out.flush()
+        
+        return {
+            "success": True,
+            "execution_id": execution_id,
+            "message": f"Automation executed successfully ({self.backend})",
+            "time_saved_minutes": validation["estimated_time"],
+            "risk_level": validation["risk_level"]
+        }
+    
+    def _stream(self, out: "OutputBuffer", line: str):
+        out.write(line)
+        out.flush()
+
+VOLATILE_PATTERN_FIELDS = {"ip_address", "percentage", "memory_size", "time_duration", "version"}
+
+class AlertCoalescer:
+    def __init__(self, pattern_matcher: PatternMatcher, window: float = 60.0, max_cached_fingerprints: int = 10000,
+                 max_clusters: int = 1000):
+        self.matcher = pattern_matcher
+        self.nlp = pattern_matcher.nlp
+        self.window = window
+        self.max_clusters = max_clusters
+        self.max_cached_fingerprints = max_cached_fingerprints
+        self.vocabulary = {term for terms in self.nlp.tech_vocabulary.values() for term in terms}
+        self.clusters = OrderedDict()
+        self._fingerprint_cache = OrderedDict()
+        self.stats = defaultdict(int)
+    
+    def fingerprint(self, analysis: Dict) -> str:
+        tokens = sorted({token for token in analysis["tokens"] if token.isalpha() or token in self.vocabulary})
+        
+        volatile_values = set()
+        for name in VOLATILE_PATTERN_FIELDS:
+            for match in analysis["patterns"].get(name, []):
+                parts = match if isinstance(match, tuple) else (match,)
+                volatile_values.update(piece for part in parts for piece in re.split(r"[.:]", part))
+        
+        patterns = sorted(
+            (name, sorted({str(match) for match in matches} - volatile_values))
+            for name, matches in analysis["patterns"].items() if name not in VOLATILE_PATTERN_FIELDS
+        )
+        return hashlib.sha1(json.dumps([tokens, patterns]).encode("utf-8")).hexdigest()[:16]
+    
+    def _analyze(self, user_query: str) -> tuple:
+        cached = self._fingerprint_cache.get(user_query)
+        if cached is not None:
+            self._fingerprint_cache.move_to_end(user_query)
+            CACHE_REQUESTS.inc(cache="fingerprint", result="hit")
+            return cached
+        
+        CACHE_REQUESTS.inc(cache="fingerprint", result="miss")
+        analysis = self.nlp.preprocess_query(user_query)
+        cached = (self.fingerprint(analysis), analysis)
+        self._fingerprint_cache[user_query] = cached
+        if len(self._fingerprint_cache) > self.max_cached_fingerprints:
+            self._fingerprint_cache.popitem(last=False)
+        return cached
+    
+    def submit(self, user_query: str, now: float = None) -> List[Dict]:
+        now = now if now is not None else time.time()
+        closed = self.expire(now)
+        self.stats["alerts"] += 1
+        
+        fingerprint, analysis = self._analyze(user_query)
+        cluster = self.clusters.get(fingerprint)
+        if cluster is not None:
+            cluster["count"] += 1
+            cluster["last_seen"] = now
+            self.clusters.move_to_end(fingerprint)
+            self.stats["coalesced"] += 1
+            return closed
+        
+        start_time = time.time()
+        matches = self.matcher.find_matches(user_query, analysis=analysis, record=False)
+        self.stats["matched"] += 1
+        match = matches[0] if matches else None
+        cluster = self.clusters[fingerprint] = {
+            "fingerprint": fingerprint,
+            "query": user_query,
+            "count": 1,
+            "first_seen": now,
+            "last_seen": now,
+            "match": match,
+            "action": (self.matcher.get_recommended_action(match.confidence_level, match.severity) if match
+                       else self.matcher.get_recommended_action("no_match")),
+            "response_time": (time.time() - start_time) * 1000
+        }
+        opened = dict(cluster, event="open")
+        while len(self.clusters) > self.max_clusters:
+            _, evicted = self.clusters.popitem(last=False)
+            closed.append(self._close(evicted))
+            self.stats["evicted"] += 1
+        return closed + [opened]
+    
+    def _close(self, cluster: Dict) -> Dict:
+        if cluster["match"] is not None:
+            self.matcher._record_best_match(cluster["query"], cluster["match"], cluster["response_time"], cluster["count"])
+        self.stats["clusters"] += 1
+        return dict(cluster, event="close")
+    
+    def expire(self, now: float = None) -> List[Dict]:
+        now = now if now is not None else time.time()
+        closed = []
+        while self.clusters:
+            fingerprint, cluster = next(iter(self.clusters.items()))
+            if now - cluster["last_seen"] < self.window:
+                break
+            self.clusters.popitem(last=False)
+            closed.append(self._close(cluster))
+        return closed
+    
+    def flush(self) -> List[Dict]:
+        closed = [self._close(cluster) for cluster in self.clusters.values()]
+        self.clusters.clear()
+        return closed
+
+LOG_TRIGGER_TERMS = ("error", "errors", "fail", "failed", "failure", "fatal", "critical", "timeout", "timed out",
+                     "refused", "denied", "unreachable", "down", "crash", "crashed", "exception", "panic", "oom",
+                     "out of memory", "full", "killed", "unhealthy", "degraded", "lag", "deadlock", "expired",
+                     "500", "502", "503", "504")
+
+class LogIngestionPipeline:
+    def __init__(self, pattern_matcher: PatternMatcher, dedup_window: float = 60.0, batch_size: int = 50,
+                 batch_wait: float = 1.0, max_signatures: int = 10000, queue_size: int = 256, poll_interval: float = 0.5,
+                 coalescer: AlertCoalescer = None, idle_timeout: float = 2.0):
+        self.matcher = pattern_matcher
+        self.coalescer = coalescer
+        self.dedup_window = dedup_window
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_signatures = max_signatures
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        
+        self.prefilter = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in LOG_TRIGGER_TERMS) + r")\b")
+        self.volatile = re.compile(
+            r"(?P<timestamp>^\s*(?:\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:z|[+-]\d{2}:?\d{2})?"
+            r"|[a-z]{3}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2})(?:\s+[\w.-]+(?=\s+[\w./-]+\[\d+\]:))?)"
+            r"|(?P<ip>\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b)"
+            r"|(?P<hex>\b0x[0-9a-f]+\b|\b(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{8,}\b)"
+            r"|(?P<pid>\[\d+\])"
+            r"|(?P<number>(?<!port )\b\d{4,}\b)"
+        )
+        self.stats = defaultdict(int)
+    
+    def _replace_volatile(self, match) -> str:
+        return "" if match.lastgroup == "timestamp" else f"<{match.lastgroup}>"
+    
+    def signature(self, line: str) -> str:
+        return " ".join(self.volatile.sub(self._replace_volatile, line.lower()).split())
+    
+    def _push_lines(self, data: bytes, pending: bytes, line_queue: queue.Queue) -> bytes:
+        *lines, pending = (pending + data).split(b"\n")
+        if lines:
+            line_queue.put([line.decode("utf-8", errors="replace") for line in lines])
+        return pending
+    
+    def _read_fd(self, fd: int, line_queue: queue.Queue):
+        pending = b""
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            pending = self._push_lines(data, pending, line_queue)
+        if pending:
+            line_queue.put([pending.decode("utf-8", errors="replace")])
+    
+    def _tail_file(self, path: str, follow: bool, line_queue: queue.Queue, from_start: bool = False):
+        handle = open(path, "rb")
+        if follow and not from_start:
+            os.lseek(handle.fileno(), 0, os.SEEK_END)
+        pending = b""
+        try:
+            while True:
+                data = os.read(handle.fileno(), 65536)
+                if data:
+                    pending = self._push_lines(data, pending, line_queue)
+                    continue
+                if not follow:
+                    break
+                
+                time.sleep(self.poll_interval)
+                try:
+                    current = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                opened = os.fstat(handle.fileno())
+                if current.st_ino != opened.st_ino or current.st_size < handle.tell():
+                    handle.close()
+                    handle = open(path, "rb")
+                    pending = b""
+        finally:
+            handle.close()
+        if pending:
+            line_queue.put([pending.decode("utf-8", errors="replace")])
+    
+    def _read_socket(self, path: str, follow: bool, line_queue: queue.Queue):
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        if not follow:
+            sock.settimeout(self.idle_timeout)
+        try:
+            while True:
+                try:
+                    data = sock.recv(65536)
+                except socket.timeout:
+                    break
+                lines = [line for line in data.decode("utf-8", errors="replace").split("\n") if line]
+                if lines:
+                    line_queue.put(lines)
+        finally:
+            sock.close()
+            os.unlink(path)
+    
+    def _read_source(self, source: str, follow: bool, from_start: bool, line_queue: queue.Queue):
+        try:
+            if source == "-":
+                self._read_fd(sys.stdin.fileno(), line_queue)
+            elif source.startswith("unix:"):
+                self._read_socket(source[5:], follow, line_queue)
+            else:
+                self._tail_file(source, follow, line_queue, from_start)
+        except OSError as e:
+            print(f"Log source {source} failed: {str(e)}")
+        finally:
+            line_queue.put(None)
+    
+    def read_lines(self, sources: List[str], follow: bool = True, from_start: bool = False):
+        line_queue = queue.Queue(maxsize=self.queue_size)
+        for source in sources:
+            threading.Thread(target=self._read_source, args=(source, follow, from_start, line_queue), daemon=True).start()
+        
+        active = len(sources)
+        while active:
+            try:
+                chunk = line_queue.get(timeout=self.batch_wait)
+            except queue.Empty:
+                yield None
+                continue
+            if chunk is None:
+                active -= 1
+                continue
+            yield from chunk
+    
+    def filter_lines(self, lines):
+        prefilter = self.prefilter.search
+        for line in lines:
+            if line is None:
+                yield None
+                continue
+            self.stats["lines"] += 1
+            lowered = line.lower()
+            if prefilter(lowered):
+                yield lowered
+    
+    def deduplicate(self, lines):
+        seen = OrderedDict()
+        for line in lines:
+            if line is None:
+                yield None
+                continue
+            
+            now = time.monotonic()
+            while seen and now - next(iter(seen.values()))[0] >= self.dedup_window:
+                seen.popitem(last=False)
+            
+            signature = self.signature(line)
+            entry = seen.get(signature)
+            if entry is not None:
+                entry[1] += 1
+                self.stats["suppressed"] += 1
+                continue
+            
+            seen[signature] = [now, 0]
+            if len(seen) > self.max_signatures:
+                seen.popitem(last=False)
+            self.stats["signatures"] += 1
+            yield signature, line
+    
+    def batch(self, events):
+        batch = []
+        started = None
+        for event in events:
+            if event is not None:
+                batch.append(event)
+                started = started or time.monotonic()
+            if batch and (event is None or len(batch) >= self.batch_size or time.monotonic() - started >= self.batch_wait):
+                yield batch
+                batch = []
+                started = None
+        if batch:
+            yield batch
+    
+    def triage(self, batches):
+        for batch in batches:
+            self.stats["batches"] += 1
+            queries = [signature for signature, _ in batch]
+            if hasattr(self.matcher, "find_matches_batch"):
+                results = self.matcher.find_matches_batch(queries)
+            else:
+                results = [self.matcher.find_matches(query) for query in queries]
+            
+            for (signature, line), matches in zip(batch, results):
+                yield {"signature": signature, "line": line, "matches": matches}
+    
+    def coalesce(self, lines):
+        for line in lines:
+            if line is None:
+                yield from self.coalescer.expire()
+                continue
+            yield from self.coalescer.submit(self.signature(line))
+        yield from self.coalescer.flush()
+    
+    def run(self, sources: List[str], follow: bool = True, from_start: bool = False):
+        lines = self.filter_lines(self.read_lines(sources, follow, from_start))
+        if self.coalescer:
+            return self.coalesce(lines)
+        return self.triage(self.batch(self.deduplicate(lines)))
+
+QUERY_HISTORY_SIZE = 100
+ABBREVIATED_QUERIES = [
+    ("pg high cpu slow queries", "DB"),
+    ("k8s pod stuck in crashloop", "SRV"),
+    ("jvm oom errors", "PERF"),
+    ("db conn timed out", "DB"),
+    ("cert expired on lb", "NET"),
+    ("high mem usage and long gc pauses", "PERF"),
+    ("5xx from the api", "APP"),
+    ("no space left on device", "STOR"),
+    ("mongo repl lag", "DB"),
+    ("fw dropping traffic to svc", "NET")
+]
+EXAMPLE_QUERIES = [
+    "tomcat server not responding on port 8080",
+    "mysql database connection timeout error",
+    "high cpu usage at 95% on java process",
+    "disk space full on /var/log directory",
+    "application throwing 500 internal server error",
+    "ssl certificate expired error on website",
+    "nginx 502 bad gateway error",
+    "memory leak in jvm causing outofmemoryerror",
+    "database disk space full mysql",
+    "firewall blocking required ports for application",
+    "load balancer health check failures",
+    "brute force attack detected multiple failed logins"
+]
+
+class QueryProfiler:
+    def __init__(self, output_dir: str = "profiles", interval: float = 0.002):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.remaining = 0
+        self.mode = None
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        self.profile = None
+        self.sampler = None
+        self.target_thread = None
+        self.capturing = threading.Event()
+        self.stopping = threading.Event()
+    
+    def arm(self, queries: int, mode: str = "sample"):
+        if mode not in ("sample", "cprofile"):
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        self.disarm()
+        self.remaining = queries
+        self.mode = mode
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        if mode == "cprofile":
+            self.profile = cProfile.Profile()
+        else:
+            self.stopping.clear()
+            self.sampler = threading.Thread(target=self._sample_loop, name="query-profiler", daemon=True)
+            self.sampler.start()
+    
+    def _sample_loop(self):
+        while not self.stopping.is_set():
+            if not self.capturing.wait(0.1):
+                continue
+            frame = sys._current_frames().get(self.target_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+            time.sleep(self.interval)
+    
+    def begin(self):
+        self.target_thread = threading.get_ident()
+        if self.profile:
+            self.profile.enable()
+        else:
+            self.capturing.set()
+    
+    def end(self) -> str:
+        if self.profile:
+            self.profile.disable()
+        else:
+            self.capturing.clear()
+        self.remaining -= 1
+        return self.disarm() if self.remaining <= 0 else None
+    
+    def disarm(self) -> str:
+        path = None
+        if self.sampler:
+            self.stopping.set()
+            self.capturing.clear()
+            self.sampler.join()
+            self.sampler = None
+            if self.stacks:
+                path = self._output_path("collapsed")
+                with open(path, "w", encoding="utf-8") as handle:
+                    for stack, count in sorted(self.stacks.items()):
+                        handle.write(f"{stack} {count}\n")
+        elif self.profile:
+            path = self._output_path("pstats")
+            self.profile.dump_stats(path)
+            self.profile = None
+        self.remaining = 0
+        return path
+    
+    def _output_path(self, extension: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.{extension}")
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = 500.0, path: str = "slow_queries.jsonl", keep: int = 50):
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self.recent = deque(maxlen=keep)
+    
+    def observe(self, query: str, elapsed_ms: float, timings: Dict, ranking_stats: Dict, **context) -> bool:
+        if self.threshold_ms is None or elapsed_ms < self.threshold_ms:
+            return False
+        
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "query": query,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "timings_ms": {name: round(value, 3) for name, value in timings.items()},
+            "ranking": {
+                "generated": ranking_stats.get("generated"),
+                "pruned": ranking_stats.get("pruned"),
+                "early_exit": ranking_stats.get("early_exit"),
+                "partition": ranking_stats.get("partition"),
+                "fallback": ranking_stats.get("fallback"),
+                "stage_ms": {name: round(value, 3) for name, value in ranking_stats.get("timings", {}).items()}
+            },
+            **context
         }
+        self.recent.append(entry)
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(entry) + "\n")
+        return True
+
+class OutputBuffer:
+    def __init__(self, stream=None, flush_threshold: int = 64 * 1024):
+        self.stream = stream
+        self.flush_threshold = flush_threshold
+        self.lines = []
+        self.size = 0
     
-    def execute_automation(self, incident_id: str, confirm: bool = False, environment: str = "production") -> Dict:
-        validation = self.validate_automation(incident_id, environment)
-        
-        if not validation["valid"]:
-            return {
-                "success": False,
-                "message": f"Cannot execute automation: {validation['reason']}",
-                "execution_id": None,
-                "risk_level": validation["risk_level"]
-            }
-        
-        self.kb.cursor.execute('''
-        SELECT issue_title, automation_script, category, severity 
-        FROM incidents WHERE id = ?
-        ''', (incident_id,))
+    def write(self, text: str = ""):
+        self.lines.append(text)
+        self.size += len(text) + 1
+        if self.size >= self.flush_threshold:
+            self.flush()
+    
+    def flush(self):
+        if not self.lines:
+            return
+        stream = self.stream or sys.stdout
+        stream.write("\n".join(self.lines) + "\n")
+        stream.flush()
+        self.lines = []
+        self.size = 0
+
+CARRIED_PATTERN_FIELDS = ("service", "port", "path")
+SESSION_CONTEXT_TURNS = 3
+SESSION_CONTEXT_TERMS = 12
+SESSION_CATEGORY_DECAY = 0.5
+
+class ConversationContext:
+    __slots__ = ("session_id", "terms", "patterns", "category_scores", "turns", "last_seen")
+    
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.terms = OrderedDict()
+        self.patterns = {}
+        self.category_scores = {}
+        self.turns = 0
+        self.last_seen = time.time()
+    
+    def merge(self, analysis: Dict) -> Dict:
+        self.turns += 1
+        self.last_seen = time.time()
+        oldest = self.turns - SESSION_CONTEXT_TURNS
         
-        title, script, category, severity = self.kb.cursor.fetchone()
+        for term in [term for term, (_, turn) in self.terms.items() if turn < oldest]:
+            del self.terms[term]
+        for field in [field for field, (_, turn) in self.patterns.items() if turn < oldest]:
+            del self.patterns[field]
         
-        if validation["requires_confirmation"] and not confirm:
-            return {
-                "success": False,
-                "message": f"Automation requires confirmation for {severity} severity issue",
-                "requires_confirmation": True,
-                "requires_extra_approval": validation.get("requires_extra_approval", False),
-                "risk_level": validation["risk_level"]
-            }
+        present = set(analysis["tokens"])
+        carried = [term for term in self.terms if term not in present]
         
-        execution_id = f"AUTO_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{incident_id}"
+        category_scores = defaultdict(float, analysis["category_scores"])
+        for category, score in self.category_scores.items():
+            category_scores[category] += score * SESSION_CATEGORY_DECAY
         
-        print(f"\nEXECUTING AUTOMATION")
-        print(f"Incident: {title}")
-        print(f"ID: {incident_id}")
-        print(f"Execution: {execution_id}")
-        print(f"Risk Level: {validation['risk_level'].upper()}")
-        print(f"Category: {category.upper()}")
-        print(f"Severity: {severity.upper()}")
-        print("-" * 60)
+        matched_keywords = defaultdict(list)
+        for category, keywords in analysis["matched_keywords"].items():
+            matched_keywords[category].extend(keywords)
+        for term in carried:
+            matched_keywords[self.terms[term][0]].append(term)
         
-        execution_steps = [
-            ("Safety validation and pre-flight checks", 1),
-            ("Reviewing automation script", 1),
-            ("Creating backup/restore point", 2),
-            ("Executing automation commands", 3),
-            ("Monitoring execution progress", 2),
-            ("Verifying results and system health", 2),
-            ("Logging execution details", 1)
-        ]
+        patterns = {field: list(values) for field, (values, _) in self.patterns.items() if field not in analysis["patterns"]}
+        patterns.update(analysis["patterns"])
         
-        execution_details = []
-        total_steps = len(execution_steps)
+        merged = dict(analysis)
+        merged["tokens"] = analysis["tokens"] + carried
+        merged["patterns"] = patterns
+        merged["category_scores"] = dict(category_scores)
+        merged["primary_category"] = max(category_scores.items(), key=lambda x: x[1])[0] if category_scores else "unknown"
+        merged["matched_keywords"] = dict(matched_keywords)
+        merged["context"] = list(dict.fromkeys(carried + [value for field in CARRIED_PATTERN_FIELDS
+                                                          if field not in analysis["patterns"]
+                                                          for value in patterns.get(field, []) if value not in present]))
         
-        for i, (description, duration) in enumerate(execution_steps, 1):
-            print(f"\nStep {i}/{total_steps}: {description}")
-            time.sleep(duration * 0.3)
-            
-            execution_details.append({
-                "step": i,
-                "description": description,
-                "status": "completed",
-                "timestamp": datetime.now().isoformat()
-            })
-        
-        print(f"\nExecuting script:")
-        for line in script.split('\n'):
-            if line.strip():
-                print(f"   {line[:60]}..." if len(line) > 60 else f"   {line}")
-                time.sleep(0.1)
+        for category, keywords in analysis["matched_keywords"].items():
+            for term in keywords:
+                self.terms[term] = (category, self.turns)
+                self.terms.move_to_end(term)
+        while len(self.terms) > SESSION_CONTEXT_TERMS:
+            self.terms.popitem(last=False)
+        for field in CARRIED_PATTERN_FIELDS:
+            if field in analysis["patterns"]:
+                self.patterns[field] = (tuple(dict.fromkeys(analysis["patterns"][field])), self.turns)
+        self.category_scores = merged["category_scores"]
         
-        execution_record = {
-            "execution_id": execution_id,
-            "incident_id": incident_id,
-            "script": script,
-            "status": "SUCCESS",
-            "risk_level": validation["risk_level"],
-            "environment": environment,
-            "timestamp": datetime.now().isoformat(),
-            "execution_time": sum(d[1] for d in execution_steps),
-            "details": execution_details
-        }
+        return merged
+
+class SessionManager:
+    def __init__(self, max_sessions: int = 10000, ttl: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+    
+    def get(self, session_id: str) -> ConversationContext:
+        self.expire()
+        context = self.sessions.get(session_id)
+        if context is None:
+            context = self.sessions[session_id] = ConversationContext(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(session_id)
+        return context
+    
+    def reset(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+    
+    def expire(self, now: float = None):
+        cutoff = (now or time.time()) - self.ttl
+        while self.sessions:
+            session_id, context = next(iter(self.sessions.items()))
+            if context.last_seen >= cutoff:
+                break
+            del self.sessions[session_id]
+    
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+class TenantState:
+    __slots__ = ("name", "knowledge_base", "nlp_engine", "pattern_matcher", "automation_engine", "_memory", "loaded_at")
+    
+    def __init__(self, name: str, knowledge_base: KnowledgeBaseManager, candidate_limit: int = 10,
+                 automation_options: Dict = None, synonyms: Dict = None):
+        self.name = name
+        self.knowledge_base = knowledge_base
+        self.nlp_engine = NLPEngine(knowledge_base, synonyms)
+        self.pattern_matcher = PatternMatcher(knowledge_base, self.nlp_engine, candidate_limit=candidate_limit)
+        self.automation_engine = AutomationEngine(knowledge_base, **(automation_options or {}))
+        self._memory = None
+        self.loaded_at = time.time()
+    
+    @property
+    def memory(self) -> int:
+        key = (self.knowledge_base.content_version, len(self.automation_engine.cards.cards))
+        if self._memory is None or self._memory[0] != key:
+            self._memory = (key, self.knowledge_base.memory_estimate() + self.nlp_engine.memory_estimate() +
+                            self.automation_engine.cards.memory_estimate())
+        return self._memory[1]
+    
+    def close(self):
+        self.pattern_matcher.close()
+        self.knowledge_base.close()
+
+class TenantManager:
+    TENANT_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+    
+    def __init__(self, base_dir: str = "tenants", memory_budget_mb: float = 256, candidate_limit: int = 10,
+                 automation_options: Dict = None, synonyms: Dict = None):
+        self.base_dir = base_dir
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.candidate_limit = candidate_limit
+        self.automation_options = automation_options or {}
+        self.synonyms = synonyms
+        self.tenants = OrderedDict()
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0}
+    
+    def db_path(self, name: str) -> str:
+        return os.path.join(self.base_dir, f"{name}.db")
+    
+    def runbook_path(self, name: str) -> str:
+        return os.path.join(self.base_dir, f"{name}.json")
+    
+    def available(self) -> List[str]:
+        entries = os.listdir(self.base_dir) if os.path.isdir(self.base_dir) else []
+        names = {os.path.splitext(entry)[0] for entry in entries if entry.endswith((".db", ".json"))}
+        return sorted(names | set(self.tenants))
+    
+    def get(self, name: str) -> TenantState:
+        if not self.TENANT_NAME.match(name):
+            raise ValueError(f"Invalid tenant name: {name}")
         
-        self.execution_log.append(execution_record)
-        self.execution_history[incident_id].append(execution_record)
+        state = self.tenants.get(name)
+        if state is not None:
+            self.stats["hits"] += 1
+            self.tenants.move_to_end(name)
+            CACHE_REQUESTS.inc(cache="tenant", result="hit")
+            return state
         
-        self.kb.cursor.execute('''
-        UPDATE incidents 
-        SET frequency = frequency + 1 
-        WHERE id = ?
-        ''', (incident_id,))
-        self.kb.conn.commit()
+        CACHE_REQUESTS.inc(cache="tenant", result="miss")
+        state = self._load(name)
+        self.tenants[name] = state
+        self.stats["loads"] += 1
+        self._enforce_budget(keep=name)
+        return state
+    
+    def _load(self, name: str) -> TenantState:
+        os.makedirs(self.base_dir, exist_ok=True)
+        db_path = self.db_path(name)
+        runbook = self.runbook_path(name)
+        is_new = not os.path.exists(db_path)
         
-        print(f"\nAUTOMATION COMPLETED SUCCESSFULLY!")
-        print(f"Execution ID: {execution_id}")
-        print(f"Status: COMPLETED")
-        print(f"Time saved: ~{validation['estimated_time']} minutes")
+        knowledge_base = KnowledgeBaseManager(db_path, seed=is_new and not os.path.exists(runbook))
+        if is_new and os.path.exists(runbook):
+            summary = knowledge_base.import_incidents(runbook, on_duplicate="skip")
+            print(f"Tenant '{name}' seeded from {runbook}: {', '.join(f'{status}: {count}' for status, count in summary.items())}")
         
-        return {
-            "success": True,
-            "execution_id": execution_id,
-            "message": "Automation executed successfully (simulated)",
-            "time_saved_minutes": validation["estimated_time"],
-            "risk_level": validation["risk_level"]
-        }
+        return TenantState(name, knowledge_base, self.candidate_limit, self.automation_options, self.synonyms)
+    
+    def memory_usage(self) -> int:
+        return sum(state.memory for state in self.tenants.values())
+    
+    def _enforce_budget(self, keep: str):
+        while self.memory_usage() > self.memory_budget and len(self.tenants) > 1:
+            name = next(iter(self.tenants))
+            if name == keep:
+                self.tenants.move_to_end(name)
+                continue
+            self.evict(name)
+    
+    def evict(self, name: str) -> bool:
+        state = self.tenants.pop(name, None)
+        if state is None:
+            return False
+        state.close()
+        self.stats["evictions"] += 1
+        return True
+    
+    def close(self):
+        for name in list(self.tenants):
+            self.evict(name)
 
 class ProductionSupportBot:
-    def __init__(self):
+    def __init__(self, shard_workers: int = 0, candidate_limit: int = 10, tenant_dir: str = "tenants",
+                 tenant_budget_mb: float = 256, snapshot_path: str = None, db_name: str = "production_kb.db",
+                 replication_dir: str = None, replication_role: str = "writer", node_id: str = None,
+                 sync_interval: float = 5.0, automation_backend: str = "simulated", automation_script_dir: str = None,
+                 fleet_options: Dict = None, profile_dir: str = "profiles", slow_query_ms: float = 500.0,
+                 retention_days: int = None, archive_dir: str = "archive", retention_interval: float = 3600.0,
+                 category_threshold: float = 0.75, synonyms_path: str = "synonyms.json", environment: str = "production",
+                 policy_path: str = "automation_policy.json", backup_command: str = None, allow_unbacked: bool = False):
         print("\n" + "="*80)
         print("="*80)
         
         print("\nINITIALIZING SYSTEM COMPONENTS...")
         print("-" * 60)
         
-        self.knowledge_base = KnowledgeBaseManager()
-        self.nlp_engine = NLPEngine(self.knowledge_base)
-        self.pattern_matcher = PatternMatcher(self.knowledge_base, self.nlp_engine)
-        self.automation_engine = AutomationEngine(self.knowledge_base)
+        seed = not replication_dir or (replication_role == "writer" and not os.path.exists(db_name))
+        self.knowledge_base = KnowledgeBaseManager(db_name, seed=seed)
+        self.replication_role = replication_role if replication_dir else None
+        self.replicator = None
+        self.sync_interval = sync_interval
+        self.last_sync = 0.0
+        if replication_dir:
+            node_id = node_id or socket.gethostname()
+            if not re.match(r'^[A-Za-z0-9_.-]+$', node_id):
+                raise ValueError(f"Invalid node id: {node_id}")
+            transport = FileReplicationTransport(replication_dir)
+            if replication_role == "writer":
+                self.knowledge_base.enable_change_log(node_id)
+                self.replicator = ReplicationPublisher(self.knowledge_base, transport)
+            elif replication_role == "reader":
+                self.replicator = ReplicationApplier(self.knowledge_base, transport, node_id)
+            else:
+                raise ValueError(f"Unknown replication role: {replication_role}")
+            result = self.replicator.sync()
+            self.last_sync = time.time()
+            print(f"Replication {replication_role} '{node_id}' on {replication_dir}: "
+                  f"{', '.join(f'{key}: {value}' for key, value in result.items())}")
+        
+        synonyms = load_synonyms(synonyms_path) if synonyms_path and os.path.exists(synonyms_path) else None
+        self.nlp_engine = NLPEngine(self.knowledge_base, synonyms)
+        if synonyms is not None:
+            print(f"Synonym table loaded from {synonyms_path}: {len(self.nlp_engine.synonyms)} entries")
+        if shard_workers > 0:
+            self.pattern_matcher = ShardedPatternMatcher(self.knowledge_base, self.nlp_engine, num_shards=shard_workers,
+                                                         candidate_limit=candidate_limit, snapshot_path=snapshot_path,
+                                                         category_threshold=category_threshold)
+        else:
+            self.pattern_matcher = PatternMatcher(self.knowledge_base, self.nlp_engine, candidate_limit=candidate_limit,
+                                                  category_threshold=category_threshold)
+        policy = load_automation_policy(policy_path) if policy_path and os.path.exists(policy_path) else None
+        automation_options = dict({"backend": automation_backend, "script_dir": automation_script_dir, "policy": policy,
+                                   "backup_command": backup_command, "allow_unbacked": allow_unbacked},
+                                  **(fleet_options or {}))
+        self.automation_engine = AutomationEngine(self.knowledge_base, **automation_options)
+        self.environment = environment
+        if policy is not None:
+            print(f"Automation policy loaded from {policy_path}: {len(self.automation_engine.policy.rules)} rules")
         
         self.session_metrics = {
             "queries_processed": 0,
@@ -1271,44 +5114,198 @@ class ProductionSupportBot:
             "unique_categories_matched": set(),
             "average_confidence": 0.0,
             "start_time": datetime.now(),
-            "query_history": []
+            "query_history": deque(maxlen=QUERY_HISTORY_SIZE)
         }
+        self.output = OutputBuffer()
+        self.sessions = SessionManager()
+        self.session_id = "interactive"
+        self.tenants = TenantManager(tenant_dir, tenant_budget_mb, candidate_limit, automation_options, synonyms)
+        self.tenant = "default"
+        self.default_tenant = (self.knowledge_base, self.nlp_engine, self.pattern_matcher, self.automation_engine)
+        self.retention = QueryLogRetention(self.knowledge_base.conn, archive_dir, retention_days) if retention_days else None
+        self.retention_interval = retention_interval
+        self.retention_pending = retention_days is not None
+        self.last_retention = 0.0
+        self.profiler = QueryProfiler(profile_dir)
+        self.slow_queries = SlowQueryLog(slow_query_ms, os.path.join(profile_dir, "slow_queries.jsonl"))
+        self.query_timings = {}
         
         print("\nSYSTEM INITIALIZATION COMPLETE")
         print("Ready to accept production support queries")
         print("="*80)
     
-    def process_query(self, user_query: str):
+    def sync_replication(self, force: bool = False) -> Dict:
+        if self.replicator is None or (not force and time.time() - self.last_sync < self.sync_interval):
+            return None
+        
+        self.last_sync = time.time()
+        return self.replicator.sync()
+    
+    def maintain_retention(self):
+        if self.retention is None:
+            return
+        if not self.retention_pending and time.time() - self.last_retention < self.retention_interval:
+            return
+        self.retention_pending = self.retention.step()
+        if not self.retention_pending:
+            self.last_retention = time.time()
+    
+    def run_maintenance(self):
+        if self.tenant == "default":
+            self.sync_replication()
+        self.maintain_retention()
+    
+    def show_retention(self, run: bool = False, convert: bool = False):
+        out = self.output
+        if self.retention is None:
+            out.write("   Retention is disabled (start with --retention-days N)")
+            out.flush()
+            return
+        
+        if convert:
+            out.write("   Rebuilding the database with incremental auto-vacuum (one-time full VACUUM)...")
+            out.flush()
+            self.retention.enable_incremental_vacuum()
+        if run:
+            result = self.retention.run()
+            self.retention_pending = False
+            self.last_retention = time.time()
+            out.write(f"   Archived {result['archived']} query log rows, pruned {result['rollups_pruned']} rollups, "
+                      f"vacuumed {result['pages_vacuumed']} pages")
+        
+        summary = self.retention.summary()
+        out.write(f"\nQUERY LOG RETENTION ({self.retention.retention_days} days raw, archive: {self.retention.archive_dir})")
+        out.write("-" * 60)
+        self.knowledge_base.cursor.execute("SELECT COUNT(*) FROM query_logs")
+        out.write(f"   Raw rows kept: {self.knowledge_base.cursor.fetchone()[0]} of {self.knowledge_base.query_log_count()} logged")
+        oldest = f" (oldest {summary['oldest_archived_day']})" if summary["oldest_archived_day"] else ""
+        out.write(f"   Archived: {summary['archived_queries']} queries over {summary['archived_days']} days{oldest}")
+        out.write(f"   Free pages: {summary['free_pages']} "
+                  f"({'incremental vacuum' if summary['incremental_vacuum'] else 'run retention convert to enable incremental vacuum'})")
+        out.flush()
+    
+    def show_policy(self, environment: str = None):
+        out = self.output
+        environment = environment or self.environment
+        policy = self.automation_engine.policy
+        out.write(f"\nAUTOMATION POLICY ({environment}{', current environment' if environment == self.environment else ''})")
+        out.write("-" * 60)
+        for severity in POLICY_SEVERITIES:
+            decision = policy.decide(environment, severity)
+            if decision["allowed"]:
+                window = f"until {decision['until']:%a %H:%M}" if decision["until"] else "at all times"
+                out.write(f"   {severity:9s} allowed {window}")
+            else:
+                window = f"next allowed {decision['next_allowed']:%a %H:%M}" if decision["next_allowed"] else "never allowed"
+                out.write(f"   {severity:9s} blocked ({decision['reason']}), {window}")
+        segments = sum(len(starts) for starts, _ in policy.schedules.values())
+        out.write(f"   {len(policy.rules)} rules compiled into {segments} weekly segments; "
+                  f"decisions: {policy.stats['decisions']} computed, {policy.stats['hits']} cached")
+        out.flush()
+    
+    def switch_tenant(self, name: str) -> str:
+        if name == "default":
+            self.knowledge_base, self.nlp_engine, self.pattern_matcher, self.automation_engine = self.default_tenant
+        else:
+            state = self.tenants.get(name)
+            self.knowledge_base = state.knowledge_base
+            self.nlp_engine = state.nlp_engine
+            self.pattern_matcher = state.pattern_matcher
+            self.automation_engine = state.automation_engine
+        
+        self.tenant = name
+        self.sessions.reset(self.session_id)
+        return name
+    
+    def show_tenants(self):
+        out = self.output
+        out.write(f"\nTENANTS (active: {self.tenant})")
+        out.write("-" * 60)
+        out.write(f"   {'default':20s} {self.knowledge_base.db_name if self.tenant == 'default' else self.default_tenant[0].db_name}")
+        for name in self.tenants.available():
+            state = self.tenants.tenants.get(name)
+            status = f"loaded, ~{state.memory / 1024:.0f} KiB" if state else "cold"
+            out.write(f"   {name:20s} {status}")
+        stats = self.tenants.stats
+        out.write(f"   Memory in use: {self.tenants.memory_usage() / (1024 * 1024):.1f} / "
+                  f"{self.tenants.memory_budget / (1024 * 1024):.1f} MiB "
+                  f"(loads: {stats['loads']}, hits: {stats['hits']}, evictions: {stats['evictions']})")
+        out.flush()
+    
+    def _profiled(self, func, *args, **kwargs):
+        if not self.profiler.remaining:
+            return func(*args, **kwargs)
+        
+        self.profiler.begin()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            path = self.profiler.end()
+            if path:
+                self.output.write(f"\nProfile written to {path}")
+                self.output.flush()
+    
+    def process_query(self, user_query: str, session_id: str = None, out: "OutputBuffer" = None, analysis: Dict = None):
+        out = out or self.output
+        started = time.perf_counter()
+        self.pattern_matcher.last_ranking_stats = {}
+        self.query_timings = {}
+        result = None
+        try:
+            result = self._profiled(self._process_query, user_query, out, session_id, analysis)
+            return result
+        finally:
+            out.flush()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            QUERIES_TOTAL.inc(tenant=self.tenant, outcome="matched" if result else "unmatched")
+            QUERY_SECONDS.observe(elapsed_ms / 1000, tenant=self.tenant)
+            for phase, phase_ms in self.query_timings.items():
+                STAGE_SECONDS.observe(phase_ms / 1000, stage=phase)
+            self.slow_queries.observe(user_query, elapsed_ms, self.query_timings, self.pattern_matcher.last_ranking_stats,
+                                      tenant=self.tenant, session_id=session_id)
+    
+    def _process_query(self, user_query: str, out: "OutputBuffer", session_id: str = None, analysis: Dict = None):
         self.session_metrics["queries_processed"] += 1
         query_start_time = time.time()
+        mark = time.perf_counter()
         
-        print(f"\nQUERY #{self.session_metrics['queries_processed']}: {user_query}")
-        print("-" * 70)
+        out.write(f"\nQUERY #{self.session_metrics['queries_processed']}: {user_query}")
+        out.write("-" * 70)
         
-        print("NLP ANALYSIS:")
-        analysis = self.nlp_engine.preprocess_query(user_query)
+        out.write("NLP ANALYSIS:")
+        analysis = analysis or self.nlp_engine.preprocess_query(user_query)
+        if session_id is not None:
+            analysis = self.sessions.get(session_id).merge(analysis)
+        self.query_timings["analysis"] = (time.perf_counter() - mark) * 1000
         
-        print(f"   Tokens extracted: {len(analysis['tokens'])}")
-        print(f"   Primary category: {analysis['primary_category'].upper()}")
+        out.write(f"   Tokens extracted: {len(analysis['tokens'])}")
+        if analysis.get("expansions"):
+            out.write(f"   Expanded terms: {', '.join(analysis['expansions'])}")
+        out.write(f"   Primary category: {analysis['primary_category'].upper()}")
+        if analysis.get("context"):
+            out.write(f"   Context from earlier turns: {', '.join(analysis['context'])}")
         
         if analysis["patterns"]:
-            print(f"   Patterns detected:")
+            out.write(f"   Patterns detected:")
             for pattern, matches in analysis["patterns"].items():
-                print(f"     - {pattern}: {matches}")
+                out.write(f"     - {pattern}: {matches}")
         
-        print("\nPATTERN MATCHING:")
-        matches = self.pattern_matcher.find_matches(user_query)
+        out.write("\nPATTERN MATCHING:")
+        mark = time.perf_counter()
+        matches = self.pattern_matcher.find_matches(user_query, analysis=analysis)
+        self.query_timings["matching"] = (time.perf_counter() - mark) * 1000
         
         if not matches:
-            print("   No matches found in knowledge base")
-            print("   Try rephrasing with more technical details")
-            print("   Examples: 'tomcat server down on port 8080', 'mysql connection timeout error'")
+            out.write("   No matches found in knowledge base")
+            out.write("   Try rephrasing with more technical details")
+            out.write("   Examples: 'tomcat server down on port 8080', 'mysql connection timeout error'")
             return None
         
         self.session_metrics["matches_found"] += 1
         best_match = matches[0]
         
         self.session_metrics["unique_categories_matched"].add(best_match["category"])
+        MATCH_CONFIDENCE.observe(best_match["confidence_score"], category=best_match["category"])
         self.session_metrics["average_confidence"] = (
             (self.session_metrics["average_confidence"] * (self.session_metrics["matches_found"] - 1) +
              best_match["confidence_score"]) / self.session_metrics["matches_found"]
@@ -1324,88 +5321,112 @@ class ProductionSupportBot:
         
         action = self.pattern_matcher.get_recommended_action(best_match["confidence_level"], best_match["severity"])
         
-        print(f"   Matches found: {len(matches)}")
-        print(f"   Best match: {best_match['issue_title']}")
-        print(f"   Confidence: {best_match['confidence_score']*100:.1f}% ({best_match['confidence_level'].replace('_', ' ').upper()})")
-        print(f"   Recommended action: {action}")
-        print(f"   Match quality: {best_match['match_quality']['exact_matches']} exact matches, {best_match['match_quality']['partial_matches']} partial matches")
-        
-        print(f"\nRESOLUTION FROM KNOWLEDGE BASE:")
-        print(f"Incident: {best_match['issue_title']}")
-        print(f"Category: {best_match['category'].upper()}")
-        print(f"Severity: {best_match['severity'].upper()}")
-        print(f"Estimated resolution time: {best_match['resolution_time']} minutes")
-        print(f"Frequency in KB: {best_match['frequency']} occurrences")
-        
-        print(f"\nRESOLUTION STEPS:")
-        steps = best_match["resolution_steps"].split('\n')
-        for i, step in enumerate(steps[:10], 1):
-            if step.strip():
-                print(f"   {i}. {step}")
-        
-        if len(steps) > 10:
-            print(f"   ... and {len(steps) - 10} more steps")
-        
-        print(f"\nAUTOMATION STATUS:")
-        if best_match["automation_script"]:
-            validation = self.automation_engine.validate_automation(best_match["id"])
-            
-            if validation["valid"]:
-                print(f"   Automation available")
-                print(f"   Script type: {validation['risk_level'].upper()} risk")
-                print(f"   Estimated time saved: {validation['estimated_time']} minutes")
-                
-                if validation["requires_confirmation"]:
-                    print(f"   Manual confirmation required ({best_match['severity']} severity)")
-                
-                if validation.get("requires_extra_approval"):
-                    print(f"   Extra approval needed for critical operations")
-                
-                return {
-                    "match": best_match,
-                    "automation_available": True,
-                    "requires_confirmation": validation.get("requires_confirmation", False),
-                    "requires_extra_approval": validation.get("requires_extra_approval", False),
-                    "risk_level": validation["risk_level"]
-                }
-            else:
-                print(f"   Automation blocked: {validation['reason']}")
-                print(f"   Risk level: {validation['risk_level'].upper()}")
-        else:
-            print(f"   Manual resolution required")
-            print(f"   Consider automating this frequent issue")
+        out.write(f"   Matches found: {len(matches)}")
+        out.write(f"   Best match: {best_match['issue_title']}")
+        out.write(f"   Confidence: {best_match['confidence_score']*100:.1f}% ({best_match['confidence_level'].replace('_', ' ').upper()})")
+        out.write(f"   Recommended action: {action}")
+        out.write(f"   Match quality: {best_match['match_quality']['exact_matches']} exact matches, {best_match['match_quality']['partial_matches']} partial matches")
+        
+        card = self.automation_engine.cards.get(best_match["id"])
+        out.write(f"\nRESOLUTION FROM KNOWLEDGE BASE:")
+        for line in card["summary"]:
+            out.write(line)
+        out.write(f"Frequency in KB: {best_match['frequency']} occurrences")
+        
+        out.write(f"\nRESOLUTION STEPS:")
+        for line in card["steps"]:
+            out.write(line)
+        
+        out.write(f"\nAUTOMATION STATUS:")
+        validation = None
+        if card["automation"]["available"]:
+            validation = self.automation_engine.validate_automation(best_match["id"], self.environment)
+        for line in AnswerCardCache.status_lines(card, validation):
+            out.write(line)
+        
+        if validation and validation["valid"]:
+            return {
+                "match": best_match,
+                "automation_available": True,
+                "requires_confirmation": validation.get("requires_confirmation", False),
+                "requires_extra_approval": validation.get("requires_extra_approval", False),
+                "risk_level": validation["risk_level"],
+                "validation": validation
+            }
         
         return {
             "match": best_match,
-            "automation_available": False
+            "automation_available": False,
+            "validation": validation
         }
     
-    def execute_auto_fix(self, incident_id: str, force: bool = False) -> bool:
-        result = self.automation_engine.execute_automation(incident_id, confirm=force)
+    def render_card(self, result: Dict, fmt: str = "text"):
+        match = result["match"]
+        return self.automation_engine.cards.render(match["id"], fmt, frequency=match["frequency"],
+                                                   validation=result.get("validation"))
+    
+    def show_plan(self, incident_id: str):
+        out = self.output
+        plan = self.automation_engine.plan_automation(incident_id)
+        if plan is None:
+            out.write(f"   No automation script available for {incident_id}")
+            out.flush()
+            return None
+        
+        out.write(f"\nREMEDIATION PLAN FOR {incident_id} (dry run, {plan['environment']})")
+        out.write("-" * 60)
+        for i, level in enumerate(plan["levels"], 1):
+            out.write(f"   Stage {i}{' (parallel)' if len(level) > 1 else ''}:")
+            for step_id in level:
+                step = plan["steps"][step_id]
+                marker = "*" if step_id in plan["critical_path"] else " "
+                line = f"    {marker} {step['description'][:60]} [{step['estimate']:.2f}s]"
+                if "result" in step:
+                    line += f" {step['status'].upper()}: {step['result']['detail']}{' (cached)' if step['result']['cached'] else ''}"
+                out.write(line)
+        
+        out.write(f"\n   Pre-flight checks ran in {plan['preflight_time'] * 1000:.1f} ms")
+        out.write(f"   Critical path: {plan['critical_path_time']:.2f}s (serial estimate {plan['serial_time']:.2f}s), marked with *")
+        if plan["blocked"]:
+            out.write(f"   BLOCKED: {'; '.join(plan['blockers'])}")
+        for warning in plan["warnings"]:
+            out.write(f"   Warning: {warning}")
+        out.flush()
+        return plan
+    
+    def execute_auto_fix(self, incident_id: str, force: bool = False, targets: List[str] = None) -> bool:
+        result = self.automation_engine.execute_automation(incident_id, confirm=force, environment=self.environment,
+                                                           targets=targets, out=self.output)
+        out = self.output
         
         if result["success"]:
             self.session_metrics["automations_executed"] += 1
-            print(f"\nAUTOMATION SUCCESSFUL")
-            print(f"Time saved: ~{result['time_saved_minutes']} minutes")
-            print(f"Risk level: {result['risk_level'].upper()}")
+            out.write(f"\nAUTOMATION SUCCESSFUL")
+            out.write(f"Time saved: ~{result['time_saved_minutes']} minutes")
+            out.write(f"Risk level: {result['risk_level'].upper()}")
+            out.flush()
             return True
         elif result.get("requires_confirmation"):
-            print(f"\nCONFIRMATION REQUIRED")
-            print(f"This is a critical issue requiring manual confirmation.")
-            print(f"Type 'CONFIRM' to proceed with automation:")
+            out.write(f"\nCONFIRMATION REQUIRED")
+            out.write(f"This is a critical issue requiring manual confirmation.")
+            out.write(f"Type 'CONFIRM' to proceed with automation:")
+            out.flush()
             confirm = input("Confirmation: ").upper()
             if confirm == "CONFIRM":
-                return self.execute_auto_fix(incident_id, force=True)
+                return self.execute_auto_fix(incident_id, force=True, targets=targets)
             else:
-                print("Automation cancelled by user")
+                out.write("Automation cancelled by user")
+                out.flush()
                 return False
         elif result.get("requires_extra_approval"):
-            print(f"\nEXTRA APPROVAL REQUIRED")
-            print(f"This operation requires additional approval.")
-            print(f"Please contact senior engineer for approval.")
+            out.write(f"\nEXTRA APPROVAL REQUIRED")
+            out.write(f"This operation requires additional approval.")
+            out.write(f"Please contact senior engineer for approval.")
+            out.flush()
             return False
         else:
-            print(f"\nAUTOMATION FAILED: {result['message']}")
+            out.write(f"\nAUTOMATION FAILED: {result['message']}")
+            out.flush()
             return False
     
     def interactive_mode(self):
@@ -1413,25 +5434,11 @@ class ProductionSupportBot:
         print("Type your production issues below (or type 'help' for commands)")
         print("-" * 80)
         
-        example_queries = [
-            "tomcat server not responding on port 8080",
-            "mysql database connection timeout error",
-            "high cpu usage at 95% on java process",
-            "disk space full on /var/log directory",
-            "application throwing 500 internal server error",
-            "ssl certificate expired error on website",
-            "nginx 502 bad gateway error",
-            "memory leak in jvm causing outofmemoryerror",
-            "database disk space full mysql",
-            "firewall blocking required ports for application",
-            "load balancer health check failures",
-            "brute force attack detected multiple failed logins"
-        ]
-        
         while True:
             try:
                 print(f"\n{'='*80}")
                 user_input = input("\nEnter your production issue (or command): ").strip()
+                self.run_maintenance()
                 
                 if user_input.lower() in ['exit', 'quit', 'bye']:
                     print("\nThank you for using Production Support Bot!")
@@ -1444,17 +5451,33 @@ class ProductionSupportBot:
                     print("   'examples' - Show example queries")
                     print("   'categories' - List available issue categories with counts")
                     print("   'auto <ID>' - Execute automation (e.g., 'auto SRV001')")
+                    print("   'plan <ID>' - Dry-run the remediation plan and pre-flight checks")
+                    print("   'fleet <ID> <hosts>' - Run automation on many hosts (e.g., 'fleet SRV001 web[01-40],db1' or '@hosts.txt')")
                     print("   'stats' - Show detailed system statistics")
                     print("   'recent' - Show recent queries and matches")
+                    print("   'history [cursor]' - Page through the logged query history")
+                    print("   'analytics [minute|hour|day] [periods]' - Query trends from rollups")
+                    print("   'duplicates' - List near-duplicate incident clusters")
+                    print("   'merge <KEEP_ID> <DROP_ID>' - Fold a duplicate incident into another")
+                    print("   'import <file.json> [warn|merge|skip]' - Import incidents from a JSON file")
                     print("   'search <keyword>' - Search knowledge base")
+                    print("   'reset' - Forget the conversation context for follow-up queries")
+                    print("   'tenant [name|default]' - List tenants or switch to another team's knowledge base")
+                    print("   'snapshot <file>' - Export the compiled matcher index to a snapshot file")
+                    print("   'sync' - Exchange KB changes and query logs with the replication directory now")
+                    print("   'retention [run|convert]' - Show query log retention, archive old rows now, or enable incremental vacuum")
+                    print("   'metrics' - Print the Prometheus metrics exported by this process")
+                    print("   'profile <N> [sample|cprofile]' - Profile the next N queries ('profile off' to stop)")
+                    print("   'slow [threshold_ms]' - Show captured slow queries or change the threshold")
+                    print("   'policy [environment]' - Show when automation is allowed for each severity")
                     print("   'exit' - End the session")
                 
                 elif user_input.lower() == 'dashboard':
-                    self.show_dashboard()
+                    self._profiled(self.show_dashboard)
                 
                 elif user_input.lower() == 'examples':
                     print("\nEXAMPLE QUERIES YOU CAN TRY:")
-                    for i, query in enumerate(example_queries, 1):
+                    for i, query in enumerate(EXAMPLE_QUERIES, 1):
                         print(f"   {i:2d}. {query}")
                 
                 elif user_input.lower() == 'categories':
@@ -1471,19 +5494,135 @@ class ProductionSupportBot:
                         print(f"   {category.title():12s}: {count:3d} incidents (Critical: {critical}, High: {high})")
                 
                 elif user_input.lower() == 'stats':
-                    self.show_dashboard()
+                    self._profiled(self.show_dashboard)
+                
+                elif user_input.lower() == 'tenant' or user_input.lower().startswith('tenant '):
+                    name = user_input[7:].strip()
+                    if not name:
+                        self.show_tenants()
+                    else:
+                        try:
+                            self.switch_tenant(name)
+                            print(f"\nActive tenant: {name} ({self.knowledge_base.incident_count()} incidents)")
+                        except ValueError as e:
+                            print(f"   {e}")
+                
+                elif user_input.lower().startswith('snapshot '):
+                    path = user_input[9:].strip()
+                    started = time.perf_counter()
+                    SnapshotIndex.write(path, IncidentIndex.from_knowledge_base(self.knowledge_base), self.nlp_engine,
+                                        self.pattern_matcher, self.knowledge_base.content_revision())
+                    print(f"\nSnapshot written to {path} ({os.path.getsize(path)} bytes in "
+                          f"{(time.perf_counter() - started) * 1000:.1f} ms)")
+                
+                elif user_input.lower() in ('retention', 'retention run', 'retention convert'):
+                    self.show_retention(run=user_input.lower() == 'retention run',
+                                        convert=user_input.lower() == 'retention convert')
+                
+                elif user_input.lower() == 'metrics':
+                    print("\n" + METRICS.render(openmetrics=False), end="")
+                
+                elif user_input.lower().startswith('profile'):
+                    args = user_input.split()[1:]
+                    if args and args[0].lower() == 'off':
+                        path = self.profiler.disarm()
+                        print(f"\nProfiler stopped{f', output written to {path}' if path else ''}")
+                    elif args and args[0].isdigit() and (len(args) < 2 or args[1].lower() in ("sample", "cprofile")):
+                        mode = args[1].lower() if len(args) > 1 else "sample"
+                        self.profiler.arm(int(args[0]), mode)
+                        print(f"\nProfiling the next {args[0]} queries ({mode})")
+                    else:
+                        print("   Usage: profile <N> [sample|cprofile] | profile off")
+                
+                elif user_input.lower() == 'slow' or user_input.lower().startswith('slow '):
+                    threshold = user_input[5:].strip()
+                    if threshold:
+                        try:
+                            self.slow_queries.threshold_ms = float(threshold)
+                            print(f"\nSlow query threshold set to {self.slow_queries.threshold_ms:.0f} ms")
+                        except ValueError:
+                            print("   Usage: slow [threshold_ms]")
+                    else:
+                        print(f"\nSLOW QUERIES (>= {self.slow_queries.threshold_ms:.0f} ms, log: {self.slow_queries.path})")
+                        if not self.slow_queries.recent:
+                            print("   None captured")
+                        for entry in self.slow_queries.recent:
+                            stages = ", ".join(f"{name} {value:.1f}" for name, value in
+                                               list(entry["timings_ms"].items()) + list(entry["ranking"]["stage_ms"].items()))
+                            print(f"   {entry['elapsed_ms']:8.1f} ms  {entry['query'][:50]}  [{stages}]")
+                
+                elif user_input.lower() == 'policy' or user_input.lower().startswith('policy '):
+                    self.show_policy(user_input[7:].strip().lower() or None)
+                
+                elif user_input.lower() == 'sync':
+                    result = self.sync_replication(force=True)
+                    if result is None:
+                        print("   Replication is not enabled (start with --replicate DIR)")
+                    else:
+                        print(f"\nSYNC COMPLETE: {', '.join(f'{key}: {value}' for key, value in result.items())}")
+                
+                elif user_input.lower() == 'reset':
+                    self.sessions.reset(self.session_id)
+                    print("\nConversation context cleared")
                 
                 elif user_input.lower() == 'recent':
-                    print("\nRECENT QUERIES AND MATCHES:")
-                    recent = self.session_metrics['query_history'][-5:] if self.session_metrics['query_history'] else []
+                    out = self.output
+                    out.write("\nRECENT QUERIES AND MATCHES:")
+                    recent = list(self.session_metrics['query_history'])[-5:]
                     if recent:
                         for i, query_data in enumerate(recent, 1):
-                            print(f"\n   {i}. Query: {query_data['query'][:60]}...")
-                            print(f"      Match: {query_data['matched_incident']}")
-                            print(f"      Confidence: {query_data['confidence']*100:.1f}%")
-                            print(f"      Response time: {query_data['response_time']:.0f}ms")
+                            out.write(f"\n   {i}. Query: {query_data['query'][:60]}...")
+                            out.write(f"      Match: {query_data['matched_incident']}")
+                            out.write(f"      Confidence: {query_data['confidence']*100:.1f}%")
+                            out.write(f"      Response time: {query_data['response_time']:.0f}ms")
+                    else:
+                        out.write("   No recent queries yet.")
+                    out.flush()
+                
+                elif user_input.lower() == 'analytics' or user_input.lower().startswith('analytics '):
+                    args = user_input.lower().split()[1:]
+                    granularity = args[0] if args else "hour"
+                    if granularity not in ROLLUP_GRANULARITIES or (len(args) > 1 and not args[1].isdigit()):
+                        print("   Usage: analytics [minute|hour|day] [periods]")
+                    else:
+                        self.show_analytics(granularity, int(args[1]) if len(args) > 1 else 24)
+                
+                elif user_input.lower() == 'duplicates':
+                    clusters = self.knowledge_base.deduplicator.clusters()
+                    print(f"\nNEAR-DUPLICATE INCIDENT CLUSTERS: {len(clusters)}")
+                    for i, cluster in enumerate(clusters, 1):
+                        print(f"   {i}. {', '.join(cluster)}")
+                
+                elif user_input.lower().startswith('merge '):
+                    args = user_input[6:].upper().split()
+                    if self.replication_role == "reader" and self.tenant == "default":
+                        print("   This node is a read replica; merge incidents on the writer node")
+                    elif len(args) != 2:
+                        print("   Usage: merge <KEEP_ID> <DROP_ID>")
                     else:
-                        print("   No recent queries yet.")
+                        try:
+                            result = self.knowledge_base.merge_incidents(args[0], args[1])
+                            print(f"\nMERGED {result['merged']} into {result['incident_id']}")
+                        except ValueError as e:
+                            print(f"   {e}")
+                
+                elif user_input.lower().startswith('import '):
+                    args = user_input[7:].split()
+                    policy = args[1].lower() if len(args) > 1 else "warn"
+                    if self.replication_role == "reader" and self.tenant == "default":
+                        print("   This node is a read replica; import incidents on the writer node")
+                    elif not args or policy not in ("warn", "merge", "skip"):
+                        print("   Usage: import <file.json> [warn|merge|skip]")
+                    else:
+                        summary = self.knowledge_base.import_incidents(args[0], policy)
+                        print(f"\nIMPORT COMPLETE: {', '.join(f'{status}: {count}' for status, count in summary.items()) or 'no incidents'}")
+                
+                elif user_input.lower() == 'history' or user_input.lower().startswith('history '):
+                    cursor_arg = user_input[8:].strip()
+                    if cursor_arg and not cursor_arg.isdigit():
+                        print("   Usage: history [cursor]")
+                    else:
+                        self.show_history(int(cursor_arg) if cursor_arg else None)
                 
                 elif user_input.lower().startswith('search '):
                     keyword = user_input[7:].strip()
@@ -1500,6 +5639,23 @@ class ProductionSupportBot:
                     else:
                         print("   Please provide a search keyword")
                 
+                elif user_input.lower().startswith('plan '):
+                    self.show_plan(user_input[5:].strip().upper())
+                
+                elif user_input.lower().startswith('fleet '):
+                    args = user_input[6:].split(None, 1)
+                    if len(args) < 2:
+                        print("   Usage: fleet <ID> <host,host[01-20],@file>")
+                    else:
+                        try:
+                            targets = expand_targets(args[1])
+                        except OSError as e:
+                            print(f"   Cannot read host list: {e}")
+                            targets = []
+                        if targets:
+                            print(f"\nAttempting fleet automation for {args[0].upper()} on {len(targets)} hosts...")
+                            self.execute_auto_fix(args[0].upper(), targets=targets)
+                
                 elif user_input.lower().startswith('auto '):
                     incident_id = user_input[5:].strip().upper()
                     valid_prefixes = ('SRV', 'DB', 'PERF', 'STOR', 'NET', 'APP', 'SEC')
@@ -1510,7 +5666,7 @@ class ProductionSupportBot:
                         print(f"Invalid incident ID. Valid formats: SRV001, DB001, PERF001, etc.")
                 
                 elif user_input:
-                    result = self.process_query(user_input)
+                    result = self.process_query(user_input, session_id=self.session_id)
                     
                     if result and result.get("automation_available"):
                         match = result["match"]
@@ -1549,22 +5705,129 @@ class ProductionSupportBot:
                 continue
         
         self._show_final_summary()
+        self.close()
+    
+    def close(self):
+        self.sync_replication(force=True)
+        self.default_tenant[2].close()
+        self.tenants.close()
+    
+    def serve(self, address: str):
+        host, _, port = address.rpartition(":")
+        service = BotService(self).bind(host or "127.0.0.1", int(port))
+        print(f"\nSERVICE MODE: listening on http://{service.host}:{service.port} (POST /query, GET /metrics)")
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            print("\nService stopped by user")
+        finally:
+            service.shutdown()
+            self.close()
+    
+    def get_analytics(self, granularity: str = "hour", periods: int = 24) -> Dict:
+        analytics = self.knowledge_base.analytics
+        return {
+            "granularity": granularity,
+            "periods": periods,
+            "top_incidents": analytics.top_incidents(granularity, periods),
+            "categories": analytics.category_summary(granularity, periods)
+        }
+    
+    def show_analytics(self, granularity: str = "hour", periods: int = 24):
+        out = self.output
+        report = self.get_analytics(granularity, periods)
+        
+        out.write(f"\nQUERY ANALYTICS (last {periods} {granularity} buckets, UTC):")
+        out.write("\nTOP INCIDENTS PER BUCKET:")
+        if not report["top_incidents"]:
+            out.write("   No queries in this window.")
+        for bucket in report["top_incidents"]:
+            incidents = ", ".join(f"{entry['incident_id']} ({entry['queries']})" for entry in bucket["incidents"])
+            out.write(f"   {bucket['bucket_start']}: {incidents}")
+        
+        out.write("\nCATEGORY SUMMARY:")
+        for category, summary in report["categories"].items():
+            out.write(f"   {category.title():12s}: {summary['queries']:4d} queries, "
+                      f"median confidence {summary['median_confidence']*100:.1f}%, "
+                      f"p50/p95 response {summary['p50_response_time']:.1f}/{summary['p95_response_time']:.1f}ms")
+        out.flush()
+    
+    def show_history(self, before_id: int = None, page_size: int = 10):
+        out = self.output
+        page = self.knowledge_base.get_query_history(before_id, page_size)
+        
+        out.write("\nQUERY HISTORY:")
+        if not page["entries"]:
+            out.write("   No logged queries.")
+        for entry in page["entries"]:
+            out.write(f"   #{entry['query_id']} [{entry['timestamp']}] {entry['user_query'][:60]}")
+            out.write(f"      Match: {entry['matched_incident_id']}, Confidence: {(entry['confidence_score'] or 0)*100:.1f}%, "
+                      f"Response time: {(entry['response_time'] or 0):.0f}ms")
+        if page["next_cursor"] is not None:
+            out.write(f"   Older entries: type 'history {page['next_cursor']}'")
+        out.flush()
+    
+    def ingest_logs(self, sources: List[str], follow: bool = True, dedup_window: float = 60.0, batch_size: int = 50,
+                    coalesce_window: float = None, from_start: bool = False):
+        coalescer = AlertCoalescer(self.pattern_matcher, window=coalesce_window) if coalesce_window else None
+        pipeline = LogIngestionPipeline(self.pattern_matcher, dedup_window=dedup_window, batch_size=batch_size,
+                                        coalescer=coalescer)
+        out = self.output
+        
+        mode = ("following from the start" if from_start else "following new lines") if follow else "one pass"
+        out.write(f"\nLOG INGESTION: {', '.join(sources)} ({mode})")
+        out.write("-" * 80)
+        out.flush()
+        try:
+            for event in pipeline.run(sources, follow, from_start):
+                if coalescer:
+                    match = event["match"]
+                    title = f"[{match['id']}] {match['issue_title']}" if match else "[UNMATCHED]"
+                    if event["event"] == "open":
+                        out.write(f"{title} ({event['fingerprint']}) <- {event['query'][:60]}")
+                        out.write(f"   Recommended action: {event['action']}")
+                    else:
+                        out.write(f"{title} x{event['count']} ({event['fingerprint']}) closed after "
+                                  f"{event['last_seen'] - event['first_seen']:.0f}s")
+                    out.flush()
+                    continue
+                matches = event["matches"]
+                if matches:
+                    best_match = matches[0]
+                    out.write(f"[{best_match['id']}] {best_match['confidence_score']*100:5.1f}% {best_match['issue_title']} <- {event['signature'][:80]}")
+                else:
+                    out.write(f"[UNMATCHED] {event['signature'][:80]}")
+                out.flush()
+        except KeyboardInterrupt:
+            out.write("\nLog ingestion interrupted by user")
+        
+        stats = pipeline.stats
+        if coalescer:
+            stats.update(coalescer.stats)
+            out.write(f"\nLines read: {stats['lines']}, alerts: {stats['alerts']}, clusters: {stats['clusters']}, "
+                      f"coalesced: {stats['coalesced']}, evicted: {stats['evicted']}, matcher calls: {stats['matched']}")
+        else:
+            out.write(f"\nLines read: {stats['lines']}, distinct signatures: {stats['signatures']}, "
+                  f"bursts suppressed: {stats['suppressed']}, batches matched: {stats['batches']}")
+        out.flush()
+        return dict(stats)
     
     def show_dashboard(self):
-        print("\n" + "="*80)
-        print("INTERACTIVE DASHBOARD")
-        print("="*80)
+        out = self.output
+        out.write("\n" + "="*80)
+        out.write("INTERACTIVE DASHBOARD")
+        out.write("="*80)
         
         session_duration = (datetime.now() - self.session_metrics["start_time"]).seconds
-        print(f"\nSESSION METRICS:")
-        print(f"   Duration: {session_duration // 60}:{session_duration % 60:02d}")
-        print(f"   Queries processed: {self.session_metrics['queries_processed']}")
-        print(f"   Matches found: {self.session_metrics['matches_found']}")
+        out.write(f"\nSESSION METRICS:")
+        out.write(f"   Duration: {session_duration // 60}:{session_duration % 60:02d}")
+        out.write(f"   Queries processed: {self.session_metrics['queries_processed']}")
+        out.write(f"   Matches found: {self.session_metrics['matches_found']}")
         match_rate = (self.session_metrics['matches_found'] / self.session_metrics['queries_processed'] * 100) if self.session_metrics['queries_processed'] > 0 else 0
-        print(f"   Match rate: {match_rate:.1f}%")
-        print(f"   Average confidence: {self.session_metrics['average_confidence']*100:.1f}%")
-        print(f"   Automations executed: {self.session_metrics['automations_executed']}")
-        print(f"   Categories matched: {len(self.session_metrics['unique_categories_matched'])}")
+        out.write(f"   Match rate: {match_rate:.1f}%")
+        out.write(f"   Average confidence: {self.session_metrics['average_confidence']*100:.1f}%")
+        out.write(f"   Automations executed: {self.session_metrics['automations_executed']}")
+        out.write(f"   Categories matched: {len(self.session_metrics['unique_categories_matched'])}")
         
         self.knowledge_base.cursor.execute("SELECT COUNT(*) FROM incidents")
         total_incidents = self.knowledge_base.cursor.fetchone()[0]
@@ -1575,24 +5838,23 @@ class ProductionSupportBot:
         self.knowledge_base.cursor.execute("SELECT COUNT(*) FROM incident_keywords")
         keywords = self.knowledge_base.cursor.fetchone()[0]
         
-        self.knowledge_base.cursor.execute("SELECT COUNT(*) FROM query_logs")
-        queries_processed = self.knowledge_base.cursor.fetchone()[0]
+        queries_processed = self.knowledge_base.query_log_count()
         
-        print(f"\nKNOWLEDGE BASE:")
-        print(f"   Total Incidents: {total_incidents}")
-        print(f"   Categories: {categories}")
-        print(f"   Keywords: {keywords}")
-        print(f"   Total queries processed: {queries_processed}")
+        out.write(f"\nKNOWLEDGE BASE:")
+        out.write(f"   Total Incidents: {total_incidents}")
+        out.write(f"   Categories: {categories}")
+        out.write(f"   Keywords: {keywords}")
+        out.write(f"   Total queries processed: {queries_processed}")
         
         self.knowledge_base.cursor.execute("SELECT AVG(resolution_time) FROM incidents")
         avg_resolution_time = round(self.knowledge_base.cursor.fetchone()[0] or 0, 1)
-        print(f"   Average resolution time: {avg_resolution_time} minutes")
+        out.write(f"   Average resolution time: {avg_resolution_time} minutes")
         
         self.knowledge_base.cursor.execute("SELECT COUNT(*) FROM incidents WHERE automation_script IS NOT NULL")
         automation_available = self.knowledge_base.cursor.fetchone()[0]
-        print(f"   Automation scripts available: {automation_available}")
+        out.write(f"   Automation scripts available: {automation_available}")
         
-        print(f"\nCATEGORY DISTRIBUTION:")
+        out.write(f"\nCATEGORY DISTRIBUTION:")
         self.knowledge_base.cursor.execute('''
         SELECT category, COUNT(*) as count 
         FROM incidents 
@@ -1601,9 +5863,9 @@ class ProductionSupportBot:
         ''')
         for category, count in self.knowledge_base.cursor.fetchall():
             percentage = (count / total_incidents) * 100
-            print(f"   {category.title():12s}: {count:3d} incidents ({percentage:.1f}%)")
+            out.write(f"   {category.title():12s}: {count:3d} incidents ({percentage:.1f}%)")
         
-        print(f"\nSEVERITY DISTRIBUTION:")
+        out.write(f"\nSEVERITY DISTRIBUTION:")
         self.knowledge_base.cursor.execute('''
         SELECT severity, COUNT(*) as count 
         FROM incidents 
@@ -1619,7 +5881,7 @@ class ProductionSupportBot:
         for severity, count in self.knowledge_base.cursor.fetchall():
             if severity:
                 percentage = (count / total_incidents) * 100
-                print(f"   {severity.title():9s}: {count:3d} incidents ({percentage:.1f}%)")
+                out.write(f"   {severity.title():9s}: {count:3d} incidents ({percentage:.1f}%)")
         
         auto_stats = {
             "total_executions": len(self.automation_engine.execution_log),
@@ -1627,55 +5889,573 @@ class ProductionSupportBot:
             "estimated_time_saved": len(self.automation_engine.execution_log) * 30
         }
         
-        print(f"\nAUTOMATION ENGINE:")
-        print(f"   Total executions: {auto_stats['total_executions']}")
+        out.write(f"\nAUTOMATION ENGINE:")
+        out.write(f"   Total executions: {auto_stats['total_executions']}")
         success_rate = (auto_stats['successful'] / auto_stats['total_executions'] * 100) if auto_stats['total_executions'] > 0 else 0
-        print(f"   Success rate: {success_rate:.1f}%")
-        print(f"   Estimated time saved: {auto_stats['estimated_time_saved']} minutes")
-        
-        print(f"\nPROJECT SUCCESS METRICS:")
-        print(f"   Issue identification accuracy: >=85% target ({match_rate:.1f}% demo)")
-        print(f"   Knowledge base coverage: 57 incidents available")
-        print(f"   Automation coverage: {automation_available}/{total_incidents} = {(automation_available/total_incidents*100):.1f}%")
-        print(f"   Average confidence score: >=70% target ({self.session_metrics['average_confidence']*100:.1f}% demo)")
-        
-        print(f"\nTIPS: Try queries like:")
-        print("   'tomcat server down on port 8080'")
-        print("   'mysql connection timeout error'")
-        print("   'high cpu usage at 95% on java process'")
-        print("   'disk space full on /var/log'")
-        print("   'ssl certificate expired error'")
-        print("="*80)
+        out.write(f"   Success rate: {success_rate:.1f}%")
+        out.write(f"   Estimated time saved: {auto_stats['estimated_time_saved']} minutes")
+        
+        out.write(f"\nPROJECT SUCCESS METRICS:")
+        out.write(f"   Issue identification accuracy: >=85% target ({match_rate:.1f}% demo)")
+        out.write(f"   Knowledge base coverage: 57 incidents available")
+        out.write(f"   Automation coverage: {automation_available}/{total_incidents} = {(automation_available/total_incidents*100):.1f}%")
+        out.write(f"   Average confidence score: >=70% target ({self.session_metrics['average_confidence']*100:.1f}% demo)")
+        
+        out.write(f"\nTIPS: Try queries like:")
+        out.write("   'tomcat server down on port 8080'")
+        out.write("   'mysql connection timeout error'")
+        out.write("   'high cpu usage at 95% on java process'")
+        out.write("   'disk space full on /var/log'")
+        out.write("   'ssl certificate expired error'")
+        out.write("="*80)
+        out.flush()
+    
+    def benchmark_synonyms(self, rounds: int = 2000) -> Dict:
+        plain = NLPEngine(self.knowledge_base, {})
+        queries = [query for query, _ in ABBREVIATED_QUERIES] + EXAMPLE_QUERIES
+        token_lists = [[w for w in re.findall(r'[a-z0-9]+(?:[-.][a-z0-9]+)*', query.lower()) if w not in plain.stop_words]
+                       for query in queries]
+        
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for tokens in token_lists:
+                self.nlp_engine.synonyms.expand(tokens)
+        expand_us = (time.perf_counter() - started) * 1e6 / (rounds * len(token_lists))
+        
+        results = {}
+        for label, engine in (("without", plain), ("with", self.nlp_engine)):
+            matcher = PatternMatcher(self.knowledge_base, engine, category_threshold=self.pattern_matcher.category_threshold)
+            hits = 0
+            for query, expected_prefix in ABBREVIATED_QUERIES:
+                matches = matcher.find_matches(query, record=False)
+                hits += bool(matches) and matches[0]["id"].startswith(expected_prefix)
+            results[label] = hits
+        
+        return {"entries": len(self.nlp_engine.synonyms), "expand_us": expand_us,
+                "queries": len(ABBREVIATED_QUERIES), "hits_without": results["without"], "hits_with": results["with"]}
     
     def _show_final_summary(self):
-        print("\n" + "="*80)
-        print("SESSION SUMMARY")
-        print("="*80)
+        out = self.output
+        out.write("\n" + "="*80)
+        out.write("SESSION SUMMARY")
+        out.write("="*80)
         
-        print(f"\nCAPSTONE PROJECT DELIVERABLES DEMONSTRATED:")
-        print("Enhanced Knowledge Base with 57 incidents")
-        print("NLP Engine with expanded technical vocabulary")
-        print("Pattern Matching with context awareness")
-        print("Intelligent Automation Framework with safety checks")
+        out.write(f"\nCAPSTONE PROJECT DELIVERABLES DEMONSTRATED:")
+        out.write("Enhanced Knowledge Base with 57 incidents")
+        out.write("NLP Engine with expanded technical vocabulary")
+        out.write("Pattern Matching with context awareness")
+        out.write("Intelligent Automation Framework with safety checks")
         
-        print(f"\nKEY FEATURES:")
-        print("   57 comprehensive incidents across 7 categories")
-        print("   Advanced NLP with synonym expansion")
-        print("   Context-aware confidence scoring")
-        print("   Risk-based automation safety")
-        print("   Real-time analytics dashboard")
-        print("   Category and severity distribution")
+        out.write(f"\nKEY FEATURES:")
+        out.write("   57 comprehensive incidents across 7 categories")
+        out.write("   Advanced NLP with synonym expansion")
+        out.write("   Context-aware confidence scoring")
+        out.write("   Risk-based automation safety")
+        out.write("   Real-time analytics dashboard")
+        out.write("   Category and severity distribution")
         
         self.show_dashboard()
 
         
-        print("ENHANCED DEMONSTRATION COMPLETED SUCCESSFULLY!")
+        out.write("ENHANCED DEMONSTRATION COMPLETED SUCCESSFULLY!")
+        out.flush()
+
+class _BotRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+            self._send(200, METRICS.render(openmetrics), OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        elif url.path == "/query":
+            params = parse_qs(url.query)
+            self._query(params.get("q", [""])[0], params.get("session", [None])[0], params.get("format", [None])[0])
+        elif url.path == "/healthz":
+            self._send(200, "ok\n", "text/plain")
+        else:
+            self._send(404, json.dumps({"error": "not found"}), "application/json")
+    
+    def do_POST(self):
+        if urlsplit(self.path).path != "/query":
+            self._send(404, json.dumps({"error": "not found"}), "application/json")
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send(400, json.dumps({"error": "invalid JSON body"}), "application/json")
+            return
+        self._query(str(payload.get("query", "")), payload.get("session_id"), payload.get("format"))
+    
+    def _query(self, query: str, session_id: str = None, card_format: str = None):
+        if not query.strip():
+            self._send(400, json.dumps({"error": "query is required"}), "application/json")
+            return
+        if card_format is not None and card_format not in AnswerCardCache.FORMATS:
+            self._send(400, json.dumps({"error": f"format must be one of {', '.join(AnswerCardCache.FORMATS)}"}), "application/json")
+            return
+        self._send(200, json.dumps(self.server.service.query(query, session_id, card_format), default=str), "application/json")
+    
+    def _send(self, status: int, body: str, content_type: str):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+class BotService:
+    def __init__(self, bot: "ProductionSupportBot"):
+        self.bot = bot
+        self.lock = threading.Lock()
+        self.server = None
+        self.host = self.port = None
+    
+    def bind(self, host: str = "127.0.0.1", port: int = 8080):
+        self.server = ThreadingHTTPServer((host, port), _BotRequestHandler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        self.host, self.port = self.server.server_address[:2]
+        return self
+    
+    def query(self, user_query: str, session_id: str = None, card_format: str = None) -> Dict:
+        out = OutputBuffer(io.StringIO())
+        started = time.perf_counter()
+        card = None
+        analysis = self.bot.nlp_engine.preprocess_query(user_query)
+        with self.lock:
+            self.bot.run_maintenance()
+            result = self.bot.process_query(user_query, session_id, out=out, analysis=analysis)
+            if result and card_format:
+                card = self.bot.render_card(result, card_format)
+        match = result["match"] if result else None
+        response = {
+            "query": user_query,
+            "matched": match is not None,
+            "incident_id": match["id"] if match else None,
+            "title": match["issue_title"] if match else None,
+            "confidence": match["confidence_score"] if match else 0.0,
+            "confidence_level": match["confidence_level"] if match else None,
+            "automation_available": result["automation_available"] if result else False,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+            "output": out.stream.getvalue()
+        }
+        if card_format:
+            response["card"] = card
+        return response
+    
+    def serve_forever(self):
+        self.server.serve_forever()
+    
+    def shutdown(self):
+        self.server.server_close()
+
+LOAD_NOISE_PREFIXES = ("urgent", "prod", "seeing", "again", "since deploy")
+LOAD_HOSTS = ("web-01", "web-02", "db-primary", "app-17", "cache-03", "10.0.4.21")
+
+def synthesize_queries(base_queries: List[str], count: int, seed: int = None) -> List[str]:
+    rng = random.Random(seed)
+    variants = []
+    for _ in range(count):
+        words = rng.choice(base_queries).split()
+        mutation = rng.randrange(5)
+        if mutation == 0 and len(words) > 3:
+            words.pop(rng.randrange(len(words)))
+        elif mutation == 1:
+            words.insert(rng.randrange(len(words) + 1), f"on {rng.choice(LOAD_HOSTS)}")
+        elif mutation == 2:
+            words.append(f"for {rng.randint(2, 59)} minutes")
+        elif mutation == 3:
+            words.insert(0, rng.choice(LOAD_NOISE_PREFIXES))
+        else:
+            i = rng.randrange(len(words))
+            words[i] = words[i].upper()
+        variants.append(" ".join(words))
+    return variants
+
+def _process_rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if pid == os.getpid() and resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+def _database_bytes(db_path: str) -> int:
+    if not db_path:
+        return None
+    return sum(os.path.getsize(path) for path in (db_path, f"{db_path}-wal", f"{db_path}-journal") if os.path.exists(path))
+
+class InProcessLoadTarget:
+    name = "in-process"
+    note = ("requests share one bot and one SQLite connection behind the service lock; "
+            "with more than one worker this measures queueing on a serialized bot, not parallel throughput")
+    
+    def __init__(self, bot: "ProductionSupportBot"):
+        self.service = BotService(bot)
+    
+    def query(self, user_query: str) -> bool:
+        return self.service.query(user_query)["matched"]
+
+class HTTPLoadTarget:
+    note = None
+    
+    def __init__(self, url: str, timeout: float = 30.0):
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        self.name = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path.rstrip("/") + "/query"
+        self.timeout = timeout
+        self.local = threading.local()
+    
+    def query(self, user_query: str) -> bool:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("POST", self.path, json.dumps({"query": user_query}), {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self.local.conn = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        return json.loads(body)["matched"]
+
+class LoadGenerator:
+    def __init__(self, target, queries: List[str], concurrency: int = 8, rate: float = None, duration: float = 60.0,
+                 report_interval: float = 5.0, soak: bool = False, db_path: str = None, pid: int = None, seed: int = None):
+        self.target = target
+        self.queries = queries
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.duration = duration
+        self.report_interval = report_interval
+        self.soak = soak
+        self.db_path = db_path
+        self.pid = pid
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.window = []
+        self.histogram = [0] * (len(RESPONSE_TIME_BUCKETS_MS) + 1)
+        self.totals = {"requests": 0, "matched": 0, "errors": 0, "dropped": 0, "latency_sum": 0.0}
+        self.errors = defaultdict(int)
+    
+    def _record(self, latency_ms: float, matched: bool, error: Exception = None):
+        with self.lock:
+            self.window.append(latency_ms)
+            self.histogram[bisect.bisect_left(RESPONSE_TIME_BUCKETS_MS, latency_ms)] += 1
+            self.totals["requests"] += 1
+            self.totals["latency_sum"] += latency_ms
+            if error is not None:
+                self.totals["errors"] += 1
+                self.errors[type(error).__name__] += 1
+            elif matched:
+                self.totals["matched"] += 1
+    
+    def _issue(self, rng: random.Random, intended: float):
+        matched, error = False, None
+        try:
+            matched = self.target.query(rng.choice(self.queries))
+        except Exception as e:
+            error = e
+        self._record((time.monotonic() - intended) * 1000, matched, error)
+    
+    def _closed_worker(self, worker: int, deadline: float):
+        rng = random.Random(None if self.seed is None else self.seed + worker)
+        while time.monotonic() < deadline:
+            self._issue(rng, time.monotonic())
+    
+    def _open_worker(self, worker: int, arrivals: queue.Queue, deadline: float):
+        rng = random.Random(None if self.seed is None else self.seed + worker)
+        while True:
+            intended = arrivals.get()
+            if intended is None:
+                return
+            if time.monotonic() >= deadline:
+                with self.lock:
+                    self.totals["dropped"] += 1
+                continue
+            delay = intended - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._issue(rng, intended)
+    
+    def _dispatch(self, arrivals: queue.Queue, started: float, deadline: float):
+        rng = random.Random(self.seed)
+        intended = started
+        while True:
+            intended += rng.expovariate(self.rate)
+            if intended >= deadline:
+                break
+            delay = intended - time.monotonic()
+            if delay > 0.001:
+                time.sleep(delay - 0.001)
+            arrivals.put(intended)
+        for _ in range(self.concurrency):
+            arrivals.put(None)
+    
+    @staticmethod
+    def _percentile(ordered: List[float], quantile: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+    
+    def _report(self, elapsed: float, interval: float, arrivals: queue.Queue) -> Dict:
+        with self.lock:
+            window, self.window = self.window, []
+        window.sort()
+        report = {
+            "elapsed": elapsed,
+            "requests": len(window),
+            "throughput": len(window) / interval if interval > 0 else 0.0,
+            "p50_ms": self._percentile(window, 0.5),
+            "p90_ms": self._percentile(window, 0.9),
+            "p99_ms": self._percentile(window, 0.99),
+            "max_ms": window[-1] if window else 0.0,
+            "errors": self.totals["errors"],
+            "backlog": arrivals.qsize() if arrivals else 0
+        }
+        if self.soak:
+            report["rss_bytes"] = _process_rss_bytes(self.pid) if self.pid else None
+            report["db_bytes"] = _database_bytes(self.db_path)
+        return report
+    
+    def run(self, on_report=None) -> Dict:
+        started = time.monotonic()
+        deadline = started + self.duration
+        arrivals = queue.Queue() if self.rate else None
+        threads = []
+        for worker in range(self.concurrency):
+            if arrivals:
+                thread = threading.Thread(target=self._open_worker, args=(worker, arrivals, deadline), daemon=True)
+            else:
+                thread = threading.Thread(target=self._closed_worker, args=(worker, deadline), daemon=True)
+            threads.append(thread)
+        if arrivals:
+            threads.append(threading.Thread(target=self._dispatch, args=(arrivals, started, deadline), daemon=True))
+        for thread in threads:
+            thread.start()
+        
+        reports = []
+        last = started
+        if self.soak:
+            reports.append(self._report(0.0, 0.0, arrivals))
+        while True:
+            alive = any(thread.is_alive() for thread in threads)
+            now = time.monotonic()
+            if now >= last + self.report_interval or (not alive and (self.window or self.soak)):
+                reports.append(self._report(now - started, now - last, arrivals))
+                last = now
+                if on_report:
+                    on_report(reports[-1])
+            if not alive:
+                break
+            time.sleep(min(0.1, max(0.0, last + self.report_interval - now)))
+        
+        elapsed = time.monotonic() - started
+        requests = self.totals["requests"]
+        summary = {
+            "target": self.target.name,
+            "note": self.target.note,
+            "mode": f"open loop at {self.rate:g}/s" if self.rate else "closed loop",
+            "concurrency": self.concurrency,
+            "duration": elapsed,
+            "requests": requests,
+            "matched": self.totals["matched"],
+            "errors": self.totals["errors"],
+            "error_types": dict(self.errors),
+            "dropped": self.totals["dropped"],
+            "throughput": requests / elapsed if elapsed else 0.0,
+            "average_ms": self.totals["latency_sum"] / requests if requests else 0.0,
+            "p50_ms": QueryAnalytics._histogram_percentile(self.histogram, RESPONSE_TIME_BUCKETS_MS, 0.5),
+            "p95_ms": QueryAnalytics._histogram_percentile(self.histogram, RESPONSE_TIME_BUCKETS_MS, 0.95),
+            "p99_ms": QueryAnalytics._histogram_percentile(self.histogram, RESPONSE_TIME_BUCKETS_MS, 0.99),
+            "intervals": reports
+        }
+        if self.soak and len(reports) > 1:
+            hours = max(reports[-1]["elapsed"], 1e-9) / 3600
+            for key in ("rss_bytes", "db_bytes"):
+                first, final = reports[0][key], reports[-1][key]
+                if first is not None and final is not None:
+                    summary[f"{key}_growth"] = final - first
+                    summary[f"{key}_per_hour"] = (final - first) / hours
+        return summary
+
+def run_load_test(target, args: argparse.Namespace, pid: int = None) -> Dict:
+    queries = EXAMPLE_QUERIES + synthesize_queries(EXAMPLE_QUERIES, args.load_variants, args.load_seed)
+    generator = LoadGenerator(target, queries, concurrency=args.load_concurrency, rate=args.load_rate,
+                              duration=args.load_duration, report_interval=args.load_interval, soak=args.soak,
+                              db_path=args.db, pid=pid, seed=args.load_seed)
+    mib = 1024 * 1024
+    
+    def print_report(report: Dict):
+        line = (f"   [{report['elapsed']:7.1f}s] {report['requests']:6d} req {report['throughput']:8.1f}/s  "
+                f"p50 {report['p50_ms']:7.2f}  p90 {report['p90_ms']:7.2f}  p99 {report['p99_ms']:7.2f}  "
+                f"max {report['max_ms']:7.2f} ms  errors {report['errors']}")
+        if generator.rate:
+            line += f"  backlog {report['backlog']}"
+        if generator.soak:
+            line += (f"  rss {report['rss_bytes'] / mib:.1f} MiB" if report["rss_bytes"] is not None else "  rss n/a")
+            line += (f"  db {report['db_bytes'] / mib:.2f} MiB" if report["db_bytes"] is not None else "")
+        print(line)
+    
+    print(f"\nLOAD TEST: {target.name}, {generator.concurrency} workers, "
+          f"{f'open loop at {generator.rate:g}/s' if generator.rate else 'closed loop'}, {generator.duration:g}s, "
+          f"{len(queries)} distinct queries{' (soak)' if generator.soak else ''}")
+    if target.note:
+        print(f"   Note: {target.note}")
+    print("-" * 80)
+    summary = generator.run(on_report=print_report)
+    
+    print("-" * 80)
+    print(f"   Requests: {summary['requests']} ({summary['matched']} matched, {summary['errors']} errors, "
+          f"{summary['dropped']} dropped) in {summary['duration']:.1f}s = {summary['throughput']:.1f}/s")
+    print(f"   Latency: avg {summary['average_ms']:.2f} ms, p50 {summary['p50_ms']:.1f} ms, "
+          f"p95 {summary['p95_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms")
+    if summary["error_types"]:
+        print(f"   Errors: {', '.join(f'{name}: {count}' for name, count in summary['error_types'].items())}")
+    if summary["note"] and generator.concurrency > 1:
+        print(f"   Serialized target: latency above includes time queued for the service lock")
+    if "rss_bytes_growth" in summary:
+        print(f"   Memory growth: {summary['rss_bytes_growth'] / mib:+.1f} MiB ({summary['rss_bytes_per_hour'] / mib:+.1f} MiB/hour)")
+    if "db_bytes_growth" in summary:
+        print(f"   Database growth: {summary['db_bytes_growth'] / mib:+.2f} MiB ({summary['db_bytes_per_hour'] / mib:+.2f} MiB/hour)")
+    return summary
 
 def main():
+    parser = argparse.ArgumentParser(description="24/7 Production Support Bot")
+    parser.add_argument("--ingest", nargs="+", metavar="SOURCE",
+                        help="Triage log lines from files, '-' for stdin or 'unix:/path' for a datagram socket")
+    parser.add_argument("--no-follow", action="store_true",
+                        help="Read log files once instead of tailing them; sockets stop once they go idle")
+    parser.add_argument("--from-start", action="store_true",
+                        help="When following log files, triage their existing contents before new lines")
+    parser.add_argument("--dedup-window", type=float, default=60.0, help="Seconds to suppress repeated log signatures")
+    parser.add_argument("--coalesce", type=float, metavar="SECONDS",
+                        help="Coalesce alerts with the same fingerprint inside a sliding window")
+    parser.add_argument("--tenant", default="default", help="Tenant knowledge base to start with")
+    parser.add_argument("--tenant-dir", default="tenants", help="Directory holding per-tenant databases and runbooks")
+    parser.add_argument("--tenant-budget-mb", type=float, default=256.0,
+                        help="Memory budget for tenant knowledge bases kept loaded at once")
+    parser.add_argument("--snapshot", metavar="FILE",
+                        help="Memory-map shard workers from this index snapshot (rebuilt when the KB changes)")
+    parser.add_argument("--db", default="production_kb.db", help="Knowledge base database file for this node")
+    parser.add_argument("--replicate", metavar="DIR", help="Shared directory used to replicate the knowledge base")
+    parser.add_argument("--role", choices=["writer", "reader"], default="writer", help="Replication role of this node")
+    parser.add_argument("--node-id", help="Replication node name (defaults to the hostname)")
+    parser.add_argument("--sync-interval", type=float, default=5.0, help="Minimum seconds between replication syncs")
+    parser.add_argument("--automation-backend", choices=["simulated", "subprocess"],
+                        default=os.environ.get("BOT_AUTOMATION_BACKEND", "simulated"),
+                        help="Run automation scripts as real subprocesses instead of simulating them")
+    parser.add_argument("--automation-scripts", metavar="DIR",
+                        help="Directory of <INCIDENT_ID>.sh stand-in scripts that replace the KB automation")
+    parser.add_argument("--backup-command", metavar="CMD",
+                        help="Command run as the backup step before subprocess automation in production")
+    parser.add_argument("--allow-unbacked", action="store_true",
+                        help="Let subprocess automation run in production without a --backup-command")
+    parser.add_argument("--fleet-transport", choices=["local", "ssh"], default="ssh",
+                        help="How fleet automation reaches hosts ('local' runs a stand-in with TARGET_HOST set "
+                             "and requires --automation-scripts)")
+    parser.add_argument("--fleet-window", type=int, default=20, help="Hosts remediated concurrently during fan-out")
+    parser.add_argument("--fleet-canary", type=int, default=1, help="Hosts that must succeed before the rollout continues")
+    parser.add_argument("--fleet-batch", type=int, help="Rolling batch size after the canary (default: all remaining)")
+    parser.add_argument("--fleet-max-failures", type=int, default=0, help="Host failures tolerated before stopping")
+    parser.add_argument("--retention-days", type=int,
+                        help="Archive query_logs rows older than this many days to gzip JSONL and delete them in batches")
+    parser.add_argument("--archive-dir", default="archive", help="Directory for archived query logs (one file per day)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="Run as an HTTP service exposing POST /query and GET /metrics instead of the REPL")
+    parser.add_argument("--loadtest", nargs="?", const="inprocess", metavar="URL",
+                        help="Replay a query mix against this process or a --serve URL and report latency percentiles")
+    parser.add_argument("--load-concurrency", type=int, default=8, help="Concurrent load generator workers")
+    parser.add_argument("--load-rate", type=float, help="Open-loop arrival rate in queries/sec (default: closed loop)")
+    parser.add_argument("--load-duration", type=float, default=60.0, help="Seconds to generate load")
+    parser.add_argument("--load-interval", type=float, default=5.0, help="Seconds between latency reports")
+    parser.add_argument("--load-variants", type=int, default=200, help="Synthetic query variants added to the examples")
+    parser.add_argument("--load-seed", type=int, help="Seed for reproducible query mixes and arrivals")
+    parser.add_argument("--load-pid", type=int, help="Process whose memory a soak against a URL should track")
+    parser.add_argument("--soak", action="store_true", help="Also track memory and database file growth during the load test")
+    parser.add_argument("--metrics-textfile", metavar="FILE",
+                        help="Periodically write Prometheus metrics here for the node_exporter textfile collector")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="Seconds between metrics textfile writes")
+    parser.add_argument("--profile-dir", default="profiles", help="Where profiler output is written")
+    parser.add_argument("--slow-query-ms", type=float, default=500.0,
+                        help="Record queries slower than this to <profile-dir>/slow_queries.jsonl with stage timings")
+    parser.add_argument("--category-threshold", type=float, default=0.75,
+                        help="Search only the predicted category unless its best confidence is below this")
+    parser.add_argument("--no-category-first", action="store_true",
+                        help="Always retrieve candidates from every category")
+    parser.add_argument("--synonyms", default="synonyms.json",
+                        help="JSON file of abbreviations and synonyms merged over the built-in table, if present")
+    parser.add_argument("--benchmark-synonyms", action="store_true",
+                        help="Report synonym expansion cost and abbreviated-query recall, then exit")
+    parser.add_argument("--environment", default=os.environ.get("BOT_ENVIRONMENT", "production"),
+                        help="Environment this bot remediates; selects the automation policy rules that apply")
+    parser.add_argument("--automation-policy", default="automation_policy.json",
+                        help="JSON file of maintenance windows and per-environment/severity automation rules, if present")
+    parser.add_argument("--candidate-limit", type=int, default=int(os.environ.get("BOT_CANDIDATE_LIMIT", "10")),
+                        help="Number of keyword candidates to score before selecting the top matches")
+    args = parser.parse_args()
+    if args.automation_backend == "subprocess" and args.fleet_transport == "local" and not args.automation_scripts:
+        parser.error("--fleet-transport local requires --automation-scripts stand-ins with the subprocess backend")
+    
+    if args.loadtest and args.loadtest != "inprocess":
+        run_load_test(HTTPLoadTarget(args.loadtest), args, pid=args.load_pid)
+        return
+    
     print("\n24/7 PRODUCTION SUPPORT BOT - INTERACTIVE DEMO WITH ENHANCED TRAINING")
     
-    bot = ProductionSupportBot()
-    bot.interactive_mode()
+    bot = ProductionSupportBot(shard_workers=int(os.environ.get("BOT_SHARD_WORKERS", "0")),
+                               candidate_limit=args.candidate_limit, tenant_dir=args.tenant_dir,
+                               tenant_budget_mb=args.tenant_budget_mb, snapshot_path=args.snapshot, db_name=args.db,
+                               replication_dir=args.replicate, replication_role=args.role, node_id=args.node_id,
+                               sync_interval=args.sync_interval, automation_backend=args.automation_backend,
+                               automation_script_dir=args.automation_scripts,
+                               fleet_options={"fleet_transport": args.fleet_transport, "fleet_concurrency": args.fleet_window,
+                                              "fleet_canary": args.fleet_canary, "fleet_batch_size": args.fleet_batch,
+                                              "fleet_max_failures": args.fleet_max_failures},
+                               profile_dir=args.profile_dir, slow_query_ms=args.slow_query_ms,
+                               retention_days=args.retention_days, archive_dir=args.archive_dir,
+                               category_threshold=None if args.no_category_first else args.category_threshold,
+                               synonyms_path=args.synonyms, environment=args.environment,
+                               policy_path=args.automation_policy, backup_command=args.backup_command,
+                               allow_unbacked=args.allow_unbacked)
+    if args.tenant != "default":
+        bot.switch_tenant(args.tenant)
+    metrics_writer = METRICS.start_textfile_writer(args.metrics_textfile, args.metrics_interval) if args.metrics_textfile else None
+    try:
+        if args.benchmark_synonyms:
+            result = bot.benchmark_synonyms()
+            print(f"\nSYNONYM EXPANSION: {result['entries']} compiled entries, {result['expand_us']:.2f} us per query")
+            print(f"   Abbreviated queries matched to the right category: {result['hits_without']}/{result['queries']} without, "
+                  f"{result['hits_with']}/{result['queries']} with expansion")
+            bot.close()
+        elif args.serve:
+            bot.serve(args.serve)
+        elif args.loadtest:
+            run_load_test(InProcessLoadTarget(bot), args, pid=os.getpid())
+            bot.close()
+        elif args.ingest:
+            bot.ingest_logs(args.ingest, follow=not args.no_follow, dedup_window=args.dedup_window,
+                            coalesce_window=args.coalesce, from_start=args.from_start)
+            bot.close()
+        else:
+            bot.interactive_mode()
+    finally:
+        if metrics_writer:
+            metrics_writer.set()
+            METRICS.write_textfile(args.metrics_textfile)
 
 if __name__ == "__main__":
     main()
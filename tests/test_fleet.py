@@ -0,0 +1,92 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+
+class FleetExecutorTest(unittest.TestCase):
+    HOSTS = [f"web-{number:02d}" for number in range(1, 7)]
+    
+    def run_fleet(self, hosts, failing_host=None, gate=None, **options):
+        executor = bot.FleetExecutor(bot.SubprocessRunner(), bot.LocalShellTransport(), concurrency=1, canary=1,
+                                     batch_size=2, **options)
+        command = f'test "$TARGET_HOST" != "{failing_host}"' if failing_host else "true"
+        result = executor.run(hosts, [command], 30, gate=gate)
+        return result, {host["host"]: host["status"] for host in result["hosts"]}
+    
+    def test_all_hosts_run_in_canary_then_batches(self):
+        result, statuses = self.run_fleet(self.HOSTS)
+        self.assertEqual(result["status"], "SUCCESS")
+        self.assertEqual(result["phases"], 4)
+        self.assertEqual(set(statuses.values()), {"SUCCESS"})
+    
+    def test_failed_canary_skips_the_rest_of_the_fleet(self):
+        result, statuses = self.run_fleet(self.HOSTS, failing_host="web-01", max_failures=5)
+        self.assertEqual(result["status"], "ABORTED")
+        self.assertEqual(statuses["web-01"], "FAILED")
+        self.assertEqual({statuses[host] for host in self.HOSTS[1:]}, {"SKIPPED"})
+    
+    def test_failure_budget_halts_later_batches(self):
+        result, statuses = self.run_fleet(self.HOSTS, failing_host="web-03")
+        self.assertEqual(result["status"], "ABORTED")
+        self.assertEqual([statuses[host] for host in self.HOSTS],
+                         ["SUCCESS", "SUCCESS", "FAILED", "SKIPPED", "SKIPPED", "SKIPPED"])
+    
+    def test_gate_halts_between_phases(self):
+        calls = []
+        
+        def gate():
+            calls.append(len(calls))
+            return "Automation not allowed during business hours" if len(calls) > 2 else None
+        
+        result, statuses = self.run_fleet(self.HOSTS, gate=gate)
+        self.assertEqual(result["halted"], "Automation not allowed during business hours")
+        self.assertEqual([statuses[host] for host in self.HOSTS],
+                         ["SUCCESS", "SUCCESS", "SUCCESS", "SKIPPED", "SKIPPED", "SKIPPED"])
+    
+    def test_hosts_without_commands_succeed(self):
+        executor = bot.FleetExecutor(bot.SubprocessRunner(), bot.SimulatedTransport())
+        result = executor.run(self.HOSTS[:2], [], 30)
+        self.assertEqual(result["status"], "SUCCESS")
+        self.assertEqual(result["counts"], {"SUCCESS": 2})
+
+
+
+class FleetTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.kb = bot.KnowledgeBaseManager(os.path.join(self.tmp.name, "kb.db"))
+    
+    def tearDown(self):
+        self.kb.close()
+        self.tmp.cleanup()
+    
+    def test_subprocess_backend_defaults_to_ssh(self):
+        engine = bot.AutomationEngine(self.kb, backend="subprocess")
+        self.assertEqual(engine.fleet_executor().transport.name, "ssh")
+    
+    def test_local_transport_only_runs_stand_ins(self):
+        with self.assertRaises(ValueError):
+            bot.AutomationEngine(self.kb, backend="subprocess", fleet_transport="local")
+        
+        engine = bot.AutomationEngine(self.kb, backend="subprocess", script_dir=self.tmp.name, fleet_transport="local",
+                                      allow_unbacked=True)
+        result = engine.execute_automation("SRV001", confirm=True, environment="staging", targets=["web-01", "web-02"],
+                                           out=bot.OutputBuffer(io.StringIO()))
+        self.assertFalse(result["success"])
+        self.assertIn("stand-in", result["message"])
+        
+        with open(os.path.join(self.tmp.name, "SRV001.sh"), "w") as handle:
+            handle.write('test -n "$TARGET_HOST"\n')
+        result = engine.execute_automation("SRV001", confirm=True, environment="staging", targets=["web-01", "web-02"],
+                                           out=bot.OutputBuffer(io.StringIO()))
+        self.assertTrue(result["success"], result["message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
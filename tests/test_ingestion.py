@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+
+class AlertCoalescerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.kb = bot.KnowledgeBaseManager(os.path.join(self.tmp.name, "kb.db"))
+        self.matcher = bot.PatternMatcher(self.kb, bot.NLPEngine(self.kb))
+        self.coalescer = bot.AlertCoalescer(self.matcher, window=60.0)
+    
+    def tearDown(self):
+        self.kb.close()
+        self.tmp.cleanup()
+    
+    def logged(self) -> int:
+        self.kb.cursor.execute("SELECT COALESCE(SUM(occurrences), 0) FROM query_logs")
+        return self.kb.cursor.fetchone()[0]
+    
+    def test_repeats_join_one_cluster_until_the_window_expires(self):
+        opened = self.coalescer.submit("mysql connection timeout from 10.0.0.5 after 30 seconds", now=0.0)
+        self.assertEqual([event["event"] for event in opened], ["open"])
+        self.assertEqual(opened[0]["match"].id, "DB001")
+        self.assertTrue(opened[0]["action"])
+        
+        for second, address in ((10.0, "10.0.0.6"), (50.0, "10.0.0.7"), (100.0, "10.0.0.8")):
+            self.assertEqual(self.coalescer.submit(f"mysql connection timeout from {address} after 30 seconds", now=second), [])
+        other = self.coalescer.submit("tomcat server not responding on port 8080", now=120.0)
+        self.assertEqual([event["event"] for event in other], ["open"])
+        self.assertNotEqual(other[0]["fingerprint"], opened[0]["fingerprint"])
+        self.assertEqual(self.logged(), 0)
+        
+        closed = self.coalescer.expire(now=160.0)
+        self.assertEqual([(event["event"], event["fingerprint"], event["count"]) for event in closed],
+                         [("close", opened[0]["fingerprint"], 4)])
+        self.assertEqual(self.logged(), 4)
+        
+        reopened = self.coalescer.submit("mysql connection timeout from 10.0.0.9 after 30 seconds", now=170.0)
+        self.assertEqual([event["event"] for event in reopened], ["open"])
+        self.assertEqual([(event["event"], event["count"]) for event in self.coalescer.flush()], [("close", 1), ("close", 1)])
+        self.assertEqual(self.coalescer.stats["matched"], 3)
+        self.assertEqual(self.coalescer.stats["coalesced"], 3)
+    
+    def test_open_clusters_are_capped_by_evicting_the_oldest(self):
+        coalescer = bot.AlertCoalescer(self.matcher, window=60.0, max_clusters=2)
+        queries = ["mysql connection timeout", "tomcat server not responding", "disk space full on /var"]
+        opened = [coalescer.submit(query, now=float(second)) for second, query in enumerate(queries)]
+        self.assertEqual([event["event"] for event in opened[2]], ["close", "open"])
+        self.assertEqual(opened[2][0]["fingerprint"], opened[0][0]["fingerprint"])
+        self.assertEqual(list(coalescer.clusters), [opened[1][0]["fingerprint"], opened[2][1]["fingerprint"]])
+        self.assertEqual(coalescer.stats["evicted"], 1)
+        self.assertEqual(coalescer.stats["clusters"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import contextlib
+import io
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = bot.MetricsRegistry()
+        self.counter = self.registry.counter("test_requests", "Requests", ("status",))
+        self.histogram = self.registry.histogram("test_seconds", "Latency", buckets=(0.1, 1.0))
+    
+    def record(self, value: float):
+        self.counter.inc(status="ok")
+        self.histogram.observe(value)
+    
+    def test_finished_threads_fold_into_the_base_shard(self):
+        for _ in range(20):
+            threads = [threading.Thread(target=self.record, args=(0.05 if i % 2 else 0.5,)) for i in range(100)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.record(5.0)
+        
+        self.assertLessEqual(len(self.counter._shards), 2)
+        self.assertLessEqual(len(self.histogram._shards), 2)
+        self.assertEqual(self.counter.values(), {("ok",): 2001})
+        samples = {(suffix, tuple(labels)): value for suffix, labels, value in self.histogram.samples()}
+        self.assertEqual(samples[("_bucket", (("le", "0.1"),))], 1000)
+        self.assertEqual(samples[("_bucket", (("le", "1"),))], 2000)
+        self.assertEqual(samples[("_count", ())], 2001)
+        self.assertAlmostEqual(samples[("_sum", ())], 555.0)
+    
+    def test_failing_collectors_are_skipped_quietly(self):
+        self.registry.gauge("test_broken", "Broken", lambda: 1 / 0)
+        self.record(0.5)
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            text = self.registry.render()
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertNotIn("test_broken", text)
+        self.assertIn('test_requests_total{status="ok"} 1', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
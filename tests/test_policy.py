@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+MONDAY = datetime(2026, 10, 19)
+
+
+class AutomationPolicyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.kb = bot.KnowledgeBaseManager(os.path.join(cls.tmp.name, "kb.db"))
+        cls.safety_rules = bot.AutomationEngine(cls.kb).safety_rules
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.kb.close()
+        cls.tmp.cleanup()
+    
+    def test_default_schedule_blocks_production_business_hours(self):
+        policy = bot.AutomationPolicy(self.safety_rules)
+        for minute in range(0, 7 * 1440, 13):
+            now = MONDAY + timedelta(minutes=minute)
+            production = policy.decide("production", "high", now)
+            self.assertEqual(production["allowed"], not 9 <= now.hour < 17, now)
+            if production["allowed"]:
+                next_block = now.replace(hour=9, minute=0) + timedelta(days=1 if now.hour >= 17 else 0)
+                self.assertEqual(production["until"], next_block, now)
+            else:
+                self.assertEqual(production["next_allowed"], now.replace(hour=17, minute=0), now)
+            self.assertTrue(policy.decide("staging", "high", now)["allowed"], now)
+        self.assertGreater(policy.stats["hits"], 0)
+    
+    def test_rules_and_maintenance_windows_cross_midnight(self):
+        policy = bot.AutomationPolicy(self.safety_rules, {
+            "maintenance_windows": [{"environment": "production", "days": "sat", "start": "10:00", "end": "14:00"}],
+            "rules": [{"environment": "production", "severity": ["critical"], "days": "fri", "start": "22:00", "end": "06:00",
+                       "action": "deny", "reason": "Change freeze"}]
+        })
+        saturday = MONDAY + timedelta(days=5)
+        
+        self.assertTrue(policy.decide("production", "low", saturday.replace(hour=11))["allowed"])
+        self.assertFalse(policy.decide("production", "low", saturday.replace(hour=15))["allowed"])
+        
+        frozen = policy.decide("production", "critical", saturday.replace(hour=5, minute=59))
+        self.assertEqual((frozen["allowed"], frozen["reason"]), (False, "Change freeze"))
+        self.assertEqual(frozen["next_allowed"], saturday.replace(hour=6))
+        self.assertTrue(policy.decide("production", "critical", saturday.replace(hour=6))["allowed"])
+        self.assertTrue(policy.decide("production", "low", saturday.replace(hour=5))["allowed"])
+    
+    def test_aware_times_are_read_as_local_time(self):
+        policy = bot.AutomationPolicy(self.safety_rules)
+        policy.decide("production", "high", MONDAY.replace(hour=12))
+        local = MONDAY.replace(hour=12).astimezone()
+        self.assertEqual(policy.decide("production", "high", local.astimezone(timezone.utc)),
+                         policy.decide("production", "high", MONDAY.replace(hour=12)))
+
+
+if __name__ == "__main__":
+    unittest.main()
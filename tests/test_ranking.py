@@ -0,0 +1,82 @@
+import heapq
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+
+class FixedStage(bot.RankingStage):
+    def __init__(self, name: str, cost: float, values: dict, bound: float):
+        self.name = name
+        self.cost = cost
+        self.values = values
+        self.bound = bound
+    
+    def max_contribution(self, context) -> float:
+        return self.bound
+    
+    def score(self, context, batch):
+        return [self.values[record.id] for record in batch.records]
+
+
+class RankingTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.kb = bot.KnowledgeBaseManager(os.path.join(cls.tmp.name, "kb.db"))
+        cls.nlp = bot.NLPEngine(cls.kb)
+        cls.queries = bot.EXAMPLE_QUERIES + bot.synthesize_queries(bot.EXAMPLE_QUERIES, 150, seed=7)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.kb.close()
+        cls.tmp.cleanup()
+    
+    def ranked(self, matcher, analysis, key_terms, top_k):
+        candidates = self.kb.search_by_keywords(key_terms, 65)
+        context = bot.RankingContext(analysis, key_terms, matcher._fetch_incident_keywords)
+        matches = matcher._build_matches(context, matcher.pipeline.score(context, candidates, top_k))
+        return [(match.id, match.confidence_score) for match in heapq.nlargest(top_k or 65, matches, key=bot._match_sort_key)]
+    
+    def test_pruning_keeps_the_unpruned_top_k(self):
+        for early_exit_level in ("very_high", None):
+            matcher = bot.PatternMatcher(self.kb, self.nlp, early_exit_level=early_exit_level)
+            for query in self.queries:
+                analysis = self.nlp.preprocess_query(query)
+                key_terms = self.nlp.extract_key_terms(analysis["tokens"])
+                if not key_terms:
+                    continue
+                full = self.ranked(matcher, analysis, key_terms, None)
+                for top_k in (1, 3, 5):
+                    expected = full[:1] if early_exit_level and full and full[0][1] >= 0.9 else full[:top_k]
+                    self.assertEqual(self.ranked(matcher, analysis, key_terms, top_k)[:len(expected)], expected, query)
+    
+    def test_pruning_keeps_candidates_tied_at_the_confidence_cap(self):
+        records = [bot.IncidentRecord(incident_id, incident_id, "server", "low", 5, 1, None) for incident_id in "ABC"]
+        pipeline = bot.RankingPipeline({"very_high": 0.9}, None)
+        pipeline.register(FixedStage("base", 1.0, {"A": 1.2, "B": 1.0, "C": 0.5}, 1.2))
+        pipeline.register(FixedStage("extra", 2.0, {"A": 0.0, "B": 0.05, "C": 0.0}, 0.1))
+        context = bot.RankingContext({"tokens": []}, [], None)
+        
+        batch = pipeline.score(context, records, 1)
+        self.assertEqual([record.id for record in batch.records], ["A", "B"])
+        self.assertEqual(context.stats["pruned"], 1)
+    
+    def test_default_stages_prune_before_the_cheap_boosts(self):
+        matcher = bot.PatternMatcher(self.kb, self.nlp)
+        self.assertEqual(matcher.pipeline.stages[0].name, "similarity")
+        pruned = 0
+        for query in self.queries:
+            matcher.find_matches(query, record=False)
+            pruned += matcher.last_ranking_stats["pruned"]
+        self.assertGreater(pruned, 0)
+        timings = matcher.pipeline.stage_timings
+        self.assertLess(timings["category"]["candidates"], timings["similarity"]["candidates"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+READER_SCRIPT = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import Prodution_Bot as bot
+kb = bot.KnowledgeBaseManager(sys.argv[2], seed=False)
+applier = bot.ReplicationApplier(kb, bot.FileReplicationTransport(sys.argv[3]), sys.argv[4])
+applier.apply()
+for i in range(int(sys.argv[5])):
+    kb.log_query(f"tomcat down {i}", "SRV001", 0.9, 12.0)
+applier.ship_query_logs()
+kb.close()
+'''
+
+
+class ReplicationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp.name, "replication")
+        self.transport = bot.FileReplicationTransport(self.directory)
+        self.kb = bot.KnowledgeBaseManager(os.path.join(self.tmp.name, "writer.db"))
+        self.kb.enable_change_log("writer")
+        self.publisher = bot.ReplicationPublisher(self.kb, self.transport)
+        self.publisher.sync()
+    
+    def tearDown(self):
+        self.kb.close()
+        self.tmp.cleanup()
+    
+    def frequency(self, incident_id: str) -> int:
+        self.kb.cursor.execute("SELECT frequency FROM incidents WHERE id = ?", (incident_id,))
+        return self.kb.cursor.fetchone()[0]
+    
+    def logged(self) -> int:
+        self.kb.cursor.execute("SELECT COUNT(*) FROM query_logs")
+        return self.kb.cursor.fetchone()[0]
+    
+    def run_readers(self, counts: dict):
+        repo = os.path.dirname(os.path.abspath(bot.__file__))
+        readers = [subprocess.Popen([sys.executable, "-c", READER_SCRIPT, repo, os.path.join(self.tmp.name, f"{name}.db"),
+                                     self.directory, name, str(count)],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=self.tmp.name)
+                   for name, count in counts.items()]
+        for reader in readers:
+            _, stderr = reader.communicate(timeout=120)
+            self.assertEqual(reader.returncode, 0, stderr.decode())
+    
+    def test_reader_processes_ship_logs_once(self):
+        before_frequency, before_logged = self.frequency("SRV001"), self.logged()
+        self.run_readers({"reader1": 5, "reader2": 3})
+        
+        self.assertEqual(self.publisher.collect_query_logs(), 8)
+        self.assertEqual(self.frequency("SRV001"), before_frequency + 8)
+        self.assertEqual(self.logged(), before_logged + 8)
+        
+        self.assertEqual(self.publisher.collect_query_logs(), 0)
+        self.assertEqual(self.frequency("SRV001"), before_frequency + 8)
+    
+    def test_failed_batch_leaves_nothing_behind(self):
+        before_frequency, before_logged = self.frequency("SRV001"), self.logged()
+        rows = [{"user_query": f"tomcat {i}", "incident_id": "SRV001", "confidence": 0.9, "response_time": 10.0,
+                 "timestamp": "2026-01-01 10:00:00", "occurrences": 1} for i in range(3)]
+        self.transport.ship_query_logs("reader1", 3, rows)
+        
+        record = self.kb.analytics.record
+        calls = []
+        
+        def failing_record(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("simulated crash")
+            return record(*args, **kwargs)
+        
+        self.kb.analytics.record = failing_record
+        with self.assertRaises(RuntimeError):
+            self.publisher.collect_query_logs()
+        self.kb.analytics.record = record
+        
+        self.assertEqual(self.frequency("SRV001"), before_frequency)
+        self.assertEqual(self.logged(), before_logged)
+        self.assertIsNone(self.kb.get_replication_state("query_logs:reader1"))
+        
+        self.assertEqual(self.publisher.collect_query_logs(), 3)
+        self.assertEqual(self.frequency("SRV001"), before_frequency + 3)
+        self.assertEqual(self.logged(), before_logged + 3)
+    
+    def test_query_logs_keep_one_cursor_per_peer(self):
+        before_frequency = self.frequency("SRV001")
+        self.kb.set_replication_state("query_logs:reader1-000000000004.jsonl.gz", 4)
+        self.kb.conn.commit()
+        self.publisher = bot.ReplicationPublisher(self.kb, self.transport)
+        self.assertEqual(self.kb.get_replication_state("query_logs:reader1"), "4")
+        self.assertIsNone(self.kb.get_replication_state("query_logs:reader1-000000000004.jsonl.gz"))
+        
+        row = {"user_query": "tomcat down", "incident_id": "SRV001", "confidence": 0.9, "response_time": 10.0,
+               "timestamp": "2026-01-01 10:00:00", "occurrences": 1}
+        self.transport.ship_query_logs("reader1", 4, [row] * 4)
+        self.transport.ship_query_logs("reader1", 6, [row] * 2)
+        self.transport.ship_query_logs("reader10", 1, [row])
+        self.assertEqual(self.publisher.collect_query_logs(), 3)
+        self.assertEqual(self.frequency("SRV001"), before_frequency + 3)
+        self.assertEqual(self.transport.list_query_logs(), [])
+        self.kb.cursor.execute("SELECT key, value FROM replication_state WHERE key LIKE 'query_logs:%' ORDER BY key")
+        self.assertEqual(self.kb.cursor.fetchall(), [("query_logs:reader1", "6"), ("query_logs:reader10", "1")])
+    
+    def incident(self, kb, incident_id: str):
+        kb.cursor.execute("SELECT issue_title, category, frequency FROM incidents WHERE id = ?", (incident_id,))
+        return kb.cursor.fetchone()
+    
+    def test_reapplying_changes_is_idempotent(self):
+        self.kb.update_incident("SRV001", {"title": "Tomcat not responding"})
+        self.kb.increment_frequency("DB001", 4)
+        self.kb.merge_incidents("NET001", "NET002")
+        self.publisher.sync()
+        
+        reader = bot.KnowledgeBaseManager(os.path.join(self.tmp.name, "reader.db"), seed=False)
+        try:
+            applier = bot.ReplicationApplier(reader, self.transport, "reader1")
+            self.assertGreater(applier.apply(), 0)
+            expected = {incident_id: self.incident(self.kb, incident_id) for incident_id in ("SRV001", "DB001", "NET001")}
+            self.assertEqual({incident_id: self.incident(reader, incident_id) for incident_id in expected}, expected)
+            self.assertIsNone(self.incident(reader, "NET002"))
+            
+            self.assertEqual(applier.apply(), 0)
+            self.assertEqual(self.transport.read_changes(int(reader.get_replication_state("applied_change_id"))), [])
+            change_ids = [change["change_id"] for change in self.transport.read_changes(0)]
+            self.assertEqual(change_ids[-1], int(reader.get_replication_state("applied_change_id")))
+            self.assertEqual([change["change_id"] for change in self.transport.read_changes(change_ids[-3])], change_ids[-2:])
+        finally:
+            reader.close()
+    
+    def test_merge_rejects_unknown_and_identical_ids(self):
+        with self.assertRaises(ValueError):
+            self.kb.merge_incidents("SRV001", "SRV001")
+        with self.assertRaises(ValueError):
+            self.kb.merge_incidents("SRV001", "MISSING")
+        self.assertIsNotNone(self.incident(self.kb, "SRV001"))
+    
+    def test_update_rejects_unknown_ids_without_recording_changes(self):
+        revision = self.kb.content_revision()
+        with self.assertRaises(ValueError):
+            self.kb.update_incident("MISSING", {"title": "Ghost"}, keywords=["ghost"])
+        self.assertEqual(self.kb.content_revision(), revision)
+        self.assertEqual(self.kb.get_incident_keywords("MISSING"), [])
+        self.assertEqual(self.publisher.publish(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+
+class SubprocessRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.runner = bot.SubprocessRunner()
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_spent_deadline_times_out_without_spawning(self):
+        marker = os.path.join(self.tmp.name, "ran")
+        result = asyncio.run(self.runner.run_script(["sleep 0.3", f"touch {marker}"], 0.1))
+        self.assertEqual(result["status"], "TIMEOUT")
+        self.assertEqual(len(result["commands"]), 1)
+        
+        result = asyncio.run(self.runner.run_script([f"touch {marker}"], 0))
+        self.assertEqual((result["status"], result["exit_code"]), ("TIMEOUT", None))
+        self.assertFalse(os.path.exists(marker))
+
+
+class SubprocessBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.kb = bot.KnowledgeBaseManager(os.path.join(self.tmp.name, "kb.db"))
+        with open(os.path.join(self.tmp.name, "SRV001.sh"), "w") as handle:
+            handle.write("echo restarted\n")
+        self.backup = os.path.join(self.tmp.name, "backup.done")
+    
+    def tearDown(self):
+        self.kb.close()
+        self.tmp.cleanup()
+    
+    def engine(self, **options):
+        engine = bot.AutomationEngine(self.kb, backend="subprocess", script_dir=self.tmp.name, **options)
+        engine.safety_rules["production_safeguards"]["time_restrictions"]["business_hours"] = True
+        engine.policy = bot.AutomationPolicy(engine.safety_rules)
+        return engine
+    
+    def execute(self, engine):
+        return engine.execute_automation("SRV001", confirm=True, environment="production",
+                                         out=bot.OutputBuffer(io.StringIO()))
+    
+    def test_production_run_is_blocked_without_a_backup_action(self):
+        result = self.execute(self.engine())
+        self.assertFalse(result["success"])
+        self.assertIn("--backup-command", result["message"])
+        self.assertTrue(self.execute(self.engine(allow_unbacked=True))["success"])
+        self.assertFalse(os.path.exists(self.backup))
+    
+    def test_backup_command_runs_before_the_script(self):
+        result = self.execute(self.engine(backup_command=f"touch {self.backup}"))
+        self.assertTrue(result["success"])
+        self.assertTrue(os.path.exists(self.backup))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+
+class ShardedMatcherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.kb = bot.KnowledgeBaseManager(os.path.join(cls.tmp.name, "kb.db"))
+        cls.nlp = bot.NLPEngine(cls.kb)
+        cls.plain = bot.PatternMatcher(cls.kb, cls.nlp)
+        cls.sharded = bot.ShardedPatternMatcher(cls.kb, cls.nlp, num_shards=2)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.sharded.close()
+        cls.kb.close()
+        cls.tmp.cleanup()
+    
+    def ranked(self, query: str):
+        expected = [(match.id, match.confidence_score, match.frequency) for match in self.plain.find_matches(query, record=False)]
+        actual = [(match.id, match.confidence_score, match.frequency)
+                  for match in self.sharded.find_matches_batch([query], record=False)[0]]
+        return expected, actual
+    
+    def test_sharded_results_match_the_plain_pipeline(self):
+        for query in bot.EXAMPLE_QUERIES + bot.synthesize_queries(bot.EXAMPLE_QUERIES, 40, seed=7):
+            expected, actual = self.ranked(query)
+            self.assertEqual(actual, expected, query)
+            if expected:
+                self.assertEqual(self.sharded.last_ranking_stats["fallback"], self.plain.last_ranking_stats["fallback"], query)
+                self.assertTrue(self.sharded.last_ranking_stats["timings"])
+        self.assertEqual(self.sharded.find_matches_batch(["nothing relevant here"], record=False), [[]])
+    
+    def test_incident_updates_restart_the_shards(self):
+        query = "tomcat server not responding"
+        best = self.sharded.find_matches_batch([query], record=False)[0][0].id
+        keywords = self.kb.get_incident_keywords(best)
+        self.kb.update_incident(best, keywords=["unrelated"])
+        try:
+            self.assertNotIn(best, [match.id for match in self.sharded.find_matches_batch([query], record=False)[0]])
+        finally:
+            self.kb.update_incident(best, keywords=keywords)
+    
+    def test_frequency_changes_outside_the_matcher_reach_the_shards(self):
+        query = "mysql database connection timeout error"
+        best = self.plain.find_matches(query, record=False)[0].id
+        self.kb.increment_frequency(best, 25)
+        expected, actual = self.ranked(query)
+        self.assertEqual(actual, expected)
+        self.assertIn(best, [incident_id for incident_id, _, _ in actual])
+
+
+if __name__ == "__main__":
+    unittest.main()
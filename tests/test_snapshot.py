@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Prodution_Bot as bot
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "index.snap")
+        self.kb = bot.KnowledgeBaseManager(os.path.join(self.tmp.name, "kb.db"))
+        self.nlp = bot.NLPEngine(self.kb)
+        self.matcher = bot.PatternMatcher(self.kb, self.nlp)
+    
+    def tearDown(self):
+        self.kb.close()
+        self.tmp.cleanup()
+    
+    def ensure(self):
+        snapshot = bot.SnapshotIndex.ensure(self.path, self.kb, self.nlp, self.matcher)
+        self.addCleanup(snapshot.close)
+        return snapshot
+    
+    def test_round_trip_preserves_records_keywords_and_search(self):
+        index = bot.IncidentIndex.from_knowledge_base(self.kb)
+        bot.SnapshotIndex.write(self.path, index, self.nlp, self.matcher, "rev-1")
+        snapshot = bot.SnapshotIndex(self.path, verify=True)
+        self.addCleanup(snapshot.close)
+        
+        self.assertEqual(snapshot.meta["kb_revision"], "rev-1")
+        self.assertEqual(len(snapshot), len(index))
+        self.assertEqual({record.id: record.to_dict() for record in snapshot.incidents()},
+                         {incident_id: record.to_dict() for incident_id, record in index.incidents.items()})
+        self.assertEqual({incident_id: sorted(keywords) for incident_id, keywords in snapshot.get_keywords(list(index.incidents)).items()},
+                         {incident_id: sorted(keywords) for incident_id, keywords in index.get_keywords(list(index.incidents)).items()})
+        
+        for query in bot.EXAMPLE_QUERIES:
+            key_terms = self.nlp.extract_key_terms(self.nlp.preprocess_query(query)["tokens"])
+            for partition in ({}, {"category": "database"}, {"exclude_category": "database"}):
+                self.assertEqual([(record.id, record.match_count) for record in snapshot.search_by_keywords(key_terms, 10, **partition)],
+                                 [(record.id, record.match_count) for record in index.search_by_keywords(key_terms, 10, **partition)],
+                                 (query, partition))
+    
+    def test_ensure_rebuilds_only_after_content_changes(self):
+        self.assertTrue(self.ensure().fresh)
+        self.assertFalse(self.ensure().fresh)
+        
+        self.kb.increment_frequency("SRV001")
+        self.assertFalse(self.ensure().fresh)
+        
+        self.kb.update_incident("SRV001", {"title": "Tomcat not responding"})
+        snapshot = self.ensure()
+        self.assertTrue(snapshot.fresh)
+        self.assertEqual(snapshot.record(snapshot._incident_ordinal("SRV001")).issue_title, "Tomcat not responding")
+    
+    def test_restart_keeps_the_revision_until_seeded_content_was_edited(self):
+        revision = self.kb.content_revision()
+        self.assertTrue(self.ensure().fresh)
+        
+        self.kb.close()
+        self.kb = bot.KnowledgeBaseManager(os.path.join(self.tmp.name, "kb.db"))
+        self.assertEqual(self.kb.content_revision(), revision)
+        self.assertFalse(self.ensure().fresh)
+        
+        self.kb.update_incident("SRV001", {"title": "Tomcat not responding"})
+        self.kb.close()
+        self.kb = bot.KnowledgeBaseManager(os.path.join(self.tmp.name, "kb.db"))
+        self.assertNotEqual(self.kb.content_revision(), revision)
+        snapshot = self.ensure()
+        self.assertTrue(snapshot.fresh)
+        self.assertEqual(snapshot.record(snapshot._incident_ordinal("SRV001")).issue_title, "Tomcat Server Not Responding")
+
+
+if __name__ == "__main__":
+    unittest.main()